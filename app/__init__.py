@@ -1,5 +1,11 @@
 # app/__init__.py
 __version__ = "0.1.0"
 
+import time
+
+# When this process started loading bookclub, `--timings` reports the time from here
+# to the command starting (imports, .env, option parsing) as the startup span
+STARTED_AT = time.perf_counter()
+
 # Expose the CLI entrypoint at package level
 # from .cli import cli
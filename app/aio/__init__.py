@@ -0,0 +1,8 @@
+# app/aio/__init__.py
+# Async versions of the Google Books, GenAI and reading list database functions,
+# for hosting the reading list inside an asyncio service without blocking the event loop.
+from .books import get_top5_books
+from .genai import generate_summary, generate_summaries_concurrently
+from .db import AsyncDatabase
+
+__all__ = ["get_top5_books", "generate_summary", "generate_summaries_concurrently", "AsyncDatabase"]
@@ -0,0 +1,38 @@
+#Async Google Books search. The requests run on a dedicated thread pool through the
+#same code path as app.google_books, so caching, retries, the circuit breaker and the
+#shared rate limit all behave exactly the same.
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from app import google_books
+from app.config import AIO_BOOKS_THREADS
+from app.resilience import Deadline
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """ The thread pool Google Books requests run on, created on first use """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=AIO_BOOKS_THREADS,
+                                           thread_name_prefix="bookclub-books")
+        return _executor
+
+
+async def get_top5_books(query: str, parallel: Optional[bool] = None, strict: bool = False,
+                         on_items: Optional[Callable[[List[Dict]], None]] = None,
+                         deadline: Optional[Deadline] = None) -> List[Dict]:
+    """
+    Async version of app.google_books.get_top5_books, with the same arguments and results.
+    `on_items` is called from a worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(google_books.get_top5_books, query, parallel=parallel, strict=strict,
+                             on_items=on_items, deadline=deadline)
+    return await loop.run_in_executor(get_executor(), call)
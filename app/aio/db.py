@@ -0,0 +1,78 @@
+#Async access to the reading list database. sqlite3 connections belong to the thread
+#that made them, so every call runs on one dedicated thread that owns the connection.
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from app import book_list_db, metrics, rate_limit
+from app.config import SQLITE_PROFILE
+
+#book_list_db functions (taking the connection first) AsyncDatabase exposes as coroutines
+DB_FUNCTIONS = (
+    "add_book", "add_books", "delete_book", "delete_books", "update_book_status",
+    "update_books_status", "update_book_summaries", "get_all_books", "get_books_by_status",
+    "get_books_page", "get_book_id", "get_book_id_at", "get_book_ids_at", "get_book_id_ranges_at",
+    "count_books", "get_max_book_id", "get_books_missing_summary", "get_cached_summary", "cache_summaries",
+    "record_cache_stats", "get_cache_stats", "search_books", "save_volumes", "search_volumes",
+    "get_api_usage",
+)
+
+
+class AsyncDatabase:
+    """
+    The reading list database for asyncio code. Every function in DB_FUNCTIONS is
+    available as a coroutine without the connection argument, e.g.
+    `await db.add_book("Dune", "Frank Herbert", "A desert planet's spice wars.")`.
+    Calls run one at a time, in order, on a single thread, so they never block the
+    event loop or each other's writes.
+    """
+
+    def __init__(self, db_name=book_list_db.BOOKS_DB, profile=SQLITE_PROFILE):
+        self.db_name = db_name
+        self.profile = profile
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bookclub-db")
+        self._conn = None
+
+    def _open(self):
+        if self._conn is None:
+            self._conn = book_list_db.create_connection(self.db_name, self.profile)
+            book_list_db.ensure_schema(self._conn)
+            rate_limit.configure(book_list_db.database_file(self._conn))
+        return self._conn
+
+    async def run(self, func, *args, **kwargs):
+        """ Runs func(connection, *args, **kwargs) on the database thread """
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, lambda: func(self._open(), *args, **kwargs))
+
+    async def flush_metrics(self):
+        """ Stores the API metrics collected so far, call it now and then from long-running services """
+        await self.run(lambda con: metrics.flush(con))
+
+    def __getattr__(self, name):
+        if name not in DB_FUNCTIONS:
+            raise AttributeError(name)
+        func = getattr(book_list_db, name)
+
+        async def call(*args, **kwargs):
+            return await self.run(func, *args, **kwargs)
+        call.__name__ = name
+        call.__doc__ = func.__doc__
+        return call
+
+    def _close(self):
+        if self._conn is not None:
+            metrics.flush(self._conn)
+            rate_limit.configure(None)
+            self._conn.close()
+            self._conn = None
+
+    async def close(self):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close)
+        self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._open)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -0,0 +1,98 @@
+#Async summaries through the GenAI SDK's async client. Prompts, retries, the circuit
+#breaker, the shared rate limit and usage accounting match app.genai.
+import asyncio
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+from app import genai, metrics, rate_limit
+from app.config import (GOOGLE_GENAI_MODEL, GENAI_RETRIES, RETRY_BACKOFF, SUMMARY_MAX_WORKERS,
+                        SUMMARY_TIMEOUT)
+from app.resilience import CircuitBreaker, Deadline, check_call, retry_delay
+
+T = TypeVar("T")
+
+#Replaced in tests so retries don't actually wait
+sleep = asyncio.sleep
+
+
+async def call_with_retries(func: Callable[[], Awaitable[T]], retries: int = 2, backoff: float = 0.5,
+                            max_backoff: float = 8.0, breaker: Optional[CircuitBreaker] = None,
+                            deadline: Optional[Deadline] = None) -> T:
+    """ Async version of app.resilience.call_with_retries """
+    attempt = 0
+    while True:
+        check_call(breaker, deadline)
+        try:
+            result = await func()
+        except Exception as e:
+            delay = retry_delay(e, attempt, retries, backoff, max_backoff, breaker, deadline)
+            if delay is None:
+                raise
+            await sleep(delay)
+            attempt += 1
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+
+async def _generate_content(**kwargs):
+    """ One async model call under the shared 'genai' rate limit, counted in the usage and metrics """
+    #The bucket lives in sqlite, so only the reservation goes to a thread and the wait is async
+    #(run_in_executor rather than asyncio.to_thread, which needs Python 3.9)
+    loop = asyncio.get_running_loop()
+    wait = await loop.run_in_executor(None, rate_limit.reserve, "genai")
+    if wait > 0:
+        await asyncio.sleep(wait)
+    tokens = 0
+    ok = False
+    start = time.perf_counter()
+    try:
+        response = await genai.get_client().aio.models.generate_content(
+            model=GOOGLE_GENAI_MODEL, **kwargs)
+        tokens = genai.token_count(response)
+        ok = True
+        return response
+    finally:
+        metrics.observe("genai", time.perf_counter() - start, ok=ok, tokens=tokens,
+                        model=GOOGLE_GENAI_MODEL)
+        await loop.run_in_executor(None, rate_limit.record_usage, "genai", 1, tokens)
+
+
+async def generate_summary(title: str, author: str) -> str:
+    """ Async version of app.genai.generate_summary """
+    response = await call_with_retries(
+        lambda: _generate_content(contents=genai.summary_prompt(title, author)),
+        retries=GENAI_RETRIES, backoff=RETRY_BACKOFF, breaker=genai.GENAI_BREAKER,
+    )
+    return response.text
+
+
+async def generate_summaries_concurrently(books: List[Tuple[str, str]],
+                                          summarize: Optional[Callable[[str, str], Awaitable[str]]] = None,
+                                          max_workers: int = SUMMARY_MAX_WORKERS,
+                                          timeout: Optional[float] = SUMMARY_TIMEOUT,
+                                          on_error: Optional[Callable[[int, Exception], None]] = None,
+                                          deadline: Optional[Deadline] = None) -> List[str]:
+    """
+    Async version of app.genai.generate_summaries_concurrently: at most `max_workers`
+    calls run at once, a book whose call fails or takes longer than `timeout` seconds
+    gets NO_SUMMARY (and `on_error(index, error)` is called), and books still waiting
+    when `deadline` runs out get NO_SUMMARY too. Summaries come back in book order.
+    """
+    if summarize is None:
+        summarize = generate_summary
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+
+    async def one(index: int, title: str, author: str) -> str:
+        try:
+            async with semaphore:
+                limit = deadline.timeout(timeout) if deadline else timeout
+                return await asyncio.wait_for(summarize(title, author), limit or None)
+        except Exception as e:
+            if on_error:
+                on_error(index, e)
+            return genai.NO_SUMMARY
+
+    return list(await asyncio.gather(*(one(index, title, author)
+                                       for index, (title, author) in enumerate(books))))
@@ -0,0 +1,123 @@
+#Here we fill in AI summaries for saved books that have none (or the placeholder), one chunk
+#at a time. Each chunk is generated with bounded concurrency (or as one batched prompt) and
+#written back in one transaction, then a checkpoint is saved, so an interrupted run can pick
+#up after the last book it finished.
+import time
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from app.book_list_db import (clear_checkpoint, count_books_missing_summary, get_books_missing_summary,
+                              get_checkpoint, save_checkpoint, update_book_summaries)
+from app.config import SUMMARY_MAX_WORKERS
+from app.genai import NO_SUMMARY, iter_summaries
+
+#Checkpoint name used by `bookclub backfill`
+BACKFILL_JOB = "backfill"
+
+
+class BackfillStalled(Exception):
+    """ Raised when every summary in a chunk failed, e.g. while GenAI is down """
+
+    def __init__(self, last_id: int, error: Optional[BaseException]):
+        super().__init__(f"every summary after book ID {last_id} failed ({error})")
+        self.last_id = last_id
+        self.error = error
+
+
+class BackfillProgress:
+    """ Where a backfill run is, handed back after every chunk """
+
+    def __init__(self, last_id: int, total: int, done: int = 0, failed: int = 0):
+        self.last_id = last_id
+        self.total = total
+        self.done = done
+        self.failed = failed
+        #Books handled by this run, which is what the rate is based on
+        self.handled = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self) -> float:
+        """ Books per second in this run """
+        elapsed = self.elapsed
+        return self.handled / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.total - self.done - self.failed)
+
+    @property
+    def eta(self) -> Optional[float]:
+        """ Seconds left at the current rate, None until there is a rate """
+        rate = self.rate
+        return self.remaining / rate if rate else None
+
+
+def _summarize_chunk(books, summarize, summarize_batch, max_workers) -> Tuple[List[Optional[str]], list]:
+    """ Summaries for one chunk, None where generating one failed, and the errors seen """
+    errors = []
+    if summarize_batch is not None:
+        summaries = summarize_batch(books, on_error=lambda index, error: errors.append(error))
+        return [None if summary == NO_SUMMARY else summary for summary in summaries], errors
+
+    summaries = [None] * len(books)
+    for index, summary, error in iter_summaries(books, summarize=summarize, max_workers=max_workers):
+        if error is None:
+            summaries[index] = summary
+        else:
+            errors.append(error)
+    return summaries, errors
+
+
+def start(con, job: Optional[str] = BACKFILL_JOB, after_id: int = 0, restart: bool = False) -> BackfillProgress:
+    """
+    Progress for a new run: after the job's checkpoint if there is one (unless
+    `restart`), otherwise after `after_id`
+    """
+    checkpoint = get_checkpoint(con, job) if job else None
+    if checkpoint and not restart:
+        last_id, done, failed = checkpoint
+        return BackfillProgress(last_id, done + failed + count_books_missing_summary(con, last_id),
+                                done, failed)
+    return BackfillProgress(after_id, count_books_missing_summary(con, after_id))
+
+
+def run(con, progress: BackfillProgress, summarize: Callable[[str, str], str],
+        summarize_batch: Optional[Callable] = None, chunk_size: int = SUMMARY_MAX_WORKERS * 4,
+        max_workers: int = SUMMARY_MAX_WORKERS, limit: Optional[int] = None,
+        job: Optional[str] = BACKFILL_JOB) -> Iterator[BackfillProgress]:
+    """
+    Summarizes books missing a summary after progress.last_id, yielding `progress`
+    after every chunk is written. `summarize(title, author)` makes one summary, or
+    `summarize_batch(books, on_error=...)` makes a chunk's worth in one go. With a
+    `job` the checkpoint is saved after every chunk and cleared once no books are
+    left. Failed books are skipped (the next full run tries them again); a chunk
+    where everything failed raises BackfillStalled without moving the checkpoint.
+    Stops after `limit` books, keeping the checkpoint.
+    """
+    while limit is None or progress.handled < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - progress.handled)
+        rows = get_books_missing_summary(con, progress.last_id, size)
+        if not rows:
+            if job:
+                clear_checkpoint(con, job)
+            return
+
+        books = [(title, author.split(", ")[0]) for _book_id, title, author in rows]
+        summaries, errors = _summarize_chunk(books, summarize, summarize_batch, max_workers)
+        updates = [(row[0], summary) for row, summary in zip(rows, summaries) if summary is not None]
+        if not updates:
+            raise BackfillStalled(progress.last_id, errors[-1] if errors else None)
+
+        update_book_summaries(con, updates)
+        progress.done += len(updates)
+        progress.failed += len(rows) - len(updates)
+        progress.handled += len(rows)
+        #Move past this chunk even if some failed, so we never loop on them
+        progress.last_id = rows[-1][0]
+        if job:
+            save_checkpoint(con, job, progress.last_id, progress.done, progress.failed)
+        yield progress
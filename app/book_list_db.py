@@ -2,26 +2,69 @@
 # This file contains functions to interact with the SQLite database for
 # managing a reading list.
 
+import difflib
+import json
 import sqlite3
+import time
+
+from app.timings import span, timed
+
+# Every database call below is a timing span (see app/timings.py, off unless --timings is used)
 
 # DON'T FORGET TO CLOSE CONNECTION AFTER WE ARE DONE MAKING CHANGES TO DB !!!!
 # Creating the db
 BOOKS_DB = 'reading_list.db'
 
+# Bump this whenever set_up creates something new, so older databases get upgraded
+SCHEMA_VERSION = 7
+
+
+# PRAGMA settings applied at connect time, picked by name (see SQLITE_PROFILE in config)
+SQLITE_PROFILES = {
+    # whatever sqlite defaults to: rollback journal and a full fsync per commit
+    'default': {},
+    # WAL so readers don't block writers, and commits only fsync at checkpoints
+    'performance': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # negative means KiB, so 64 MB
+        'temp_store': 'MEMORY',
+    },
+}
+
+# How many prepared statements each connection keeps around for reuse
+STATEMENT_CACHE_SIZE = 256
+
 
 # Creating a connection to the database for testability
-def create_connection(db_name=BOOKS_DB):
+@timed("db.create_connection")
+def create_connection(db_name=BOOKS_DB, profile='default'):
     '''
-    Creates a connection to the SQLite database
+    Creates a connection to the SQLite database and applies the named tuning profile
     '''
-    con = sqlite3.connect(db_name)
+    con = sqlite3.connect(db_name, cached_statements=STATEMENT_CACHE_SIZE)
+    apply_profile(con, profile)
     return con
 
 
+# Function for tuning a connection
+def apply_profile(con, profile):
+    '''
+    Applies the PRAGMA settings of one of SQLITE_PROFILES to a connection
+    '''
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown SQLite profile '{profile}', "
+                         f"choose one of: {', '.join(SQLITE_PROFILES)}")
+    for name, value in SQLITE_PROFILES[profile].items():
+        con.execute(f"PRAGMA {name} = {value}")
+
+
 # Function for creating table name
 def set_up(con):
     '''
     Sets up the database by creating a table to hold all book info
+    Returns how many duplicate books (left by older versions) were merged away
     '''
     # create connection cursor
     cursor = con.cursor()
@@ -34,75 +77,425 @@ def set_up(con):
             status TEXT DEFAULT 'TBR', -- status: 'TBR', 'Reading', 'Read'
             summary TEXT)
                     ''')
+    # one row per (title, author): merge duplicates older versions may have left behind into
+    # the first copy, keeping the furthest status and the first real summary of any of them
+    merged = 0
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_reading_list_title_author'")
+    if cursor.fetchone() is None:
+        cursor.execute(
+            '''UPDATE reading_list SET
+                   status = (SELECT copy.status FROM reading_list AS copy
+                             WHERE copy.title = reading_list.title AND copy.author = reading_list.author
+                             ORDER BY CASE copy.status WHEN 'Read' THEN 3 WHEN 'Reading' THEN 2
+                                                       WHEN 'TBR' THEN 1 ELSE 0 END DESC, copy.id
+                             LIMIT 1),
+                   summary = COALESCE((SELECT copy.summary FROM reading_list AS copy
+                                       WHERE copy.title = reading_list.title AND copy.author = reading_list.author
+                                         AND copy.summary NOT IN ('', 'No summary available.')
+                                       ORDER BY copy.id LIMIT 1), summary)
+               WHERE id IN (SELECT MIN(id) FROM reading_list GROUP BY title, author HAVING COUNT(*) > 1)''')
+        cursor.execute(
+            '''DELETE FROM reading_list WHERE id NOT IN (
+                   SELECT MIN(id) FROM reading_list GROUP BY title, author)''')
+        merged = cursor.rowcount
+    cursor.execute(
+        '''CREATE UNIQUE INDEX IF NOT EXISTS idx_reading_list_title_author
+           ON reading_list (title, author)''')
+    # so filtering by status doesn't scan the whole table
+    cursor.execute(
+        '''CREATE INDEX IF NOT EXISTS idx_reading_list_status
+           ON reading_list (status)''')
+    # full-text index over the saved books, see set_up_search
+    set_up_search(con)
+    # every Google Books volume we have seen, so search can work offline
+    cursor.execute(
+        ''' CREATE TABLE IF NOT EXISTS volumes (
+            volume_id TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            authors TEXT NOT NULL, -- JSON list of author names
+            title_key TEXT NOT NULL,
+            authors_key TEXT NOT NULL,
+            info TEXT, -- the full volumeInfo as JSON
+            fetched_at REAL NOT NULL)
+                    ''')
+    cursor.execute(
+        '''CREATE INDEX IF NOT EXISTS idx_volumes_title_key ON volumes (title_key)''')
+    cursor.execute(
+        '''CREATE INDEX IF NOT EXISTS idx_volumes_authors_key ON volumes (authors_key)''')
+    # cache of AI summaries so repeat searches don't ask the model again
+    cursor.execute(
+        ''' CREATE TABLE IF NOT EXISTS summary_cache (
+            title_key TEXT NOT NULL,
+            author_key TEXT NOT NULL,
+            model TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL,
+            PRIMARY KEY (title_key, author_key, model))
+                    ''')
+    cursor.execute(
+        '''CREATE INDEX IF NOT EXISTS idx_summary_cache_last_used
+           ON summary_cache (last_used)''')
+    # single row holding the cache hit/miss counters
+    cursor.execute(
+        ''' CREATE TABLE IF NOT EXISTS summary_cache_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            hits INTEGER NOT NULL DEFAULT 0,
+            misses INTEGER NOT NULL DEFAULT 0)
+                    ''')
+    cursor.execute(
+        "INSERT OR IGNORE INTO summary_cache_stats (id, hits, misses) VALUES (1, 0, 0)")
+    # token buckets for the API rate limiter, shared by every process using this file
+    cursor.execute(
+        ''' CREATE TABLE IF NOT EXISTS rate_limits (
+            api TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL)
+                    ''')
+    # calls and GenAI tokens spent per day, for `bookclub quota`
+    cursor.execute(
+        ''' CREATE TABLE IF NOT EXISTS api_usage (
+            day TEXT NOT NULL,
+            api TEXT NOT NULL,
+            calls INTEGER NOT NULL DEFAULT 0,
+            tokens INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, api))
+                    ''')
+    # per-hour API metrics (calls, errors, latency histogram, tokens), only the last
+    # METRICS_RETENTION_HOURS are kept
+    cursor.execute(
+        ''' CREATE TABLE IF NOT EXISTS metrics_hourly (
+            hour INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            model TEXT NOT NULL DEFAULT '',
+            calls INTEGER NOT NULL DEFAULT 0,
+            errors INTEGER NOT NULL DEFAULT 0,
+            total_ms REAL NOT NULL DEFAULT 0,
+            max_ms REAL NOT NULL DEFAULT 0,
+            tokens INTEGER NOT NULL DEFAULT 0,
+            histogram TEXT NOT NULL DEFAULT '[]',
+            PRIMARY KEY (hour, name, model))
+                    ''')
+    # where resumable jobs like `bookclub backfill` got to
+    cursor.execute(
+        ''' CREATE TABLE IF NOT EXISTS checkpoints (
+            job TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL,
+            done INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL)
+                    ''')
+    # remember which schema this database has so ensure_schema can skip all of this
+    cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
     con.commit()
+    return merged
+
+
+# Keeps the FTS index in step with new books; add_books swaps it out for big batches
+FTS_INSERT_TRIGGER = '''
+    CREATE TRIGGER IF NOT EXISTS reading_list_fts_insert AFTER INSERT ON reading_list BEGIN
+        INSERT INTO reading_list_fts (rowid, title, author, summary)
+        VALUES (new.id, new.title, new.author, new.summary);
+    END'''
+
+# Batches at least this big are indexed with one INSERT ... SELECT instead of the trigger
+FTS_BULK_ROWS = 1000
+
+
+# Function for setting up full-text search
+def set_up_search(con):
+    '''
+    Creates the FTS5 index over title, author and summary plus the triggers that
+    keep it in sync with reading_list, filling it from existing books the first
+    time. Returns False (and leaves search off) if sqlite was built without FTS5.
+    '''
+    cursor = con.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'reading_list_fts'")
+    existed = cursor.fetchone() is not None
+    try:
+        cursor.execute(
+            '''CREATE VIRTUAL TABLE IF NOT EXISTS reading_list_fts USING fts5(
+                   title, author, summary,
+                   content='reading_list', content_rowid='id',
+                   tokenize='unicode61 remove_diacritics 2')''')
+    except sqlite3.OperationalError:
+        return False
+    cursor.execute(FTS_INSERT_TRIGGER)
+    cursor.execute(
+        '''CREATE TRIGGER IF NOT EXISTS reading_list_fts_delete AFTER DELETE ON reading_list BEGIN
+               INSERT INTO reading_list_fts (reading_list_fts, rowid, title, author, summary)
+               VALUES ('delete', old.id, old.title, old.author, old.summary);
+           END''')
+    # status changes don't touch the index, only edits to the searchable columns do
+    cursor.execute(
+        '''CREATE TRIGGER IF NOT EXISTS reading_list_fts_update
+           AFTER UPDATE OF title, author, summary ON reading_list BEGIN
+               INSERT INTO reading_list_fts (reading_list_fts, rowid, title, author, summary)
+               VALUES ('delete', old.id, old.title, old.author, old.summary);
+               INSERT INTO reading_list_fts (rowid, title, author, summary)
+               VALUES (new.id, new.title, new.author, new.summary);
+           END''')
+    if not existed:
+        cursor.execute("INSERT INTO reading_list_fts (reading_list_fts) VALUES ('rebuild')")
+    return True
+
+
+# Function for setting up the database only when needed
+@timed("db.ensure_schema")
+def ensure_schema(con, on_merge=None):
+    '''
+    Runs set_up only if the database is older than SCHEMA_VERSION (or brand new).
+    `on_merge(count)` is told how many duplicate books the upgrade merged, if any.
+    Returns True if set_up had to run.
+    '''
+    version = con.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return False
+    merged = set_up(con)
+    if merged and on_merge:
+        on_merge(merged)
+    return True
 
 
 # Function for adding a book
+@timed("db.add_book")
 def add_book(con, title, author, desc):
     '''
     Adds book to reading list database if it does not already exist
     If the book already exists, it will not be added again.
     '''
     cursor = con.cursor()
-    # Check if the book already exists
-    cursor.execute(
-        "SELECT 1 FROM reading_list WHERE title = ? AND author = ?",
-        (title, author),
-    )
-    if cursor.fetchone() is not None:
-        # Book already exists, do not add it again
-        return False
-    # Otherwise, insert the book into the database
+    # The unique (title, author) index turns a duplicate into a no-op
     cursor.execute(
-        "INSERT INTO reading_list (title, author, summary) VALUES (?, ?, ?)",
+        '''INSERT INTO reading_list (title, author, summary) VALUES (?, ?, ?)
+           ON CONFLICT (title, author) DO NOTHING''',
         (title, author, desc),
     )
     con.commit()
-    return True
+    return cursor.rowcount == 1
+
+
+# Function for adding many books at once
+@timed("db.add_books")
+def add_books(con, books, batch_size=5000):
+    '''
+    Adds (title, author, status, summary) tuples from any iterable, `batch_size`
+    rows per executemany call and transaction. Books already in the list are skipped.
+    Batches of FTS_BULK_ROWS or more are added to the search index in one statement
+    rather than row by row through the trigger, which is several times faster.
+    Returns the number of books actually inserted.
+    '''
+    cursor = con.cursor()
+    inserted = 0
+    batch = []
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'reading_list_fts_insert'")
+    has_trigger = cursor.fetchone() is not None
+
+    def flush():
+        bulk_index = has_trigger and len(batch) >= FTS_BULK_ROWS
+        try:
+            if bulk_index:
+                # DDL doesn't open a transaction by itself, and the swap must be all or nothing
+                if not con.in_transaction:
+                    cursor.execute("BEGIN")
+                cursor.execute("DROP TRIGGER reading_list_fts_insert")
+                last_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM reading_list").fetchone()[0]
+            cursor.executemany(
+                '''INSERT INTO reading_list (title, author, status, summary) VALUES (?, ?, ?, ?)
+                   ON CONFLICT (title, author) DO NOTHING''',
+                batch,
+            )
+            # rowcount adds up the rows each INSERT really wrote (trigger writes not included)
+            count = cursor.rowcount
+            if bulk_index:
+                # new rows always get IDs above the old maximum
+                cursor.execute(
+                    '''INSERT INTO reading_list_fts (rowid, title, author, summary)
+                       SELECT id, title, author, summary FROM reading_list WHERE id > ?''',
+                    (last_id,))
+                cursor.execute(FTS_INSERT_TRIGGER)
+        except Exception:
+            con.rollback()
+            raise
+        con.commit()
+        batch.clear()
+        return count
+
+    for book in books:
+        batch.append(book)
+        if len(batch) >= batch_size:
+            inserted += flush()
+    if batch:
+        inserted += flush()
+    return inserted
 
 
 # Function for deleting a book
+@timed("db.delete_book")
 def delete_book(con, book_id):
     '''
     Deletes book from database by its unique ID (primary key)
+    Returns True if the book was deleted, False if it was not found
     '''
-    # Create cursor
     cursor = con.cursor()
-    # Check if the book exists
-    cursor.execute("SELECT 1 FROM reading_list WHERE id = ?", (book_id,))
-    if cursor.fetchone() is None:
-        return False
+    # rowcount tells us whether the book existed, no need to look first
     cursor.execute("DELETE FROM reading_list WHERE id = ?", (book_id,))
     con.commit()
-    return True
+    return cursor.rowcount == 1
 
 
 # Function to update book status
+@timed("db.update_book_status")
 def update_book_status(con, book_id, status):
     '''
     Updates status of a book in the reading list database (only if it exists)
     Returns True if the book was updated, False if it was not found
     '''
     cursor = con.cursor()
-    # Check existence
-    cursor.execute(
-        '''SELECT COUNT(1) FROM reading_list WHERE id = ?''',
-        (book_id,),
-    )
-    exists = cursor.fetchone()[0]
-    if not exists:
-        return False
-
-    # Perform update
     cursor.execute(
         '''UPDATE reading_list SET status = ? WHERE id = ?''',
         (status, book_id),
     )
     con.commit()
-    return True
+    return cursor.rowcount == 1
+
+
+# Most "?" placeholders we put in one statement (older sqlite builds allow 999)
+MAX_SQL_PARAMS = 500
+
+
+# Helper for the bulk update/delete functions below
+def _bulk_write(con, statement, params, book_ids, where_status, id_ranges=None):
+    '''
+    Runs "<statement> WHERE ..." for the given IDs (in chunks), (first, last) ID
+    ranges (as BETWEEN clauses, so a range costs the same whatever its size) and/or
+    status, all in one transaction, and returns the number of rows changed
+    '''
+    cursor = con.cursor()
+    status_clause = " AND status = ?" if where_status else ""
+    status_params = [where_status] if where_status else []
+    changed = 0
+    try:
+        if book_ids is None and id_ranges is None:
+            cursor.execute(f"{statement} WHERE 1{status_clause}", params + status_params)
+            changed = cursor.rowcount
+        if book_ids is not None:
+            book_ids = list(book_ids)
+            for start in range(0, len(book_ids), MAX_SQL_PARAMS):
+                chunk = book_ids[start:start + MAX_SQL_PARAMS]
+                placeholders = ", ".join("?" * len(chunk))
+                cursor.execute(f"{statement} WHERE id IN ({placeholders}){status_clause}",
+                               params + chunk + status_params)
+                changed += cursor.rowcount
+        if id_ranges is not None:
+            id_ranges = list(id_ranges)
+            for start in range(0, len(id_ranges), MAX_SQL_PARAMS // 2):
+                chunk = id_ranges[start:start + MAX_SQL_PARAMS // 2]
+                between = " OR ".join(["id BETWEEN ? AND ?"] * len(chunk))
+                cursor.execute(f"{statement} WHERE ({between}){status_clause}",
+                               params + [bound for id_range in chunk for bound in id_range] + status_params)
+                changed += cursor.rowcount
+    except Exception:
+        con.rollback()
+        raise
+    con.commit()
+    return changed
+
+
+# Function to update the status of many books at once
+@timed("db.update_books_status")
+def update_books_status(con, status, book_ids=None, where_status=None, id_ranges=None):
+    '''
+    Sets `status` on every book in `book_ids` or the (first, last) `id_ranges`,
+    and/or every book whose status is `where_status`, in a single transaction.
+    Returns how many books changed.
+    '''
+    if book_ids is None and id_ranges is None and where_status is None:
+        raise ValueError("Give book IDs and/or a status to filter on")
+    return _bulk_write(con, "UPDATE reading_list SET status = ?", [status], book_ids, where_status,
+                       id_ranges)
+
+
+# Function to delete many books at once
+@timed("db.delete_books")
+def delete_books(con, book_ids=None, where_status=None, id_ranges=None):
+    '''
+    Deletes every book in `book_ids` or the (first, last) `id_ranges`, and/or
+    every book whose status is `where_status`, in a single transaction.
+    Returns how many books were deleted.
+    '''
+    if book_ids is None and id_ranges is None and where_status is None:
+        raise ValueError("Give book IDs and/or a status to filter on")
+    return _bulk_write(con, "DELETE FROM reading_list", [], book_ids, where_status, id_ranges)
+
+
+# Function to get a book ID by its position in the list
+@timed("db.get_book_id_at")
+def get_book_id_at(con, position):
+    '''
+    Returns the ID of the book at the given 1-based position of the list
+    (as shown by `bookclub list`), or None if the list is shorter than that
+    '''
+    if position < 1:
+        return None
+    cursor = con.cursor()
+    cursor.execute(
+        '''SELECT id FROM reading_list ORDER BY id LIMIT 1 OFFSET ?''',
+        (position - 1,),
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+# Function to get book IDs for many positions at once
+@timed("db.get_book_ids_at")
+def get_book_ids_at(con, positions):
+    '''
+    Returns {position: book ID} for the 1-based list positions that exist,
+    reading only the IDs up to the largest position asked for
+    '''
+    wanted = {position for position in positions if position >= 1}
+    if not wanted:
+        return {}
+    cursor = con.cursor()
+    cursor.execute('''SELECT id FROM reading_list ORDER BY id LIMIT ?''', (max(wanted),))
+    return {position: row[0] for position, row in enumerate(cursor, start=1) if position in wanted}
+
+
+# Function to turn ranges of positions into ranges of book IDs
+@timed("db.get_book_id_ranges_at")
+def get_book_id_ranges_at(con, ranges):
+    '''
+    Turns (first, last) ranges of 1-based list positions into (first ID, last ID)
+    ranges covering the same books, without reading the IDs in between. Ranges
+    reaching past the end of the list are cut short, ones wholly past it dropped.
+    '''
+    id_ranges = []
+    for first, last in ranges:
+        first_id = get_book_id_at(con, max(first, 1))
+        if first_id is None or last < 1:
+            continue
+        last_id = get_book_id_at(con, last)
+        if last_id is None:
+            last_id = get_max_book_id(con)
+        id_ranges.append((first_id, last_id))
+    return id_ranges
+
+
+# Function to count the books
+@timed("db.count_books")
+def count_books(con):
+    '''
+    Returns how many books are in the reading list
+    '''
+    cursor = con.cursor()
+    cursor.execute("SELECT COUNT(*) FROM reading_list")
+    return cursor.fetchone()[0]
 
 
 # Function to get book by title
+@timed("db.get_book_id")
 def get_book_id(con, title):
     '''
     Returns book ID from database matching the given title
@@ -124,6 +517,7 @@ def get_book_id(con, title):
 
 
 # Function to get all books
+@timed("db.get_all_books")
 def get_all_books(con):
     '''
     Returns all books stored in the reading list table
@@ -139,7 +533,55 @@ def get_all_books(con):
     return books
 
 
+# Function to stream books without loading them all
+def iter_books(con, status=None, batch_size=500, compact=False):
+    '''
+    Yields reading list rows in id order, optionally only those with the given
+    status, fetching `batch_size` rows at a time so memory stays flat.
+    With `compact` the summary column is left out.
+    '''
+    columns = "id, title, author, status" if compact else "*"
+    cursor = con.cursor()
+    # timed per batch, a span around the generator would include the caller's work too
+    with span("db.iter_books"):
+        if status:
+            cursor.execute(f'''SELECT {columns} FROM reading_list WHERE status = ? ORDER BY id''',
+                           (status,))
+        else:
+            cursor.execute(f'''SELECT {columns} FROM reading_list ORDER BY id''')
+    while True:
+        with span("db.iter_books.fetch"):
+            rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+# Function to get one page of books
+@timed("db.get_books_page")
+def get_books_page(con, after_id=0, limit=20, status=None, compact=False):
+    '''
+    Returns up to `limit` books with an id greater than `after_id`, in id order
+    (keyset pagination, so any page costs the same as the first). Pass the last
+    id of a page as `after_id` to get the next one. With `compact` the summary
+    column is not read at all and rows are (id, title, author, status).
+    '''
+    columns = "id, title, author, status" if compact else "id, title, author, status, summary"
+    query = f"SELECT {columns} FROM reading_list WHERE id > ?"
+    params = [after_id]
+    if status:
+        query += " AND status = ?"
+        params.append(status)
+    query += " ORDER BY id LIMIT ?"
+    params.append(limit if limit else -1)
+
+    cursor = con.cursor()
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+
 # Function to return books by status
+@timed("db.get_books_by_status")
 def get_books_by_status(con, status):
     '''
     Returns all books with the given status from the reading list table
@@ -156,6 +598,105 @@ def get_books_by_status(con, status):
     return books
 
 
+# Function to get the newest book ID
+@timed("db.get_max_book_id")
+def get_max_book_id(con):
+    '''
+    Returns the highest book ID in the reading list, 0 if it is empty
+    '''
+    cursor = con.cursor()
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM reading_list")
+    return cursor.fetchone()[0]
+
+
+# Function to find books that still need a summary
+@timed("db.get_books_missing_summary")
+def get_books_missing_summary(con, after_id=0, limit=100):
+    '''
+    Returns up to `limit` (id, title, author) rows with an empty or placeholder
+    summary and an id greater than `after_id`, in id order
+    '''
+    cursor = con.cursor()
+    cursor.execute(
+        '''SELECT id, title, author FROM reading_list
+           WHERE id > ? AND (summary IS NULL OR summary = \'\'
+                             OR summary = 'No summary available.')
+           ORDER BY id LIMIT ?''',
+        (after_id, limit),
+    )
+    return cursor.fetchall()
+
+
+# Function to count books that still need a summary
+@timed("db.count_books_missing_summary")
+def count_books_missing_summary(con, after_id=0):
+    '''
+    Returns how many books after `after_id` have an empty or placeholder summary
+    '''
+    cursor = con.cursor()
+    cursor.execute(
+        '''SELECT COUNT(*) FROM reading_list
+           WHERE id > ? AND (summary IS NULL OR summary = \'\'
+                             OR summary = 'No summary available.')''',
+        (after_id,),
+    )
+    return cursor.fetchone()[0]
+
+
+# Function to store summaries for existing books
+@timed("db.update_book_summaries")
+def update_book_summaries(con, updates):
+    '''
+    Sets the summary for each (book_id, summary) pair in a single transaction
+    '''
+    cursor = con.cursor()
+    cursor.executemany(
+        "UPDATE reading_list SET summary = ? WHERE id = ?",
+        [(summary, book_id) for book_id, summary in updates],
+    )
+    con.commit()
+    return cursor.rowcount
+
+
+# Function to turn what the user typed into an FTS5 query
+def fts_query(terms):
+    '''
+    Quotes every word (so punctuation can't break the query syntax) and lets
+    the last one match as a prefix, e.g. "hunger gam" -> "hunger" "gam"*
+    '''
+    words = [word.replace('"', '""') for word in " ".join(terms).split()]
+    if not words:
+        return ""
+    quoted = [f'"{word}"' for word in words]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+# Function to search the saved books
+@timed("db.search_books")
+def search_books(con, terms, limit=10):
+    '''
+    Full-text searches title, author and summary of the saved books and returns
+    (id, title, author, status, snippet) rows, best bm25 match first.
+    Title matches count the most, then author, then summary.
+    '''
+    query = fts_query(terms if isinstance(terms, (list, tuple)) else [terms])
+    if not query:
+        return []
+    cursor = con.cursor()
+    cursor.execute(
+        '''SELECT r.id, r.title, r.author, r.status,
+                  snippet(reading_list_fts, -1, '[', ']', '...', 12)
+           FROM reading_list_fts
+           JOIN reading_list AS r ON r.id = reading_list_fts.rowid
+           WHERE reading_list_fts MATCH ?
+           ORDER BY bm25(reading_list_fts, 10.0, 5.0, 1.0)
+           LIMIT ?''',
+        (query, limit),
+    )
+    return cursor.fetchall()
+
+
 # Function to display maybe? display in a pretty and readble way
 def display_books(books):
     '''
@@ -164,3 +705,330 @@ def display_books(books):
     for book in books:
         print(f"ID: {book[0]}, Title: {book[1]}, Author: {book[2]}, "
               f"Status: {book[3]}, Summary: {book[4]}")
+
+
+# Function to normalize titles and authors for cache lookups
+def normalize_key(text):
+    '''
+    Lowercases text and collapses whitespace so "The  Hobbit" matches "the hobbit"
+    '''
+    return " ".join((text or "").lower().split())
+
+
+# Function to look up a cached summary
+@timed("db.get_cached_summary")
+def get_cached_summary(con, title, author, model, ttl=None):
+    '''
+    Returns the cached summary for a book and model, or None if there is none.
+    Entries older than `ttl` seconds are ignored. If the cache has nothing, a
+    summary already saved with the book in the reading list is used (and cached).
+    '''
+    cursor = con.cursor()
+    key = (normalize_key(title), normalize_key(author), model)
+    now = time.time()
+    cursor.execute(
+        '''SELECT summary, created_at FROM summary_cache
+           WHERE title_key = ? AND author_key = ? AND model = ?''',
+        key,
+    )
+    row = cursor.fetchone()
+    if row is not None and (not ttl or now - row[1] < ttl):
+        # touch the entry so LRU eviction keeps it around
+        cursor.execute(
+            '''UPDATE summary_cache SET last_used = ?
+               WHERE title_key = ? AND author_key = ? AND model = ?''',
+            (now,) + key,
+        )
+        # commit right away, holding the write lock would block the rate limiter
+        # and usage counters (their own connections) for the rest of the search
+        con.commit()
+        return row[0]
+
+    # fall back to a summary we already saved with the book
+    cursor.execute(
+        '''SELECT summary FROM reading_list
+           WHERE title = ? AND author = ? AND summary IS NOT NULL
+             AND summary != 'No summary available.' AND summary != \'\'
+           LIMIT 1''',
+        (title, author),
+    )
+    saved = cursor.fetchone()
+    if saved is None:
+        return None
+    cursor.execute(
+        '''INSERT OR REPLACE INTO summary_cache
+           (title_key, author_key, model, summary, created_at, last_used)
+           VALUES (?, ?, ?, ?, ?, ?)''',
+        key + (saved[0], now, now),
+    )
+    con.commit()
+    return saved[0]
+
+
+# Function to store summaries in the cache
+@timed("db.cache_summaries")
+def cache_summaries(con, entries, model, ttl=None, max_entries=None):
+    '''
+    Stores (title, author, summary) entries in the summary cache for the given
+    model, then evicts expired entries and the least recently used ones above
+    `max_entries`. Everything is committed at once.
+    '''
+    cursor = con.cursor()
+    now = time.time()
+    cursor.executemany(
+        '''INSERT OR REPLACE INTO summary_cache
+           (title_key, author_key, model, summary, created_at, last_used)
+           VALUES (?, ?, ?, ?, ?, ?)''',
+        [(normalize_key(title), normalize_key(author), model, summary, now, now)
+         for title, author, summary in entries],
+    )
+    if ttl:
+        cursor.execute("DELETE FROM summary_cache WHERE created_at < ?", (now - ttl,))
+    if max_entries:
+        cursor.execute(
+            '''DELETE FROM summary_cache WHERE rowid IN (
+                   SELECT rowid FROM summary_cache
+                   ORDER BY last_used DESC LIMIT -1 OFFSET ?)''',
+            (max_entries,),
+        )
+    con.commit()
+
+
+# Function to count cache hits and misses
+@timed("db.record_cache_stats")
+def record_cache_stats(con, hits, misses):
+    '''
+    Adds to the running summary cache hit/miss counters
+    '''
+    cursor = con.cursor()
+    cursor.execute(
+        '''UPDATE summary_cache_stats SET hits = hits + ?, misses = misses + ?
+           WHERE id = 1''',
+        (hits, misses),
+    )
+    con.commit()
+
+
+# Function to report cache hits and misses
+@timed("db.get_cache_stats")
+def get_cache_stats(con):
+    '''
+    Returns (hits, misses, entries) for the summary cache
+    '''
+    cursor = con.cursor()
+    cursor.execute("SELECT hits, misses FROM summary_cache_stats WHERE id = 1")
+    row = cursor.fetchone() or (0, 0)
+    cursor.execute("SELECT COUNT(*) FROM summary_cache")
+    return row[0], row[1], cursor.fetchone()[0]
+
+
+# Function to report API usage
+@timed("db.get_api_usage")
+def get_api_usage(con, days=7):
+    '''
+    Returns (day, api, calls, tokens) rows for the last `days` days, newest first
+    '''
+    cursor = con.cursor()
+    cursor.execute(
+        '''SELECT day, api, calls, tokens FROM api_usage
+           WHERE day >= date('now', 'localtime', ?)
+           ORDER BY day DESC, api''',
+        (f"-{max(days, 1) - 1} days",),
+    )
+    return cursor.fetchall()
+
+
+# Function to add up API metrics per hour
+@timed("db.save_metrics")
+def save_metrics(con, rows, retention_hours=None):
+    '''
+    Adds (hour, name, model, calls, errors, total_ms, max_ms, tokens, histogram) rows
+    to metrics_hourly, merging them with what is already stored for that hour.
+    Hours older than `retention_hours` before the newest one are dropped, so the
+    table only ever holds a fixed window.
+    '''
+    cursor = con.cursor()
+    try:
+        for hour, name, model, calls, errors, total_ms, max_ms, tokens, histogram in rows:
+            cursor.execute(
+                '''SELECT calls, errors, total_ms, max_ms, tokens, histogram FROM metrics_hourly
+                   WHERE hour = ? AND name = ? AND model = ?''',
+                (hour, name, model),
+            )
+            old = cursor.fetchone()
+            if old is not None:
+                old_histogram = json.loads(old[5])
+                size = max(len(old_histogram), len(histogram))
+                histogram = [(old_histogram[i] if i < len(old_histogram) else 0)
+                             + (histogram[i] if i < len(histogram) else 0) for i in range(size)]
+                calls, errors = calls + old[0], errors + old[1]
+                total_ms, max_ms, tokens = total_ms + old[2], max(max_ms, old[3]), tokens + old[4]
+            cursor.execute(
+                '''INSERT OR REPLACE INTO metrics_hourly
+                   (hour, name, model, calls, errors, total_ms, max_ms, tokens, histogram)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                (hour, name, model, calls, errors, total_ms, max_ms, tokens, json.dumps(histogram)),
+            )
+        if retention_hours:
+            cursor.execute(
+                "DELETE FROM metrics_hourly WHERE hour <= (SELECT MAX(hour) FROM metrics_hourly) - ?",
+                (retention_hours,),
+            )
+        con.commit()
+    except sqlite3.Error:
+        con.rollback()
+        raise
+
+
+# Function to read API metrics back
+@timed("db.get_metrics")
+def get_metrics(con, since_hour=0):
+    '''
+    Returns (hour, name, model, calls, errors, total_ms, max_ms, tokens, histogram)
+    rows from `since_hour` (hours since the epoch) on, with the histogram as a list
+    '''
+    cursor = con.cursor()
+    cursor.execute(
+        '''SELECT hour, name, model, calls, errors, total_ms, max_ms, tokens, histogram
+           FROM metrics_hourly WHERE hour >= ? ORDER BY hour, name, model''',
+        (since_hour,),
+    )
+    return [row[:8] + (json.loads(row[8]),) for row in cursor.fetchall()]
+
+
+# Function to read where a resumable job stopped
+@timed("db.get_checkpoint")
+def get_checkpoint(con, job):
+    '''
+    Returns (last_id, done, failed) saved for a job, or None if it has none
+    '''
+    cursor = con.cursor()
+    cursor.execute("SELECT last_id, done, failed FROM checkpoints WHERE job = ?", (job,))
+    return cursor.fetchone()
+
+
+# Function to remember where a resumable job got to
+@timed("db.save_checkpoint")
+def save_checkpoint(con, job, last_id, done=0, failed=0):
+    '''
+    Saves (replacing) a job's checkpoint: the last book ID it handled and its counts
+    '''
+    cursor = con.cursor()
+    cursor.execute(
+        '''INSERT OR REPLACE INTO checkpoints (job, last_id, done, failed, updated_at)
+           VALUES (?, ?, ?, ?, ?)''',
+        (job, last_id, done, failed, time.time()),
+    )
+    con.commit()
+
+
+# Function to forget a finished job
+@timed("db.clear_checkpoint")
+def clear_checkpoint(con, job):
+    '''
+    Deletes a job's checkpoint, so its next run starts from the beginning
+    '''
+    cursor = con.cursor()
+    cursor.execute("DELETE FROM checkpoints WHERE job = ?", (job,))
+    con.commit()
+
+
+# Function to find the file behind a connection
+def database_file(con):
+    '''
+    Returns the file path of the main database, or None for an in-memory one
+    '''
+    for _, name, path in con.execute("PRAGMA database_list"):
+        if name == "main":
+            return path or None
+    return None
+
+
+# Function to remember Google Books volumes
+@timed("db.save_volumes")
+def save_volumes(con, items):
+    '''
+    Stores raw Google Books items (with "id" and "volumeInfo") in the volumes
+    table, replacing older copies, so they can be searched offline later
+    '''
+    now = time.time()
+    rows = []
+    for item in items:
+        volume_id = item.get("id")
+        if not volume_id:
+            continue
+        info = item.get("volumeInfo", {})
+        title = info.get("title", "No title available")
+        authors = info.get("authors", [])
+        rows.append((volume_id, title, json.dumps(authors), normalize_key(title),
+                     normalize_key(", ".join(authors)), json.dumps(info), now))
+    cursor = con.cursor()
+    cursor.executemany(
+        '''INSERT OR REPLACE INTO volumes
+           (volume_id, title, authors, title_key, authors_key, info, fetched_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?)''',
+        rows,
+    )
+    con.commit()
+    return len(rows)
+
+
+# Function to search the volumes we have seen before
+@timed("db.search_volumes")
+def search_volumes(con, query, limit=5, fuzzy_cutoff=0.75):
+    '''
+    Answers a search from the local volumes table, shaped like get_top5_books results.
+    Title prefix matches come first, then author prefix matches (both index range
+    scans), then titles or authors containing the query. Only if none of those
+    match are fuzzy (typo tolerant) matches scoring at least `fuzzy_cutoff` tried.
+    '''
+    key = normalize_key(query)
+    if not key:
+        return []
+    cursor = con.cursor()
+    found = {}
+
+    def add(rows):
+        for volume_id, title, authors in rows:
+            if len(found) < limit and volume_id not in found:
+                found[volume_id] = {"volume_id": volume_id, "title": title,
+                                    "authors": json.loads(authors)}
+
+    # prefix matches, "key <= column < key + max char" is an index range scan
+    for column in ("title_key", "authors_key"):
+        if len(found) < limit:
+            cursor.execute(
+                f'''SELECT volume_id, title, authors FROM volumes
+                    WHERE {column} >= ? AND {column} < ? ORDER BY {column} LIMIT ?''',
+                (key, key + "\U0010ffff", limit),
+            )
+            add(cursor.fetchall())
+
+    # the query somewhere inside a title or author name
+    if len(found) < limit:
+        cursor.execute(
+            '''SELECT volume_id, title, authors FROM volumes
+               WHERE instr(title_key, ?) > 0 OR instr(authors_key, ?) > 0
+               ORDER BY title_key LIMIT ?''',
+            (key, key, limit * 2),
+        )
+        add(cursor.fetchall())
+
+    # typos: score every volume, best match first
+    if not found:
+        matcher = difflib.SequenceMatcher(b=key)
+        scored = []
+        cursor.execute("SELECT volume_id, title, authors, title_key, authors_key FROM volumes")
+        for volume_id, title, authors, title_key, authors_key in cursor:
+            best = 0.0
+            # compare against each same-length window of the text, so short queries can hit long titles
+            for text in (title_key, authors_key):
+                for start in range(max(1, len(text) - len(key) + 1)):
+                    matcher.set_seq1(text[start:start + len(key)])
+                    if matcher.quick_ratio() >= fuzzy_cutoff:
+                        best = max(best, matcher.ratio())
+            if best >= fuzzy_cutoff:
+                scored.append((-best, title_key, (volume_id, title, authors)))
+        add(row for _score, _key, row in sorted(scored))
+
+    return list(found.values())
@@ -0,0 +1,129 @@
+#Here we read (and write) whole reading lists from files for bulk import and export
+import csv
+import json
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, TextIO, Tuple
+
+STATUSES = ("TBR", "Reading", "Read")
+
+#Goodreads "Exclusive Shelf" values mapped onto our statuses
+GOODREADS_SHELVES = {
+    "to-read": "TBR",
+    "currently-reading": "Reading",
+    "read": "Read",
+}
+
+IMPORT_FORMATS = ("csv", "jsonl", "goodreads")
+EXPORT_FORMATS = ("csv", "jsonl")
+EXPORT_FIELDS = ("id", "title", "author", "status", "summary")
+
+
+def detect_format(path: Path) -> str:
+    """
+    Guesses the import format from the file extension and, for CSV files,
+    from the header (Goodreads exports have an "Exclusive Shelf" column).
+    """
+    if Path(path).suffix.lower() in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        header = next(csv.reader(file), [])
+    return "goodreads" if "Exclusive Shelf" in header else "csv"
+
+
+def normalize_status(status: Optional[str]) -> str:
+    """
+    Maps a status (ours or a Goodreads shelf) onto TBR/Reading/Read, defaulting to TBR.
+    """
+    status = (status or "").strip()
+    if status.lower() in GOODREADS_SHELVES:
+        return GOODREADS_SHELVES[status.lower()]
+    for known in STATUSES:
+        if status.lower() == known.lower():
+            return known
+    return "TBR"
+
+
+def _book_from_record(record: Dict) -> Optional[Tuple[str, str, str, Optional[str]]]:
+    """
+    Turns one csv/jsonl record into an add_books tuple, None if it has no title.
+    Raises ValueError if the record is not an object or a field has the wrong type.
+    """
+    if not isinstance(record, dict):
+        raise ValueError(f"expected an object, got {type(record).__name__}")
+    #Lowercase the keys so "Title" and "title" both work
+    record = {str(key).strip().lower(): value for key, value in record.items() if key is not None}
+    for field in ("title", "author", "status", "summary"):
+        if record.get(field) is not None and not isinstance(record[field], str):
+            raise ValueError(f"'{field}' must be a string, got {type(record[field]).__name__}")
+    authors = record.get("authors")
+    if authors is not None and not (isinstance(authors, str) or (
+            isinstance(authors, list) and all(isinstance(name, str) for name in authors))):
+        raise ValueError("'authors' must be a string or a list of strings")
+
+    title = (record.get("title") or "").strip()
+    if not title:
+        return None
+    author = (record.get("author") or authors or "Unknown")
+    if isinstance(author, list):
+        author = ", ".join(author)
+    summary = record.get("summary") or None
+    return title, author.strip() or "Unknown", normalize_status(record.get("status")), summary
+
+
+def read_books(path: Path, fmt: Optional[str] = None) -> Iterator[Tuple[str, str, str, Optional[str]]]:
+    """
+    Streams (title, author, status, summary) tuples out of a CSV, JSONL or Goodreads
+    export one line at a time, so files of any size use constant memory.
+    Rows without a title are skipped.
+    """
+    fmt = fmt or detect_format(path)
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Unknown import format '{fmt}', choose one of: {', '.join(IMPORT_FORMATS)}")
+
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        if fmt == "jsonl":
+            for line_number, line in enumerate(file, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    book = _book_from_record(json.loads(line))
+                except ValueError as e:
+                    raise ValueError(f"line {line_number}: {e}") from None
+                if book:
+                    yield book
+        elif fmt == "goodreads":
+            for row in csv.DictReader(file):
+                title = (row.get("Title") or "").strip()
+                if not title:
+                    continue
+                author = (row.get("Author") or "").strip() or "Unknown"
+                yield title, author, normalize_status(row.get("Exclusive Shelf")), None
+        else:
+            for row in csv.DictReader(file):
+                book = _book_from_record(row)
+                if book:
+                    yield book
+
+
+def write_books(rows: Iterable[Tuple], file: TextIO, fmt: str = "csv") -> int:
+    """
+    Writes reading list rows (id, title, author, status, summary) to an open text
+    file as CSV or JSONL, one row at a time. Returns the number of rows written.
+    The output can be imported again with read_books.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}', choose one of: {', '.join(EXPORT_FORMATS)}")
+
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(file)
+        writer.writerow(EXPORT_FIELDS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            file.write(json.dumps(dict(zip(EXPORT_FIELDS, row))) + "\n")
+            count += 1
+    return count
@@ -1,123 +1,283 @@
-# Getting rid of weird warnings in the terminal
-import warnings
-from urllib3.exceptions import NotOpenSSLWarning
-warnings.filterwarnings("ignore", category=NotOpenSSLWarning)
-
 # Here we can set up the command line interface
 # make sure we search for a book, add a book to the list,
 # and retrieve the list from the db
+import csv
+import itertools
 import json
+import os
+import sqlite3
+import time
 from pathlib import Path
 
 import click
 
-from app.config import DATABASE_URL
-from app.google_books import get_top5_books
-from app.genai import generate_summary
-from app.book_list_db import create_connection, set_up, add_book, get_all_books, get_books_by_status, update_book_status, get_book_id, delete_book
+from app.config import (DATABASE_URL, GOOGLE_GENAI_MODEL, SUMMARY_CACHE_TTL, SUMMARY_CACHE_MAX_ENTRIES, SUMMARY_BATCH,
+                        SQLITE_PROFILE, IMPORT_BATCH_SIZE, SUMMARY_MAX_WORKERS, SEARCH_DEADLINE)
+from app import rate_limit
+from app.resilience import Deadline
+from app.google_books import get_top5_books, get_session
+from app.genai import get_client, generate_summary, generate_summaries, iter_summaries, NO_SUMMARY
+from app.book_list_db import (create_connection, ensure_schema, add_book,
+                              update_book_status, delete_book, get_cached_summary,
+                              cache_summaries, record_cache_stats, get_cache_stats, add_books,
+                              get_max_book_id, iter_books, get_books_page, get_book_id_at, count_books,
+                              get_book_id_ranges_at, update_books_status, delete_books, search_books, save_volumes,
+                              search_volumes, get_api_usage, database_file, clear_checkpoint)
+from app.bulk_io import IMPORT_FORMATS, EXPORT_FORMATS, read_books, write_books
+import app
+from app import backfill as backfill_job, metrics, timings
 
 #Store the last search so that the 'add_book' command knows which book to add
 LAST_SEARCH = Path('last_search.json')
 
 def get_db_connection():
     """ Create and return new sqlite database connection """
-    conn = create_connection()
+    conn = create_connection(profile=SQLITE_PROFILE)
     return conn
 
 
-def initialize():
-    """ Make sure the database table exists """
-    conn = get_db_connection()
-    set_up(conn)
-    conn.close()
+def save_last_search(data):
+    """ Write the last search results to disk, replacing the old file in one step """
+    path = Path(LAST_SEARCH)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, 'w') as file:
+        json.dump(data, file, indent=4)
+    os.replace(tmp, path)
+
+
+class Database:
+    """ The one sqlite connection a command invocation uses, opened on first use """
+
+    def __init__(self):
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = get_db_connection()
+            #Only creates tables when PRAGMA user_version says the schema is out of date
+            ensure_schema(self._conn, on_merge = lambda merged: click.echo(
+                f"Merged {merged} duplicate books into their first copy while upgrading "
+                "your reading list.", err = True))
+            #API calls made from here on share the rate limit buckets stored in this database
+            rate_limit.configure(database_file(self._conn))
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            rate_limit.configure(None)
+            self._conn.close()
+            self._conn = None
+
+
+#Hands the invocation's Database to a command
+pass_db = click.make_pass_decorator(Database)
+
+
+def flush_metrics(db):
+    """ Stores the API metrics this command collected, without failing the command over them """
+    if not metrics.pending():
+        return
+    try:
+        metrics.flush(db.conn)
+    except sqlite3.Error as e:
+        click.echo(f"Could not save API metrics: {e}", err = True)
+
+
+def start_timings(ctx, show, log_path, cold):
+    """ Collects timing spans for this command, printing them (and closing the JSON log) at the end """
+    log = None
+    if log_path == "-":
+        log = click.get_text_stream("stderr")
+    elif log_path:
+        log = open(log_path, "a", encoding = "utf-8")
+        ctx.call_on_close(log.close)
+    timings.enable(log)
+    if cold:
+        timings.record("startup", time.perf_counter() - app.STARTED_AT)
+
+    def finish():
+        timings.disable()
+        if show:
+            click.echo("\n" + timings.format_summary(), err = True)
+    ctx.call_on_close(finish)
+
+
+def start_profile(ctx, path):
+    """ Runs the command under cProfile and writes the stats to `path` at the end """
+    import cProfile
+    profiler = cProfile.Profile()
+
+    def finish():
+        profiler.disable()
+        profiler.dump_stats(path)
+        click.echo(f"Profile written to {path} (view it with: python -m pstats {path})", err = True)
+    ctx.call_on_close(finish)
+    profiler.enable()
 
 
 @click.group()
-def cli():
+@click.option("--timings", "show_timings", is_flag = True,
+              help = "Print how long startup, Google Books, GenAI and database calls took (to stderr).")
+@click.option("--profile", "profile_path", type = click.Path(dir_okay = False),
+              help = "Write a cProfile dump of the command to this file (main thread only).")
+@click.option("--log-json", type = click.Path(dir_okay = False, allow_dash = True),
+              help = "Append every timing span as a JSON line to this file ('-' for stderr).")
+@click.pass_context
+def cli(ctx, show_timings, profile_path, log_json):
     """ Command line interface for managing your reading list! """
-    initialize()
+    #`bookclub serve` passes in its own Database, which stays open between commands
+    cold = ctx.obj is None
+    if cold:
+        ctx.obj = Database()
+        ctx.call_on_close(ctx.obj.close)
+    ctx.call_on_close(lambda: flush_metrics(ctx.obj))
+
+    if show_timings or log_json:
+        start_timings(ctx, show_timings, log_json, cold)
+    if profile_path:
+        start_profile(ctx, profile_path)
 
 @cli.command()
 @click.argument('query', type=str, nargs=-1)
+@click.option("--batch/--no-batch", default=SUMMARY_BATCH,
+              help="Ask the model for all summaries in one batched prompt.")
+@click.option("--offline", is_flag=True,
+              help="Only search books seen in earlier searches, without any network calls.")
+@pass_db
 
-def search(query):
+def search(db, query, batch, offline):
     """ Search the Google Books API for the query and show the top 5 results with AI summaries """
     q = ' '.join(query).strip()
     if not q:
         click.echo("Please provide a search query!")
         return
 
-    #Get top 5 query results
-    try:
-        books = get_top5_books(q)
-    except Exception as e:
-        click.echo(f"Error fetching books: {e}")
-        return
+    #The whole search (Books and summaries) has to fit in SEARCH_DEADLINE
+    deadline = Deadline(SEARCH_DEADLINE)
+
+    #Get top 5 query results, remembering every volume we see for offline use
+    if offline:
+        books = search_volumes(db.conn, q)
+    else:
+        seen_items = []
+        #Opening the database first turns on the shared Google Books rate limit
+        db.conn
+        try:
+            books = get_top5_books(q, strict=True, on_items=seen_items.extend, deadline=deadline)
+        except Exception as e:
+            #Google Books is down or timed out, answer from the volumes we have seen before
+            click.echo(f"Error fetching books: {e}")
+            click.echo("Showing matches from earlier searches instead.\n")
+            offline = True
+            books = search_volumes(db.conn, q)
+        else:
+            save_volumes(db.conn, seen_items)
 
     if not books:
         click.echo(f"No results found for '{q}'. Please try a different query!")
         return
 
-    data = []
     click.echo(f"Top {len(books)} results for \'{q}\':\n")
-    #Get ai summaries for each book
-    for index, book in enumerate(books, start = 1):
-        title = book["title"]
+    #Work out the authors for each book before asking for summaries
+    book_authors = []
+    for book in books:
         if book.get("authors"):
             authors = book["authors"]
         elif book.get("author"):
             authors = book["author"]
         else:
             authors = ["Unknown"]
-        first_author = authors[0]
-        try:
-            summary = generate_summary(title, first_author)
-        except Exception as e:
-            click.echo(f"Error generating summary for {title}: {e}")
-            summary = "No summary available."
-        #Display resulting book info
-        click.echo(f"[{index}] {title} by {', '.join(authors)}")
-        click.echo(f"Summary: {summary}\n")
-
-        #Store book info for later
-        data.append({
-            "title": title,
+        book_authors.append(authors)
+
+    #Use cached summaries first so repeat searches skip the model entirely
+    conn = db.conn
+    summaries = []
+    missing = []
+    for index, (book, authors) in enumerate(zip(books, book_authors)):
+        summary = get_cached_summary(conn, book["title"], ", ".join(authors),
+                                     GOOGLE_GENAI_MODEL, ttl=SUMMARY_CACHE_TTL)
+        if summary is None:
+            missing.append(index)
+        summaries.append(summary)
+
+    #Show the results right away, summaries that are still coming get filled in below
+    for index, (book, authors, summary) in enumerate(zip(books, book_authors, summaries), start = 1):
+        click.echo(f"[{index}] {book['title']} by {', '.join(authors)}")
+        if summary is not None:
+            click.echo(f"Summary: {summary}")
+        click.echo()
+
+    #Store book info for later, so 'add' already works while summaries are pending
+    data = [
+        {
+            "title": book["title"],
             "author": ", ".join(authors),
-            "summary": summary
-        })
+            "summary": summary if summary is not None else NO_SUMMARY,
+        }
+        for book, authors, summary in zip(books, book_authors, summaries)
+    ]
+    save_last_search(data)
+
+    #Stream ai summaries for every remaining book as each one finishes
+    #(offline we only show cached summaries, the model is not asked)
+    pairs = [] if offline else [(books[index]["title"], book_authors[index][0]) for index in missing]
+    if pairs:
+        click.echo(f"Generating {len(pairs)} summaries...\n")
+    if batch and pairs:
+        #One model call for every book, per-book calls only for what it got wrong
+        errors = {}
+        batched = generate_summaries(pairs, summarize=generate_summary,
+                                     on_error=lambda position, error: errors.update({position: error}),
+                                     deadline=deadline)
+        stream = ((position, summary, errors.get(position)) for position, summary in enumerate(batched))
+    else:
+        stream = iter_summaries(pairs, summarize=generate_summary, deadline=deadline)
+
+    new_entries = []
+    for position, summary, error in stream:
+        index = missing[position]
+        title = books[index]["title"]
+        if error is not None:
+            click.echo(f"Error generating summary for {title}: {error}")
+        else:
+            new_entries.append((title, data[index]["author"], summary))
+        data[index]["summary"] = summary
+        click.echo(f"[{index + 1}] {title}")
+        click.echo(f"Summary: {summary}\n")
+        save_last_search(data)
 
-    #Store the last search results to a file
-    with open(LAST_SEARCH, 'w') as file:
-        json.dump(data, file, indent=4)
+    cache_summaries(conn, new_entries, GOOGLE_GENAI_MODEL,
+                    ttl=SUMMARY_CACHE_TTL, max_entries=SUMMARY_CACHE_MAX_ENTRIES)
+    record_cache_stats(conn, len(books) - len(missing), len(missing))
+    metrics.count("summary_cache.hit", len(books) - len(missing))
+    metrics.count("summary_cache.miss", len(missing))
 
     click.echo("Run 'bookclub add <number>' to save one of these books to your reading list!")
 
 @cli.command()
 @click.argument('index', type=int)
+@pass_db
 
-def add(index):
+def add(db, index):
     """ Add one of the last search results (by its index) to your reading list """
-    if not LAST_SEARCH.exists():
+    last_search = Path(LAST_SEARCH)
+    if not last_search.exists():
         click.echo("No previous search results found. Please run 'bookclub search <query>' first!")
         return
 
-    data = json.loads(LAST_SEARCH.read_text())
+    data = json.loads(last_search.read_text())
     if index < 1 or index > len(data):
         click.echo(f"Invalid index. Please choose a number between 1 and {len(data)}.")
         return
 
     table_entry = data[index - 1]
-    conn = get_db_connection()
-
-    try:
-        was_inserted = add_book(
-            conn, 
-            table_entry["title"], 
-            table_entry["author"], 
-            table_entry["summary"]
-            )
-    finally: 
-        conn.close()
+    was_inserted = add_book(
+        db.conn,
+        table_entry["title"],
+        table_entry["author"],
+        table_entry["summary"]
+        )
 
     if was_inserted:
         click.echo(f"Added {table_entry['title']} by {table_entry['author']} to your reading list.")
@@ -131,81 +291,409 @@ def add(index):
     type = click.Choice(["TBR", "Reading", "Read"], case_sensitive=False),
     help = "Filter books by their status (TBR, Reading, Read)."
 )
+@click.option("--limit", type = click.IntRange(min = 1), help = "Show at most this many books (one page).")
+@click.option("--after-id", type = click.IntRange(min = 0), default = 0,
+              help = "Start after the book with this ID (the last ID of the previous page).")
+@click.option("--compact", is_flag = True, help = "Leave out the summaries.")
+@pass_db
 
-
-def list_books(status):
+def list_books(db, status, limit, after_id, compact):
     """ 
     List all books in reading list along with their ai summaries - optionally filtered by status
     """
-    conn = get_db_connection()
+    if limit or after_id:
+        list_page(db, status, limit, after_id, compact)
+        return
 
+    #Stream the rows so the first book prints right away, whatever the list size
     try:
-        if status:
-            rows = get_books_by_status(conn, status)
-        else:
-            rows = get_all_books(conn)
+        rows = iter_books(db.conn, status, compact = compact)
+        first = next(rows, None)
     except Exception as e:
         click.echo(f"Error retrieving books: {e}")
         return
-    finally:
-        conn.close()
 
-    if not rows:
+    if first is None:
         click.echo("Your reading list is empty!")
         return
 
     click.echo("Your reading list:\n")
-    for index, (_db_id, title, author, status, summary) in enumerate(rows, start=1):
-        click.echo(f"{index}. {title} by {author} [{status}]")
-        click.echo(f"Summary: {summary}\n")
+    for index, row in enumerate(itertools.chain([first], rows), start=1):
+        _db_id, title, author, book_status = row[:4]
+        click.echo(f"{index}. {title} by {author} [{book_status}]")
+        if not compact:
+            click.echo(f"Summary: {row[4]}\n")
+
+
+def list_page(db, status, limit, after_id, compact):
+    """ Show one keyset page of the reading list, labelled by book ID """
+    try:
+        rows = get_books_page(db.conn, after_id, limit, status, compact)
+    except Exception as e:
+        click.echo(f"Error retrieving books: {e}")
+        return
+
+    if not rows:
+        click.echo("No more books in your reading list." if after_id else "Your reading list is empty!")
+        return
+
+    for row in rows:
+        db_id, title, author, book_status = row[:4]
+        click.echo(f"ID {db_id}: {title} by {author} [{book_status}]")
+        if not compact:
+            click.echo(f"Summary: {row[4]}\n")
+
+    if limit and len(rows) == limit:
+        options = f" --status {status}" if status else ""
+        options += " --compact" if compact else ""
+        click.echo(f"Next page: bookclub list --limit {limit} --after-id {rows[-1][0]}{options}")
+
+STATUS_CHOICE = click.Choice(["TBR", "Reading", "Read"], case_sensitive = False)
+
+
+#Largest number sqlite can store, so the largest possible book ID or list position
+MAX_TARGET = 2 ** 63 - 1
+
+
+def parse_targets(values):
+    """ Turn arguments like 3 5 10-20 into sorted, merged (first, last) ranges, without expanding them """
+    ranges = []
+    for value in values:
+        start, dash, end = value.partition("-")
+        try:
+            first = int(start)
+            last = int(end) if dash else first
+            if first > last:
+                raise ValueError
+        except ValueError:
+            raise click.BadParameter(f"'{value}' is not a number or a range like 10-20.",
+                                     param_hint = "INDEXES")
+        if last > MAX_TARGET:
+            raise click.BadParameter(f"'{value}' is larger than any book ID or position can be.",
+                                     param_hint = "INDEXES")
+        ranges.append((first, last))
+
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def format_targets(ranges):
+    """ [(3, 3), (10, 20)] -> '3, 10-20' """
+    return ", ".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+
+def resolve_book_id(conn, index, by_id):
+    """ Turn a list position (or, with --id, a book ID) into a book ID, None if out of range """
+    if by_id:
+        return index
+    db_id = get_book_id_at(conn, index)
+    if db_id is None:
+        click.echo(f"Invalid index. Please choose a number between 1 and {count_books(conn)}.")
+    return db_id
+
+
+def resolve_book_ids(conn, targets, by_id):
+    """
+    Turn ranges of list positions (or, with --id, book IDs) into (first, last) book ID
+    ranges, reporting positions out of range
+    """
+    if by_id:
+        return targets
+    total = count_books(conn)
+    missing = [(max(first, total + 1), last) for first, last in targets if last > total]
+    missing = [(first, min(last, 0)) for first, last in targets if first < 1] + missing
+    if missing:
+        click.echo(f"Skipping positions not in your reading list: {format_targets(missing)}")
+    return get_book_id_ranges_at(conn, [(first, min(last, total)) for first, last in targets
+                                        if first <= total and last >= 1])
 
 @cli.command(name = "update-status")
-@click.argument('index', type = int)
-@click.argument('status', type = click.Choice(["TBR", "Reading", "Read"], case_sensitive = False))
+@click.argument('indexes', nargs = -1)
+@click.argument('status', type = STATUS_CHOICE)
+@click.option("--id", "by_id", is_flag = True, help = "Treat INDEXES as book IDs instead of list positions.")
+@click.option("--where-status", type = STATUS_CHOICE,
+              help = "Only change books that currently have this status (all of them if no INDEXES).")
+@pass_db
+
+def update_status(db, indexes, status, by_id, where_status):
+    """ Update the reading status of books in your reading list, e.g. 3 5 10-20 """
+    targets = parse_targets(indexes)
+    if not targets and not where_status:
+        click.echo("Please give at least one index (e.g. 3 5 10-20) or --where-status.")
+        return
 
-def update_status(index, status):
-    """ Update the reading status of a book in your reading list by id """
-    conn = get_db_connection()
-    rows = get_all_books(conn)
+    if len(targets) == 1 and targets[0][0] == targets[0][1] and not where_status:
+        index = targets[0][0]
+        db_id = resolve_book_id(db.conn, index, by_id)
+        if db_id is None:
+            return
+        ok = update_book_status(db.conn, db_id, status)
 
-    #Make sure index is in range
-    if index < 1 or index > len(rows):
-        click.echo(f"Invalid index. Please choose a number between 1 and {len(rows)}.")
-        conn.close()
+        if not ok:
+            click.echo(f"Book with ID {db_id} not found.")
+        else:
+            click.echo(f"Updated book ID {index} status to {status}.")
         return
-    db_id = rows[index - 1][0]
-    ok = update_book_status(conn, db_id, status)
-    conn.close()
 
-    if not ok:
-        click.echo(f"Book with ID {db_id} not found.")
-    else:
-        click.echo(f"Updated book ID {index} status to {status}.")
+    #Everything else is one set-based UPDATE in a single transaction
+    id_ranges = resolve_book_ids(db.conn, targets, by_id) if targets else None
+    if id_ranges == []:
+        return
+    changed = update_books_status(db.conn, status, where_status = where_status, id_ranges = id_ranges)
+    click.echo(f"Updated {changed} books to {status}.")
 
 @cli.command(name = "delete")
-@click.argument("index", type = int)
-
-def delete(index):
-    "Delete a book from your reading list by its position index in your current list"
-    conn = get_db_connection()
-    rows = get_all_books(conn)
-    #Make sure index is in range
-    if index < 1 or index > len(rows):
-        click.echo(f"Invalid index. Please choose a number between 1 and {len(rows)}.")
-        conn.close()
-        return
-    #Map the books to their real PK ids
-    db_id = rows[index - 1][0]
-
-    #Try to delete the book
-    deleted = delete_book(conn, db_id)
-    conn.close()
-
-    if not deleted:
-        click.echo(f"No book with ID {db_id} found in your reading list.")
+@click.argument("indexes", nargs = -1)
+@click.option("--id", "by_id", is_flag = True, help = "Treat INDEXES as book IDs instead of list positions.")
+@click.option("--where-status", type = STATUS_CHOICE,
+              help = "Only delete books with this status (all of them if no INDEXES).")
+@pass_db
+
+def delete(db, indexes, by_id, where_status):
+    "Delete books from your reading list by their position in your current list (or ID with --id), e.g. 3 5 10-20"
+    targets = parse_targets(indexes)
+    if not targets and not where_status:
+        click.echo("Please give at least one index (e.g. 3 5 10-20) or --where-status.")
+        return
+
+    if len(targets) == 1 and targets[0][0] == targets[0][1] and not where_status:
+        index = targets[0][0]
+        db_id = resolve_book_id(db.conn, index, by_id)
+        if db_id is None:
+            return
+
+        #Try to delete the book
+        deleted = delete_book(db.conn, db_id)
+
+        if not deleted:
+            click.echo(f"No book with ID {db_id} found in your reading list.")
+        else:
+            click.echo(f"Deleted book with ID {index} from your reading list.")
+        return
+
+    #Everything else is one set-based DELETE in a single transaction
+    id_ranges = resolve_book_ids(db.conn, targets, by_id) if targets else None
+    if id_ranges == []:
+        return
+    deleted = delete_books(db.conn, where_status = where_status, id_ranges = id_ranges)
+    click.echo(f"Deleted {deleted} books from your reading list.")
+
+@cli.command(name = "find")
+@click.argument("terms", nargs = -1, required = True)
+@click.option("--limit", type = click.IntRange(min = 1), default = 10, show_default = True,
+              help = "Show at most this many books.")
+@pass_db
+
+def find(db, terms, limit):
+    """ Search the titles, authors and summaries of the books in your reading list """
+    try:
+        rows = search_books(db.conn, list(terms), limit)
+    except sqlite3.OperationalError as e:
+        click.echo(f"Error searching your reading list: {e}")
+        return
+
+    q = " ".join(terms)
+    if not rows:
+        click.echo(f"No books in your reading list match '{q}'.")
+        return
+
+    click.echo(f"Books matching '{q}':\n")
+    for db_id, title, author, status, snippet in rows:
+        click.echo(f"ID {db_id}: {title} by {author} [{status}]")
+        click.echo(f"    {snippet}\n")
+
+@cli.command(name = "cache-stats")
+@pass_db
+
+def cache_stats(db):
+    """ Show how often search summaries were served from the local cache """
+    hits, misses, entries = get_cache_stats(db.conn)
+
+    total = hits + misses
+    rate = (hits / total * 100) if total else 0.0
+    click.echo(f"Summary cache: {entries} entries, {hits} hits, {misses} misses "
+               f"({rate:.1f}% hit rate)")
+
+@cli.command()
+@click.option("--days", type = click.IntRange(min = 1), default = 7, show_default = True,
+              help = "How many days back to show.")
+@pass_db
+
+def quota(db, days):
+    """ Show how many Google Books and GenAI calls (and GenAI tokens) were used per day """
+    rows = get_api_usage(db.conn, days)
+    if not rows:
+        click.echo(f"No API calls in the last {days} days.")
+        return
+
+    click.echo(f"{'Day':<12}{'API':<8}{'Calls':>8}{'Tokens':>10}")
+    for day, api, calls, tokens in rows:
+        click.echo(f"{day:<12}{api:<8}{calls:>8}{tokens:>10}")
+
+@cli.command()
+@click.option("--hours", type = click.IntRange(min = 1), default = 24, show_default = True,
+              help = "How many hours back to report on.")
+@click.option("--prometheus", type = click.Path(dir_okay = False),
+              help = "Also write the numbers to this file in Prometheus text format (for node_exporter).")
+@pass_db
+
+def stats(db, hours, prometheus):
+    """ Show latency percentiles, errors, tokens and cache hit rates of recent API calls """
+    summary = metrics.summarize(db.conn, hours)
+    if prometheus:
+        metrics.write_prometheus(prometheus, metrics.prometheus_text(summary, hours))
+
+    if not summary:
+        click.echo(f"No API calls recorded in the last {hours} hours.")
+        return
+
+    apis = sorted((key, item) for key, item in summary.items() if "." not in key[0])
+
+    click.echo(f"Last {hours} hours:")
+    click.echo(f"{'API':<8}{'Model':<22}{'Calls':>7}{'Errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'Tokens':>10}")
+    for (name, model), item in apis:
+        click.echo(f"{name:<8}{model:<22}{item['calls']:>7}{item['errors']:>8}"
+                   f"{item['p50_ms']:>9.1f}{item['p95_ms']:>9.1f}{item['tokens']:>10}")
+    for label, cache in (("Summary cache", "summary_cache"), ("Google Books cache", "books_cache")):
+        hits, misses = metrics.hit_rate(summary, cache)
+        if hits + misses:
+            click.echo(f"{label}: {hits} hits, {misses} misses "
+                       f"({hits / (hits + misses) * 100:.1f}% hit rate)")
+
+@cli.command(name = "import")
+@click.argument("path", type = click.Path(exists = True, dir_okay = False, path_type = Path))
+@click.option("--format", "fmt", type = click.Choice(IMPORT_FORMATS),
+              help = "File format (csv, jsonl or goodreads), guessed from the file if left out.")
+@click.option("--batch-size", type = click.IntRange(min = 1), default = IMPORT_BATCH_SIZE,
+              show_default = True, help = "Rows inserted per transaction.")
+@click.option("--enrich", is_flag = True,
+              help = "Afterwards, generate AI summaries for imported books that have none.")
+@pass_db
+
+def import_books(db, path, fmt, batch_size, enrich):
+    """ Bulk import books from a CSV, JSONL or Goodreads export file """
+    rows_read = 0
+
+    #Count rows as they stream past on their way into the database
+    def counted(books):
+        nonlocal rows_read
+        for book in books:
+            rows_read += 1
+            yield book
+
+    last_id = get_max_book_id(db.conn)
+    start = time.perf_counter()
+    try:
+        inserted = add_books(db.conn, counted(read_books(path, fmt)), batch_size = batch_size)
+    except (ValueError, OSError, csv.Error) as e:
+        click.echo(f"Error importing books after {rows_read} rows: {e}")
+        return
+    elapsed = time.perf_counter() - start
+    rate = rows_read / elapsed if elapsed > 0 else float(rows_read)
+
+    click.echo(f"Imported {inserted} new books from {rows_read} rows "
+               f"({rows_read - inserted} already in your reading list) "
+               f"in {elapsed:.2f}s ({rate:,.0f} rows/sec).")
+
+    if enrich:
+        summarized = enrich_summaries(db.conn, after_id = last_id)
+        click.echo(f"Generated summaries for {summarized} imported books.")
+
+@cli.command(name = "export")
+@click.option("--format", "fmt", type = click.Choice(EXPORT_FORMATS), default = "csv", show_default = True,
+              help = "Output format.")
+@click.option("--output", "-o", type = click.File("w"), default = "-",
+              help = "File to write to (defaults to standard output).")
+@click.option(
+    "--status",
+    type = click.Choice(["TBR", "Reading", "Read"], case_sensitive=False),
+    help = "Only export books with this status."
+)
+@pass_db
+
+def export_books(db, fmt, output, status):
+    """ Export your reading list as CSV or JSONL, streaming it row by row """
+    count = write_books(iter_books(db.conn, status), output, fmt)
+    if output.name != "<stdout>":
+        click.echo(f"Exported {count} books to {output.name}.")
+
+
+def enrich_summaries(conn, after_id = 0, chunk_size = SUMMARY_MAX_WORKERS * 4):
+    """ Generate summaries for saved books after `after_id` that have none, one chunk at a time """
+    progress = backfill_job.start(conn, job = None, after_id = after_id)
+    try:
+        for progress in backfill_job.run(conn, progress, summarize = generate_summary,
+                                         chunk_size = chunk_size, job = None):
+            click.echo(f"Summarized {progress.done} books so far...")
+    except backfill_job.BackfillStalled as e:
+        click.echo(f"Stopped generating summaries: {e}. Run 'bookclub backfill' to try again.")
+    return progress.done
+
+
+def format_seconds(seconds):
+    """ 75 -> '1m15s' """
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m{seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m"
+
+@cli.command()
+@click.option("--batch-size", type = click.IntRange(min = 1), default = SUMMARY_MAX_WORKERS * 4,
+              show_default = True, help = "Books summarized and written back per chunk.")
+@click.option("--concurrency", type = click.IntRange(min = 1), default = SUMMARY_MAX_WORKERS,
+              show_default = True, help = "Summaries generated at the same time.")
+@click.option("--batch/--no-batch", default = SUMMARY_BATCH,
+              help = "Ask the model for each chunk's summaries in one batched prompt.")
+@click.option("--limit", type = click.IntRange(min = 1),
+              help = "Stop after this many books (run again to continue).")
+@click.option("--restart", is_flag = True, help = "Ignore the saved checkpoint and start from the first book.")
+@pass_db
+
+def backfill(db, batch_size, concurrency, batch, limit, restart):
+    """ Generate AI summaries for saved books that have none, resuming where the last run stopped """
+    conn = db.conn
+    progress = backfill_job.start(conn, restart = restart)
+    if not progress.remaining:
+        click.echo("Every book already has a summary.")
+        #Nothing left, so the next run starts over (and retries earlier failures)
+        clear_checkpoint(conn, backfill_job.BACKFILL_JOB)
+        return
+    if progress.done or progress.failed:
+        click.echo(f"Resuming after book ID {progress.last_id}: {progress.done} done, "
+                   f"{progress.failed} failed so far, {progress.remaining} books left.")
     else:
-        click.echo(f"Deleted book with ID {index} from your reading list.")
-    conn.close()
+        click.echo(f"Backfilling summaries for {progress.remaining} books.")
+
+    summarize_batch = (lambda books, on_error: generate_summaries(
+        books, summarize = generate_summary, on_error = on_error)) if batch else None
+    try:
+        for progress in backfill_job.run(conn, progress, summarize = generate_summary,
+                                         summarize_batch = summarize_batch, chunk_size = batch_size,
+                                         max_workers = concurrency, limit = limit):
+            eta = f", about {format_seconds(progress.eta)} left" if progress.eta is not None else ""
+            click.echo(f"  {progress.done + progress.failed}/{progress.total} books "
+                       f"({progress.failed} failed), {progress.rate:.1f} books/s{eta}")
+    except backfill_job.BackfillStalled as e:
+        raise click.ClickException(
+            f"Stopped: {e}. Run 'bookclub backfill' again to resume after book ID {e.last_id}.")
+    except KeyboardInterrupt:
+        click.echo(f"\nInterrupted. Run 'bookclub backfill' again to resume after book ID "
+                   f"{progress.last_id}.")
+        raise click.exceptions.Exit(130)
+
+    left = progress.remaining if limit else 0
+    click.echo(f"Backfilled {progress.done} summaries ({progress.failed} failed) in "
+               f"{format_seconds(progress.elapsed)} ({progress.rate:.1f} books/s)."
+               + (f" {left} books left, run 'bookclub backfill' again to continue." if left else ""))
 
 
 def get_attr(name):
@@ -214,8 +702,32 @@ def get_attr(name):
         return LAST_SEARCH
     raise AttributeError(f"Unknown attribute: {name}")
 
-if __name__ == "__main__":
-    cli(prog_name="bookclub")
-
+@cli.command()
+@click.option("--socket", "socket_path", type = click.Path(dir_okay = False),
+              help = "Unix socket to listen on (default: BOOKCLUB_SOCKET or .bookclub.sock).")
+@pass_db
+
+def serve(db, socket_path):
+    """ Keep clients, caches and the database warm and run forwarded commands from this directory """
+    from app import daemon
+
+    path = socket_path or daemon.socket_path()
+    #Open the database and load the API clients now, not on the first command
+    db.conn
+    get_session()
+    try:
+        get_client()
+    except Exception as e:
+        click.echo(f"GenAI client not ready ({e}), it will be created on first use.", err = True)
 
+    try:
+        daemon.serve(cli, db, path, ready = lambda: click.echo(
+            f"bookclub daemon listening on {path} (Ctrl-C to stop)"))
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    except KeyboardInterrupt:
+        click.echo("\nStopped the bookclub daemon.")
 
+if __name__ == "__main__":
+    from app.daemon import main
+    main()
@@ -16,3 +16,56 @@ GOOGLE_GENAI_MODEL = os.getenv('GOOGLE_GENAI_MODEL', 'models/text-bison-001')
 #Database URL for SQLAlchemy
 DATABASE_URL = os.getenv('DATABASE_URL', '')
 
+#How many summaries we ask the model for at the same time during a search
+SUMMARY_MAX_WORKERS = int(os.getenv('SUMMARY_MAX_WORKERS', '5'))
+
+#Seconds to wait for a single summary before falling back (0 = wait forever)
+SUMMARY_TIMEOUT = float(os.getenv('SUMMARY_TIMEOUT', '30'))
+
+#How long (seconds) a cached AI summary stays valid, and how many we keep at most
+SUMMARY_CACHE_TTL = float(os.getenv('SUMMARY_CACHE_TTL', str(30 * 24 * 60 * 60)))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv('SUMMARY_CACHE_MAX_ENTRIES', '1000'))
+
+#Where Google Books responses are cached on disk, and for how long (seconds, 0 = no cache)
+BOOKS_CACHE_DIR = os.getenv('BOOKS_CACHE_DIR', '.bookclub_cache')
+BOOKS_CACHE_TTL = float(os.getenv('BOOKS_CACHE_TTL', '3600'))
+#Cached responses not fetched or revalidated for this long (seconds) are deleted
+BOOKS_CACHE_MAX_STALE = float(os.getenv('BOOKS_CACHE_MAX_STALE', str(7 * 24 * 60 * 60)))
+
+#Send the intitle: and inauthor: Google Books queries at the same time
+BOOKS_PARALLEL_QUERIES = os.getenv('BOOKS_PARALLEL_QUERIES', 'false').lower() in ('1', 'true', 'yes')
+
+#Ask the model for all search summaries in a single batched prompt
+SUMMARY_BATCH = os.getenv('SUMMARY_BATCH', 'false').lower() in ('1', 'true', 'yes')
+
+#SQLite tuning profile applied when the CLI connects: 'performance' (WAL etc.) or 'default'
+SQLITE_PROFILE = os.getenv('SQLITE_PROFILE', 'performance')
+
+#Rows per transaction when bulk importing a reading list
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '5000'))
+
+#Seconds to wait for Google Books before giving up (and answering from seen volumes)
+BOOKS_TIMEOUT = float(os.getenv('BOOKS_TIMEOUT', '10'))
+
+#Retries (with jittered exponential backoff) for Google Books and GenAI calls that hit 429/5xx
+BOOKS_RETRIES = int(os.getenv('BOOKS_RETRIES', '2'))
+GENAI_RETRIES = int(os.getenv('GENAI_RETRIES', '2'))
+RETRY_BACKOFF = float(os.getenv('RETRY_BACKOFF', '0.5'))
+
+#Seconds to wait for one GenAI call, and for a whole search (Books + summaries, 0 = no limit)
+GENAI_TIMEOUT = float(os.getenv('GENAI_TIMEOUT', '30'))
+SEARCH_DEADLINE = float(os.getenv('SEARCH_DEADLINE', '60'))
+
+#After this many failures in a row a backend is skipped for BREAKER_COOLDOWN seconds
+BREAKER_FAILURES = int(os.getenv('BREAKER_FAILURES', '3'))
+BREAKER_COOLDOWN = float(os.getenv('BREAKER_COOLDOWN', '30'))
+
+#Client-side rate limits (requests per second, 0 = unlimited), shared by every bookclub process
+BOOKS_QPS = float(os.getenv('BOOKS_QPS', '5'))
+GENAI_QPS = float(os.getenv('GENAI_QPS', '2'))
+
+#Threads app.aio uses for the blocking Google Books requests (shared by every search on the event loop)
+AIO_BOOKS_THREADS = int(os.getenv('AIO_BOOKS_THREADS', '32'))
+
+#How many hours of per-hour API metrics `bookclub stats` can look back on (older hours are dropped)
+METRICS_RETENTION_HOURS = int(os.getenv('METRICS_RETENTION_HOURS', str(30 * 24)))
@@ -0,0 +1,259 @@
+#Here we keep the `bookclub serve` daemon and the tiny client that forwards commands to it.
+#The client only imports the standard library, so a forwarded command skips loading click,
+#.env, the GenAI SDK and requests, and reuses the daemon's warm clients, caches and database.
+import io
+import json
+import os
+import queue
+import socket
+import struct
+import sys
+import threading
+
+#Where the daemon listens, relative paths are relative to the working directory like reading_list.db
+DEFAULT_SOCKET = '.bookclub.sock'
+#Commands that are never forwarded: the daemon itself, and long jobs that would hold it up
+LOCAL_COMMANDS = ('serve', 'import', 'export', 'backfill')
+#How long (seconds) either side waits for the other to start talking before giving up
+HANDSHAKE_TIMEOUT = 1
+#The group's global options that take a value, which come before the command name
+GLOBAL_VALUE_OPTIONS = ('--profile', '--log-json')
+
+
+def socket_path():
+    """ The daemon's socket, BOOKCLUB_SOCKET or .bookclub.sock (read from the environment only, to stay light) """
+    return os.environ.get('BOOKCLUB_SOCKET') or DEFAULT_SOCKET
+
+
+def command_name(argv):
+    """ The subcommand in argv, skipping the global options before it (None if there is none) """
+    args = iter(argv)
+    for arg in args:
+        if arg == '--':
+            return next(args, None)
+        if arg in GLOBAL_VALUE_OPTIONS:
+            next(args, None)
+        elif not arg.startswith('-'):
+            return arg
+    return None
+
+
+def is_local(argv):
+    """ Whether argv runs a command that is never forwarded, like `--timings serve` """
+    return command_name(argv) in LOCAL_COMMANDS
+
+
+def _send(sock, message):
+    sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+
+class _StreamWriter(io.TextIOBase):
+    """ A text stream that sends everything written to it to the client as it happens """
+
+    encoding = 'utf-8'
+
+    def __init__(self, sock, stream):
+        super().__init__()
+        self.sock = sock
+        self.stream = stream
+        #Like sys.stdout's, commands such as export check it to see where they are writing
+        self.name = f'<{stream}>'
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        if isinstance(text, bytes):
+            text = text.decode(self.encoding, 'replace')
+        if text:
+            _send(self.sock, {'stream': self.stream, 'data': text})
+        return len(text)
+
+
+def forward(argv, path=None, cwd=None, stdout=None, stderr=None):
+    """
+    Runs a bookclub command in the daemon, copying its output to stdout/stderr as it arrives.
+    Returns the command's exit code, or None if no daemon took the command (none running,
+    a stale socket, no Unix sockets here, a daemon serving another directory or one busy
+    with another command).
+    """
+    path = path or socket_path()
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(path):
+        return None
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    started = False
+    try:
+        sock.settimeout(HANDSHAKE_TIMEOUT)
+        try:
+            sock.connect(path)
+        except OSError:
+            return None
+        _send(sock, {'argv': list(argv), 'cwd': os.path.abspath(cwd or os.getcwd())})
+        for line in sock.makefile('r', encoding='utf-8'):
+            message = json.loads(line)
+            if message.get('started'):
+                #Commands like search can take a while, only the handshake has a timeout
+                started = True
+                sock.settimeout(None)
+            elif 'stream' in message:
+                started = True
+                out = stdout if message['stream'] == 'stdout' else stderr
+                out.write(message['data'])
+                out.flush()
+            elif message.get('fallback'):
+                return None
+            elif 'exit' in message:
+                return message['exit']
+    except (OSError, ValueError):
+        #The daemon went away; only run locally if it hadn't started the command yet
+        if not started:
+            return None
+        stderr.write('Lost connection to the bookclub daemon.\n')
+        return 1
+    finally:
+        sock.close()
+    return None if not started else 1
+
+
+def run_command(cli, argv, db, stdout, stderr):
+    """ Runs the click group in this process with the daemon's Database, returning the exit code """
+    import traceback
+    from contextlib import redirect_stderr, redirect_stdout
+    with redirect_stdout(stdout), redirect_stderr(stderr):
+        try:
+            cli.main(args=list(argv), prog_name='bookclub', obj=db)
+        except Exception:
+            #Show the client what a local run would have shown, and keep serving
+            traceback.print_exc()
+            return 1
+        except SystemExit as e:
+            code = e.code
+            if code is None:
+                return 0
+            if isinstance(code, int):
+                return code
+            print(code, file=sys.stderr)
+            return 1
+    return 0
+
+
+def _peer_uid(conn):
+    """ The uid of the process on the other end of the socket, None where we can't ask """
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+    pid_uid_gid = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    return struct.unpack('3i', pid_uid_gid)[1]
+
+
+def _accept(server, cwd, commands, running):
+    """
+    Takes connections for serve() on a thread of its own, so clients get an answer even
+    while a command runs. A request is queued for the main thread only if it takes the
+    `running` lock; clients are told to run locally when it is held.
+    """
+    while True:
+        try:
+            conn, _ = server.accept()
+        except OSError:
+            #serve() shut the socket down
+            return
+        try:
+            uid = _peer_uid(conn)
+            if uid is not None and uid != os.getuid():
+                #Commands run with our rights, so only our own user may send them
+                conn.close()
+                continue
+            conn.settimeout(HANDSHAKE_TIMEOUT)
+            request = json.loads(conn.makefile('r', encoding='utf-8').readline())
+            argv = request['argv']
+            if request.get('cwd') != cwd or is_local(argv) or not running.acquire(blocking=False):
+                _send(conn, {'fallback': True})
+                conn.close()
+                continue
+        except (OSError, ValueError, KeyError, TypeError):
+            #The client hung up or sent garbage, move on to the next one
+            conn.close()
+            continue
+        commands.put((conn, argv))
+
+
+def serve(cli, db, path=None, ready=None):
+    """
+    Listens on the Unix socket and runs each forwarded command with `db` kept open.
+    Commands run one at a time on this thread (they share the connection and
+    sys.stdout), in the directory the daemon was started from. Clients in other
+    directories, or arriving while a command runs, are told to run locally. The socket
+    is only accessible to our own user, and other users' connections are dropped.
+    """
+    path = path or socket_path()
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            #Left behind by a daemon that didn't shut down cleanly
+            os.unlink(path)
+        else:
+            raise RuntimeError(f'a bookclub daemon is already listening on {path}')
+        finally:
+            probe.close()
+
+    cwd = os.path.abspath(os.getcwd())
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        #Create the socket file without group/other access, then make sure of it
+        umask = os.umask(0o077)
+        try:
+            server.bind(path)
+        finally:
+            os.umask(umask)
+        os.chmod(path, 0o600)
+        server.listen()
+        commands = queue.Queue()
+        running = threading.Lock()
+        threading.Thread(target=_accept, args=(server, cwd, commands, running),
+                         name='bookclub-accept', daemon=True).start()
+        if ready:
+            ready()
+        while True:
+            conn, argv = commands.get()
+            with conn:
+                try:
+                    try:
+                        conn.settimeout(None)
+                        _send(conn, {'started': True})
+                        code = run_command(cli, argv, db,
+                                           _StreamWriter(conn, 'stdout'), _StreamWriter(conn, 'stderr'))
+                    finally:
+                        #Free up before answering, so the client's next command finds us idle
+                        running.release()
+                    _send(conn, {'exit': code})
+                except OSError:
+                    #The client hung up, move on to the next one
+                    pass
+    finally:
+        try:
+            #Wakes the accept thread up so it can stop
+            server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        server.close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def main(argv=None):
+    """ The bookclub entry point: forward to a running daemon, or run the command here """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and not is_local(argv) and os.environ.get('BOOKCLUB_NO_DAEMON') is None:
+        code = forward(argv)
+        if code is not None:
+            sys.exit(code)
+    from app.cli import cli
+    cli(args=argv, prog_name='bookclub')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,25 +1,279 @@
 #Here we'll call the GenAI API to generate book summaries based on the book information retrieved from the Google Books API
 # Importing libraries to be used for loading the API
-from google import genai
-from app.config import GEMINI_API_KEY, GOOGLE_GENAI_MODEL
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+
+from app.config import (GEMINI_API_KEY, GOOGLE_GENAI_MODEL, SUMMARY_MAX_WORKERS, SUMMARY_TIMEOUT,
+                        GENAI_TIMEOUT, GENAI_RETRIES, RETRY_BACKOFF, BREAKER_FAILURES, BREAKER_COOLDOWN)
+from app import metrics, rate_limit
+from app.timings import span, timed
+from app.resilience import CircuitBreaker, DeadlineExceeded, call_with_retries
 
 # Setting API key
 api_key = GEMINI_API_KEY
 
-# Configure the client
-client = genai.Client(api_key=api_key)
+# Stops us from waiting on the model over and over while it is down
+GENAI_BREAKER = CircuitBreaker("GenAI", BREAKER_FAILURES, BREAKER_COOLDOWN)
+
+# The client is built on first use, importing the GenAI SDK is slow
+_client = None
+
+def get_client():
+    '''
+    Returns the shared GenAI client, importing the SDK and configuring it on first use
+    '''
+    global _client
+    if _client is None:
+        with span("startup.genai_client"):
+            from google import genai
+            # the SDK takes its per-request timeout in milliseconds
+            http_options = {"timeout": int(GENAI_TIMEOUT * 1000)} if GENAI_TIMEOUT else None
+            _client = genai.Client(api_key=api_key, http_options=http_options)
+    return _client
+
+# Text shown whenever we could not get a summary for a book
+NO_SUMMARY = "No summary available."
+
+# Helpers shared with the async version in app.aio
+def summary_prompt(title, author):
+    '''
+    The prompt asking for one book's summary
+    '''
+    return f"Generate a 1-3 sentence summary of the book {title} by {author}"
+
+def token_count(response):
+    '''
+    The total tokens a model response says it used, 0 if it doesn't say
+    '''
+    count = getattr(getattr(response, "usage_metadata", None), "total_token_count", None)
+    return count if isinstance(count, int) else 0
+
+# Creating function to make one model call under the shared rate limit
+def _generate_content(**kwargs):
+    '''
+    Calls the model once, after waiting for the shared 'genai' rate limit, and adds
+    the call and the tokens it used to the daily usage and the per-hour metrics
+    '''
+    rate_limit.acquire("genai")
+    tokens = 0
+    ok = False
+    start = time.perf_counter()
+    try:
+        with span("genai.call"):
+            response = get_client().models.generate_content(model=GOOGLE_GENAI_MODEL, **kwargs)
+        tokens = token_count(response)
+        ok = True
+        return response
+    finally:
+        rate_limit.record_usage("genai", tokens=tokens)
+        metrics.observe("genai", time.perf_counter() - start, ok=ok, tokens=tokens,
+                        model=GOOGLE_GENAI_MODEL)
 
 # Creating function to generate summary based on title and author
+@timed("genai.generate_summary")
 def generate_summary(title, author):
     '''
     Generates the summary of a book based on title and author using GenAI
+    Rate limits and server errors are retried, and the call is skipped while
+    GENAI_BREAKER is open. Each attempt waits its turn under the shared GENAI_QPS limit.
     '''
-    response = client.models.generate_content(
-        model=GOOGLE_GENAI_MODEL,
-        contents=f"Generate a 1-3 sentence summary of the book {title} by {author}"
+    response = call_with_retries(
+        lambda: _generate_content(contents=summary_prompt(title, author)),
+        retries=GENAI_RETRIES, backoff=RETRY_BACKOFF, breaker=GENAI_BREAKER,
     )
     return response.text
 
+
+# Helper to run calls on threads the interpreter won't wait for
+def _run_on_daemon_threads(jobs, workers):
+    '''
+    Runs (future, func, args) jobs on `workers` daemon threads, setting each future's
+    result. Unlike ThreadPoolExecutor workers they are not joined at exit, so a call
+    we already gave up on (timeout or deadline) can't keep the CLI from exiting.
+    Cancelled futures are skipped.
+    '''
+    pending = queue.SimpleQueue()
+    for job in jobs:
+        pending.put(job)
+
+    def worker():
+        while True:
+            try:
+                future, func, args = pending.get_nowait()
+            except queue.Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = func(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    for _ in range(workers):
+        threading.Thread(target=worker, name="bookclub-summary", daemon=True).start()
+
+# Creating function to stream summaries as soon as each one is ready
+def iter_summaries(books, summarize=None, max_workers=SUMMARY_MAX_WORKERS, timeout=SUMMARY_TIMEOUT,
+                   deadline=None):
+    '''
+    Generates summaries for a list of (title, author) pairs in a bounded thread pool and
+    yields (index, summary, error) in the order they finish. A book whose call fails or
+    runs longer than `timeout` seconds is yielded with NO_SUMMARY and the error, without
+    holding up the others. Once `deadline` (a resilience.Deadline) runs out, every book
+    still pending is yielded with NO_SUMMARY.
+    '''
+    summarize = summarize or generate_summary
+    if not books:
+        return
+
+    started = {}
+
+    # Remember when each call actually starts so queued books get their full timeout
+    def run(index, title, author):
+        started[index] = time.monotonic()
+        return summarize(title, author)
+
+    pending = {Future(): index for index in range(len(books))}
+    _run_on_daemon_threads(
+        [(future, run, (index,) + tuple(books[index])) for future, index in pending.items()],
+        max(1, min(max_workers, len(books))),
+    )
+    try:
+        while pending:
+            wait_for = None
+            if timeout:
+                now = time.monotonic()
+                deadlines = [started[i] + timeout for i in pending.values() if i in started]
+                wait_for = max(0.0, min(deadlines) - now) if deadlines else timeout
+            if deadline is not None and deadline.remaining() is not None:
+                wait_for = min(wait_for, deadline.remaining()) if wait_for is not None else deadline.remaining()
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    yield index, future.result(), None
+                except Exception as e:
+                    yield index, NO_SUMMARY, e
+            if timeout:
+                now = time.monotonic()
+                for future, index in list(pending.items()):
+                    if index in started and now - started[index] >= timeout:
+                        # Give up on this book, the thread is left to finish on its own
+                        del pending[future]
+                        future.cancel()
+                        yield index, NO_SUMMARY, TimeoutError(f"no summary after {timeout:g}s")
+            if deadline is not None and deadline.expired():
+                for future, index in list(pending.items()):
+                    del pending[future]
+                    future.cancel()
+                    yield index, NO_SUMMARY, DeadlineExceeded("out of time for this search")
+    finally:
+        # books that never started are dropped, running calls finish (or not) on their own
+        for future in pending:
+            future.cancel()
+
+
+# Creating function to generate many summaries at once
+def generate_summaries_concurrently(books, summarize=None, max_workers=SUMMARY_MAX_WORKERS,
+                                    timeout=SUMMARY_TIMEOUT, on_error=None, deadline=None):
+    '''
+    Same as iter_summaries, but waits for every book and returns the summaries in the
+    same order as the books. `on_error(index, error)` is called for every fallback.
+    '''
+    summaries = [NO_SUMMARY] * len(books)
+    for index, summary, error in iter_summaries(books, summarize, max_workers, timeout, deadline):
+        if error is None:
+            summaries[index] = summary
+        elif on_error:
+            on_error(index, error)
+    return summaries
+
+# Helper to read the model's JSON answer for a batch of books
+def _parse_batch(text, count):
+    '''
+    Parses a JSON array of {"index": n, "summary": "..."} objects (1-based index).
+    Returns {position: summary} for every well-formed entry and ignores the rest.
+    '''
+    text = (text or "").strip()
+    # models sometimes wrap JSON in a markdown code fence
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text[text.find("\n") + 1:] if "\n" in text else ""
+    try:
+        items = json.loads(text)
+    except ValueError:
+        return {}
+    if not isinstance(items, list):
+        return {}
+
+    parsed = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        index = item.get("index")
+        summary = item.get("summary")
+        if (isinstance(index, int) and not isinstance(index, bool) and 1 <= index <= count
+                and isinstance(summary, str) and summary.strip()):
+            parsed[index - 1] = summary.strip()
+    return parsed
+
+
+# Creating function to generate all summaries with one model call
+@timed("genai.generate_summaries")
+def generate_summaries(books, summarize=None, on_error=None, deadline=None):
+    '''
+    Generates summaries for a list of (title, author) pairs with a single structured
+    (JSON) prompt. Books missing or malformed in the answer fall back to their own
+    generate_summary call. Summaries are returned in the same order as the books.
+    Once `deadline` runs out there is no fallback, the books left get NO_SUMMARY.
+    '''
+    if not books:
+        return []
+
+    listing = "\n".join(f"{index}. {title} by {author}"
+                        for index, (title, author) in enumerate(books, start=1))
+    prompt = (
+        "Generate a 1-3 sentence summary of each of these books. Respond with only a JSON "
+        "array containing one object per book with the integer \"index\" of the book and "
+        "its \"summary\" as a string.\n" + listing
+    )
+    parsed = {}
+    try:
+        response = call_with_retries(
+            lambda: _generate_content(
+                contents=prompt,
+                config={"response_mime_type": "application/json"},
+            ),
+            retries=GENAI_RETRIES, backoff=RETRY_BACKOFF, breaker=GENAI_BREAKER, deadline=deadline,
+        )
+        parsed = _parse_batch(response.text, len(books))
+    except Exception:
+        pass
+
+    summaries = [parsed.get(index) for index in range(len(books))]
+    retry = [index for index, summary in enumerate(summaries) if summary is None]
+    if retry and deadline is not None and deadline.expired():
+        for index in retry:
+            summaries[index] = NO_SUMMARY
+            if on_error:
+                on_error(index, DeadlineExceeded("out of time for this search"))
+    elif retry:
+        def report_error(position, error):
+            if on_error:
+                on_error(retry[position], error)
+
+        fallback = generate_summaries_concurrently(
+            [books[index] for index in retry], summarize=summarize, on_error=report_error,
+            deadline=deadline)
+        for index, summary in zip(retry, fallback):
+            summaries[index] = summary
+    return summaries
+
 # Quick test to ensure it works as expected:
 def main():
     '''
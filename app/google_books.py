@@ -1,30 +1,239 @@
 #Here we'll call the Google Books API to retrieve book information based on a search query.
-import requests
-from typing import List, Dict
+import hashlib
+import json
+import os
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
-from app.config import GOOGLE_BOOKS_KEY
+from typing import TYPE_CHECKING, Callable, List, Dict, Optional
+
+from app.config import (GOOGLE_BOOKS_KEY, BOOKS_CACHE_DIR, BOOKS_CACHE_TTL, BOOKS_CACHE_MAX_STALE,
+                        BOOKS_PARALLEL_QUERIES, BOOKS_TIMEOUT, BOOKS_RETRIES, RETRY_BACKOFF,
+                        BREAKER_FAILURES, BREAKER_COOLDOWN)
+from app import metrics, rate_limit
+from app.timings import span, timed
+from app.resilience import CircuitBreaker, Deadline, call_with_retries
+
+if TYPE_CHECKING:
+    #Only for the annotation, requests itself is imported on first use
+    import requests
 
 BASE_URL = 'https://www.googleapis.com/books/v1/volumes'
 
+#Stops us from waiting on Google Books over and over while it is down
+BOOKS_BREAKER = CircuitBreaker('Google Books', BREAKER_FAILURES, BREAKER_COOLDOWN)
+
+#One pooled session per process so repeat requests reuse the TCP/TLS connection
+_session = None
+#When this process last deleted old cache files (the daemon prunes again every BOOKS_CACHE_TTL)
+_last_pruned = 0.0
+
+def get_session() -> "requests.Session":
+    """
+    Returns the shared keep-alive session used for all Google Books requests.
+    requests is only imported here so commands that stay offline never pay for it.
+    """
+    global _session
+    if _session is None:
+        with span('startup.requests_session'):
+            # Getting rid of weird warnings in the terminal
+            warnings.filterwarnings("ignore", message="urllib3 v2 only supports OpenSSL")
+            import requests
+            from requests.adapters import HTTPAdapter
+            _session = requests.Session()
+            _session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=10))
+    return _session
+
+
+#Helpers for the on-disk response cache
+def _cache_path(params: Dict) -> Path:
+    """
+    Returns the cache file for a request. The API key is left out of the key
+    so changing keys does not throw the cache away.
+    """
+    keyed = {name: value for name, value in params.items() if name != 'key'}
+    digest = hashlib.sha256(json.dumps(keyed, sort_keys=True).encode('utf-8')).hexdigest()
+    return Path(BOOKS_CACHE_DIR) / f'{digest}.json'
+
+
+def _read_cache(path: Path) -> Optional[Dict]:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(path: Path, entry: Dict) -> None:
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(entry))
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    prune_cache()
+
+
+def _cache_control(headers) -> Dict[str, Optional[str]]:
+    """ The Cache-Control directives of a response, e.g. {'max-age': '60', 'private': None} """
+    directives = {}
+    for part in (headers.get('Cache-Control') or '').split(','):
+        name, _, value = part.partition('=')
+        if name.strip():
+            directives[name.strip().lower()] = value.strip().strip('"') or None
+    return directives
+
+
+def _max_age(directives: Dict[str, Optional[str]]) -> Optional[float]:
+    """ How long (seconds) the server lets us reuse a response, None if it doesn't say """
+    if 'no-cache' in directives:
+        return 0.0
+    try:
+        return max(0.0, float(directives['max-age']))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _is_fresh(entry: Dict) -> bool:
+    """ Whether a cached entry can be used without asking Google Books again """
+    lifetime = BOOKS_CACHE_TTL
+    if entry.get('max_age') is not None:
+        lifetime = min(lifetime, entry['max_age'])
+    return time.time() - entry.get('fetched_at', 0) < lifetime
+
+
+def prune_cache(force: bool = False) -> int:
+    """
+    Deletes cache files that were not fetched or revalidated for BOOKS_CACHE_MAX_STALE
+    seconds (going by their modification time, so nothing has to be parsed). Runs at
+    most once every BOOKS_CACHE_TTL per process unless `force`. Returns how many went.
+    """
+    global _last_pruned
+    now = time.time()
+    if not force and now - _last_pruned < BOOKS_CACHE_TTL:
+        return 0
+    _last_pruned = now
+    removed = 0
+    cutoff = now - max(BOOKS_CACHE_MAX_STALE, BOOKS_CACHE_TTL)
+    try:
+        with os.scandir(BOOKS_CACHE_DIR) as files:
+            for file in files:
+                if file.name.endswith(('.json', '.tmp')) and file.stat().st_mtime < cutoff:
+                    os.unlink(file.path)
+                    removed += 1
+    except OSError:
+        pass
+    return removed
+
+
+def cached_get(params: Dict, deadline: Optional[Deadline] = None) -> Dict:
+    """
+    GETs the volumes endpoint through the pooled session and the on-disk cache.
+    Fresh cached responses are returned without touching the network. A response
+    stays fresh for BOOKS_CACHE_TTL, or its Cache-Control max-age if that is shorter;
+    no-cache makes it stale right away and no-store keeps it off disk (private is
+    allowed, the cache is only ever read by this user). Stale entries are revalidated
+    with If-None-Match when we have an ETag, and old files are pruned by prune_cache.
+    Network calls time out after
+    BOOKS_TIMEOUT (or whatever is left of `deadline`), 429/5xx answers are retried
+    with backoff, and BOOKS_BREAKER skips the call while Google Books keeps failing.
+    Every network attempt waits for the shared 'books' rate limit and is counted in
+    the daily usage and the per-hour metrics.
+    """
+    path = _cache_path(params) if BOOKS_CACHE_TTL > 0 else None
+    entry = _read_cache(path) if path else None
+    if entry and _is_fresh(entry):
+        metrics.count('books_cache.hit')
+        return entry['body']
+    metrics.count('books_cache.miss')
+
+    headers = {}
+    if entry and entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+
+    def request():
+        rate_limit.acquire('books', max_wait=deadline.remaining() if deadline else None)
+        timeout = deadline.timeout(BOOKS_TIMEOUT) if deadline else BOOKS_TIMEOUT
+        start = time.perf_counter()
+        ok = False
+        try:
+            with span('books.http', q=params.get('q')):
+                response = get_session().get(BASE_URL, params=params, headers=headers, timeout=timeout)
+            ok = response.status_code < 400
+        finally:
+            rate_limit.record_usage('books')
+            metrics.observe('books', time.perf_counter() - start, ok=ok)
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+
+    response = call_with_retries(request, retries=BOOKS_RETRIES, backoff=RETRY_BACKOFF,
+                                 breaker=BOOKS_BREAKER, deadline=deadline)
+    response_headers = getattr(response, 'headers', None) or {}
+
+    directives = _cache_control(response_headers)
+    if response.status_code == 304 and entry:
+        entry['fetched_at'] = time.time()
+        if directives:
+            entry['max_age'] = _max_age(directives)
+        _write_cache(path, entry)
+        return entry['body']
+
+    body = response.json()
+    if path and 'no-store' not in directives:
+        _write_cache(path, {
+            'fetched_at': time.time(),
+            'max_age': _max_age(directives),
+            'etag': response_headers.get('ETag'),
+            'body': body,
+        })
+    return body
+
+
 #Get the top 5 books that match the search query
-def get_top5_books(query: str) -> List[Dict]:
+@timed('books.get_top5_books')
+def get_top5_books(query: str, parallel: Optional[bool] = None, strict: bool = False,
+                   on_items: Optional[Callable[[List[Dict]], None]] = None,
+                   deadline: Optional[Deadline] = None) -> List[Dict]:
     """ 
     Fetches the top 5 books from Google Books API based on the search query.
+    With `parallel` (default BOOKS_PARALLEL_QUERIES) the title and author queries
+    are sent at the same time and merged exactly like the sequential path would.
+    Failed requests are skipped, unless `strict` is set and every request failed,
+    then the last error is raised. `on_items` gets the raw items of every response
+    (from a worker thread in parallel mode), e.g. to store the volumes locally.
+    `deadline` bounds the time spent on all requests together.
     """
     if not query:
         return []
+    if parallel is None:
+        parallel = BOOKS_PARALLEL_QUERIES
 
     results = []
     seen_ids = set()  # To avoid duplicates
+    sent = []
+    errors = []
 
-    #Helper to process API responses
-    def fetch_and_add(params: Dict):
+    #Helper to fetch the items of one API response
+    def fetch_items(params: Dict) -> List[Dict]:
+        sent.append(params['q'])
         try:
-            response = requests.get(BASE_URL, params=params)
-            response.raise_for_status()
-            items = response.json().get('items', [])
-        except Exception:
-            return
+            items = cached_get(params, deadline).get('items', [])
+        except Exception as e:
+            errors.append(e)
+            return []
+        if on_items:
+            on_items(items)
+        return items
+
+    def check_errors():
+        if strict and errors and len(errors) == len(sent):
+            raise errors[-1]
+
+    #Helper to process API responses
+    def add_items(items: List[Dict]):
         for item in items:
             volume_id = item.get('id')
             if volume_id and volume_id not in seen_ids:
@@ -36,19 +245,39 @@ def get_top5_books(query: str) -> List[Dict]:
                     "authors": book_info.get("authors", []),
                 })
 
-    #Search by title first
-    fetch_and_add({
+    title_params = {
         'q': f'intitle:{query}',
         'key': GOOGLE_BOOKS_KEY,
         'maxResults': 5,
-    })
+    }
 
-    #If we don't have enough results, search by author
-    if len(results) < 5:
-        fetch_and_add({
+    def author_params(max_results: int) -> Dict:
+        return {
             'q': f'inauthor:{query}',
             'key': GOOGLE_BOOKS_KEY,
-            'maxResults': 5 - len(results),
-        })
+            'maxResults': max_results,
+        }
+
+    if parallel:
+        #Over-fetch the author query so it never has to wait on the title one
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            title_future = pool.submit(fetch_items, title_params)
+            author_future = pool.submit(fetch_items, author_params(5))
+            title_items = title_future.result()
+            author_items = author_future.result()
+        add_items(title_items)
+        if len(results) < 5:
+            #Only keep as many author hits as the sequential path would have asked for
+            add_items(author_items[:5 - len(results)])
+        check_errors()
+        return results[:5]
+
+    #Search by title first
+    add_items(fetch_items(title_params))
+
+    #If we don't have enough results, search by author
+    if len(results) < 5:
+        add_items(fetch_items(author_params(5 - len(results))))
 
+    check_errors()
     return results[:5]
@@ -0,0 +1,166 @@
+#Here we collect per-call metrics for Google Books and GenAI (latency, errors, tokens) and
+#cache hits, add them up per hour in memory and store them in the metrics_hourly table.
+#`bookclub stats` reads them back as percentiles over a window, or as Prometheus text.
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.book_list_db import get_metrics, save_metrics
+from app.config import METRICS_RETENTION_HOURS
+
+#Upper bounds (ms) of the latency histogram buckets, one more bucket holds everything slower
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_lock = threading.Lock()
+#(hour, name, model) -> [calls, errors, total_ms, max_ms, tokens, histogram], waiting for flush
+_pending: Dict[Tuple[int, str, str], list] = {}
+
+
+def current_hour(now: Optional[float] = None) -> int:
+    """ Hours since the epoch, the key metrics are stored under """
+    return int((time.time() if now is None else now) // 3600)
+
+
+def _entry(name: str, model: str) -> list:
+    key = (current_hour(), name, model or '')
+    entry = _pending.get(key)
+    if entry is None:
+        entry = _pending[key] = [0, 0, 0.0, 0.0, 0, [0] * (len(LATENCY_BUCKETS_MS) + 1)]
+    return entry
+
+
+def observe(name: str, seconds: float, ok: bool = True, tokens: int = 0, model: str = '') -> None:
+    """ Records one call to a backend: how long it took, whether it failed and tokens used """
+    ms = seconds * 1000
+    bucket = len(LATENCY_BUCKETS_MS)
+    for index, bound in enumerate(LATENCY_BUCKETS_MS):
+        if ms <= bound:
+            bucket = index
+            break
+    with _lock:
+        entry = _entry(name, model)
+        entry[0] += 1
+        entry[1] += 0 if ok else 1
+        entry[2] += ms
+        entry[3] = max(entry[3], ms)
+        entry[4] += tokens or 0
+        entry[5][bucket] += 1
+
+
+def count(name: str, n: int = 1) -> None:
+    """ Counts events without a latency, like cache hits """
+    if n:
+        with _lock:
+            _entry(name, '')[0] += n
+
+
+def pending() -> bool:
+    return bool(_pending)
+
+
+def reset() -> None:
+    """ Drops everything not flushed yet """
+    with _lock:
+        _pending.clear()
+
+
+def flush(con, retention_hours: int = METRICS_RETENTION_HOURS) -> None:
+    """ Moves the metrics collected so far into the database """
+    with _lock:
+        rows = [key + tuple(entry) for key, entry in _pending.items()]
+        _pending.clear()
+    if rows:
+        save_metrics(con, rows, retention_hours)
+
+
+def percentile(histogram: List[int], max_ms: float, q: float) -> float:
+    """
+    Estimates the q-th quantile (0-1) in ms from a latency histogram, interpolating
+    inside the bucket it falls in. The open-ended last bucket ends at max_ms.
+    """
+    total = sum(histogram)
+    if not total:
+        return 0.0
+    rank = q * total
+    seen = 0
+    for index, bucket_count in enumerate(histogram):
+        if bucket_count and seen + bucket_count >= rank:
+            low = LATENCY_BUCKETS_MS[index - 1] if index > 0 else 0.0
+            high = LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else max(max_ms, low)
+            return min(low + (high - low) * (rank - seen) / bucket_count, max_ms or high)
+        seen += bucket_count
+    return max_ms
+
+
+def summarize(con, hours: int = 24) -> Dict[Tuple[str, str], dict]:
+    """
+    Adds up the last `hours` hours of metrics per (name, model), with p50/p95 latency
+    """
+    stats = {}
+    for _, name, model, calls, errors, total_ms, max_ms, tokens, histogram in get_metrics(
+            con, current_hour() - hours + 1):
+        item = stats.setdefault((name, model), {
+            "calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "tokens": 0,
+            "histogram": [0] * (len(LATENCY_BUCKETS_MS) + 1)})
+        item["calls"] += calls
+        item["errors"] += errors
+        item["total_ms"] += total_ms
+        item["max_ms"] = max(item["max_ms"], max_ms)
+        item["tokens"] += tokens
+        for index, bucket_count in enumerate(histogram[:len(item["histogram"])]):
+            item["histogram"][index] += bucket_count
+    for item in stats.values():
+        item["p50_ms"] = percentile(item["histogram"], item["max_ms"], 0.5)
+        item["p95_ms"] = percentile(item["histogram"], item["max_ms"], 0.95)
+    return stats
+
+
+def hit_rate(stats: Dict[Tuple[str, str], dict], cache: str) -> Tuple[int, int]:
+    """ (hits, misses) of a cache counted as '<cache>.hit' / '<cache>.miss' """
+    hits = stats.get((f"{cache}.hit", ''), {}).get("calls", 0)
+    misses = stats.get((f"{cache}.miss", ''), {}).get("calls", 0)
+    return hits, misses
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{name}="{value}"' for name, value in labels.items() if value != '')
+
+
+def prometheus_text(stats: Dict[Tuple[str, str], dict], hours: int) -> str:
+    """ The stats in Prometheus text format, for node_exporter's textfile collector """
+    apis = sorted((key, item) for key, item in stats.items() if "." not in key[0])
+    lines = [
+        f"# HELP bookclub_api_latency_seconds Latency of Google Books and GenAI calls over the last {hours}h.",
+        "# TYPE bookclub_api_latency_seconds summary",
+    ]
+    for (name, model), item in apis:
+        for quantile, key in (("0.5", "p50_ms"), ("0.95", "p95_ms")):
+            lines.append(f'bookclub_api_latency_seconds{{{_labels(api=name, model=model, quantile=quantile)}}} '
+                         f'{item[key] / 1000:.6f}')
+        lines.append(f'bookclub_api_latency_seconds_sum{{{_labels(api=name, model=model)}}} '
+                     f'{item["total_ms"] / 1000:.6f}')
+        lines.append(f'bookclub_api_latency_seconds_count{{{_labels(api=name, model=model)}}} {item["calls"]}')
+    for metric, key, help_text in (
+            ("bookclub_api_errors", "errors", "Failed Google Books and GenAI calls"),
+            ("bookclub_api_tokens", "tokens", "GenAI tokens used")):
+        lines.append(f"# HELP {metric} {help_text} over the last {hours}h.")
+        lines.append(f"# TYPE {metric} gauge")
+        for (name, model), item in apis:
+            lines.append(f'{metric}{{{_labels(api=name, model=model)}}} {item[key]}')
+    lines.append(f"# HELP bookclub_cache_hit_ratio Share of lookups answered from a cache over the last {hours}h.")
+    lines.append("# TYPE bookclub_cache_hit_ratio gauge")
+    for cache in ("summary_cache", "books_cache"):
+        hits, misses = hit_rate(stats, cache)
+        if hits + misses:
+            lines.append(f'bookclub_cache_hit_ratio{{{_labels(cache=cache)}}} {hits / (hits + misses):.4f}')
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path, text: str) -> None:
+    """ Writes the file in one step, so the textfile collector never reads half of it """
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
@@ -0,0 +1,103 @@
+#Here we keep a token bucket rate limiter and a per-day usage count for the external APIs.
+#The state lives in the reading list database, so every bookclub process on the machine
+#shares the same buckets and quota numbers.
+import sqlite3
+import threading
+import time
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+from app.config import BOOKS_QPS, GENAI_QPS
+from app.resilience import DeadlineExceeded
+
+#Replaced in tests so waiting for a token doesn't actually sleep
+sleep = time.sleep
+
+#Database file holding the buckets, None turns limiting and accounting off
+_db_path = None
+#api name -> (tokens per second, bucket size)
+_limits: Dict[str, Tuple[float, float]] = {}
+_lock = threading.Lock()
+
+
+def configure(db_path: Optional[str], limits: Optional[Dict[str, float]] = None) -> None:
+    """
+    Points the limiter at a database file (None or ':memory:' switches it off) and sets
+    the requests per second allowed for each api, BOOKS_QPS and GENAI_QPS by default.
+    The bucket size is one second's worth of requests, at least 1.
+    """
+    global _db_path
+    if limits is None:
+        limits = {"books": BOOKS_QPS, "genai": GENAI_QPS}
+    with _lock:
+        _db_path = db_path if db_path not in (None, "", ":memory:") else None
+        _limits.clear()
+        for api, qps in limits.items():
+            if qps and qps > 0:
+                _limits[api] = (qps, max(1.0, qps))
+
+
+def _connect() -> sqlite3.Connection:
+    #Autocommit mode so we can run BEGIN IMMEDIATE ourselves
+    return sqlite3.connect(_db_path, timeout=10, isolation_level=None)
+
+
+def reserve(api: str, tokens: float = 1.0, max_wait: Optional[float] = None) -> float:
+    """
+    Takes `tokens` from the api's bucket and returns how many seconds the caller has
+    to wait before using them. The bucket may go negative: each caller reserves its
+    place in line in one short transaction and then waits outside of it, so processes
+    are served in order. Returns 0 if the api has no limit or the limiter is not
+    configured. Raises DeadlineExceeded, without taking anything, if the wait would
+    be longer than `max_wait` seconds.
+    """
+    if _db_path is None or api not in _limits:
+        return 0.0
+    rate, burst = _limits[api]
+    con = _connect()
+    try:
+        #IMMEDIATE takes the write lock up front, so two processes can't spend the same token
+        con.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        row = con.execute(
+            "SELECT tokens, updated_at FROM rate_limits WHERE api = ?", (api,)).fetchone()
+        available = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+        available -= tokens
+        wait = max(0.0, -available / rate)
+        if max_wait is not None and wait > max_wait:
+            con.execute("ROLLBACK")
+            raise DeadlineExceeded(f"rate limit for {api} would need a {wait:.1f}s wait")
+        con.execute(
+            "INSERT OR REPLACE INTO rate_limits (api, tokens, updated_at) VALUES (?, ?, ?)",
+            (api, available, now))
+        con.execute("COMMIT")
+    finally:
+        con.close()
+    return wait
+
+
+def acquire(api: str, tokens: float = 1.0, max_wait: Optional[float] = None) -> float:
+    """
+    Like reserve, but sleeps through the wait. Returns the seconds waited.
+    """
+    wait = reserve(api, tokens, max_wait)
+    if wait > 0:
+        sleep(wait)
+    return wait
+
+
+def record_usage(api: str, calls: int = 1, tokens: int = 0) -> None:
+    """
+    Adds calls (and, for GenAI, tokens) to today's usage for an api
+    """
+    if _db_path is None:
+        return
+    con = _connect()
+    try:
+        con.execute(
+            """INSERT INTO api_usage (day, api, calls, tokens) VALUES (?, ?, ?, ?)
+               ON CONFLICT (day, api) DO UPDATE SET calls = calls + excluded.calls,
+                                                    tokens = tokens + excluded.tokens""",
+            (date.today().isoformat(), api, calls, tokens or 0))
+    finally:
+        con.close()
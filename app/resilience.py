@@ -0,0 +1,198 @@
+#Here we keep the timeout, retry and circuit breaker helpers shared by the Google Books and GenAI calls
+import random
+import threading
+import time
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+#Replaced in tests so retries don't actually wait
+sleep = time.sleep
+
+
+class CircuitOpenError(Exception):
+    """ Raised instead of calling a backend that failed too often recently """
+
+
+class DeadlineExceeded(TimeoutError):
+    """ Raised when the overall time budget for an operation has run out """
+
+
+class Deadline:
+    """
+    An overall time budget (e.g. for one search) that per-call timeouts are cut down to.
+    A deadline of None or 0 seconds never expires.
+    """
+
+    def __init__(self, seconds: Optional[float]):
+        self.expires_at = time.monotonic() + seconds if seconds else None
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def timeout(self, default: Optional[float]) -> Optional[float]:
+        """ The timeout to use for the next call, raising DeadlineExceeded if none is left """
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        if remaining <= 0:
+            raise DeadlineExceeded("the time budget for this operation ran out")
+        return min(default, remaining) if default else remaining
+
+
+class CircuitBreaker:
+    """
+    Skips a backend for `cooldown` seconds after `failure_threshold` failures in a row.
+    Once the cooldown is over a single trial call is let through: success closes the
+    circuit again, failure opens it for another cooldown. Safe to share between threads.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def reset(self) -> None:
+        self.record_success()
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    """ The HTTP status behind a requests or GenAI SDK error, if there is one """
+    response = getattr(error, "response", None)
+    code = getattr(response, "status_code", None)
+    if code is None:
+        code = getattr(error, "code", None)
+    return code if isinstance(code, int) else None
+
+
+#Timeouts and connection problems that aren't OSErrors, as (top-level module, class name):
+#httpx's (raised by the GenAI SDK, TimeoutException is a TransportError) and the asyncio
+#and futures TimeoutErrors, which are only TimeoutError from Python 3.11 on. Matched by
+#name so checking an error never imports httpx or asyncio.
+_TRANSPORT_ERRORS = {("httpx", "TransportError"), ("httpx", "TimeoutException"),
+                     ("asyncio", "TimeoutError"), ("concurrent", "TimeoutError")}
+
+
+def is_transport_error(error: BaseException) -> bool:
+    """ A timeout or connection problem, meaning the backend never answered """
+    if isinstance(error, DeadlineExceeded):
+        return False
+    #requests' ConnectionError and Timeout are OSErrors too
+    if isinstance(error, (OSError, TimeoutError)):
+        return True
+    return any((cls.__module__.split(".")[0], cls.__name__) in _TRANSPORT_ERRORS
+               for cls in type(error).__mro__)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """ Rate limits (429), server errors (5xx), timeouts and connection problems are worth retrying """
+    code = status_code(error)
+    if code is not None:
+        return code == 429 or code >= 500
+    return is_transport_error(error)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """ Seconds asked for in a Retry-After header, if the error response has one """
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def check_call(breaker: Optional[CircuitBreaker], deadline: Optional[Deadline]) -> None:
+    """ Raises instead of starting a call the breaker or the deadline would not allow """
+    if breaker is not None and not breaker.allow():
+        raise CircuitOpenError(f"{breaker.name} is failing, skipping it for a while")
+    if deadline is not None and deadline.expired():
+        raise DeadlineExceeded("the time budget for this operation ran out")
+
+
+def retry_delay(error: BaseException, attempt: int, retries: int, backoff: float, max_backoff: float,
+                breaker: Optional[CircuitBreaker], deadline: Optional[Deadline]) -> Optional[float]:
+    """
+    Records a failed attempt on `breaker` and returns how long to wait before the
+    next one, or None if the error should be raised instead
+    """
+    retryable = is_retryable(error)
+    if breaker is not None:
+        if retryable:
+            breaker.record_failure()
+        elif status_code(error) is not None:
+            #The backend answered (4xx), it just didn't like the request
+            breaker.record_success()
+    if not retryable or attempt >= retries:
+        return None
+    delay = random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+    wait_asked = retry_after(error)
+    if wait_asked is not None:
+        if wait_asked > max_backoff:
+            return None
+        delay = max(delay, wait_asked)
+    remaining = deadline.remaining() if deadline is not None else None
+    if remaining is not None and remaining <= delay:
+        return None
+    return delay
+
+
+def call_with_retries(func: Callable[[], T], retries: int = 2, backoff: float = 0.5,
+                      max_backoff: float = 8.0, breaker: Optional[CircuitBreaker] = None,
+                      deadline: Optional[Deadline] = None) -> T:
+    """
+    Calls `func`, retrying retryable errors up to `retries` times with full-jitter
+    exponential backoff (honouring Retry-After). Calls are skipped with
+    CircuitOpenError while `breaker` is open, and no retry is started that could
+    not finish before `deadline`.
+    """
+    attempt = 0
+    while True:
+        check_call(breaker, deadline)
+        try:
+            result = func()
+        except Exception as e:
+            delay = retry_delay(e, attempt, retries, backoff, max_backoff, breaker, deadline)
+            if delay is None:
+                raise
+            sleep(delay)
+            attempt += 1
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            return result
@@ -0,0 +1,100 @@
+#Here we keep the timing spans behind `bookclub --timings` and `--log-json`.
+#Spans are off unless a command turns them on, and then cost a single flag check,
+#so they can sit on the hot paths (Books, GenAI and every database call).
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, TextIO, Tuple
+
+_enabled = False
+_lock = threading.Lock()
+#span name -> [calls, total seconds, max seconds]
+_totals: Dict[str, List[float]] = {}
+#Where each span is written as a JSON line, if anywhere
+_log: Optional[TextIO] = None
+
+
+def enable(log: Optional[TextIO] = None) -> None:
+    """ Starts collecting spans (from scratch), also writing each one to `log` as JSON """
+    global _enabled, _log
+    with _lock:
+        _totals.clear()
+        _log = log
+        _enabled = True
+
+
+def disable() -> None:
+    global _enabled, _log
+    with _lock:
+        _enabled = False
+        _log = None
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def record(name: str, seconds: float, **fields) -> None:
+    """ Adds one finished span, e.g. a duration measured somewhere else """
+    if not _enabled:
+        return
+    with _lock:
+        totals = _totals.setdefault(name, [0, 0.0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+        totals[2] = max(totals[2], seconds)
+        if _log is not None:
+            entry = {"ts": round(time.time(), 6), "span": name, "ms": round(seconds * 1000, 3),
+                     "thread": threading.current_thread().name}
+            entry.update(fields)
+            _log.write(json.dumps(entry, default=str) + "\n")
+            _log.flush()
+
+
+@contextmanager
+def span(name: str, **fields):
+    """ Times the body of a with block as one span called `name` """
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        if error:
+            fields["error"] = error
+        record(name, time.perf_counter() - start, **fields)
+
+
+def timed(name: str) -> Callable:
+    """ Decorator timing every call of a function as a span called `name` """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def summary() -> List[Tuple[str, int, float, float]]:
+    """ (name, calls, total seconds, max seconds) for every span so far, slowest total first """
+    with _lock:
+        rows = [(name, int(calls), total, longest) for name, (calls, total, longest) in _totals.items()]
+    return sorted(rows, key=lambda row: row[2], reverse=True)
+
+
+def format_summary() -> str:
+    """ The spans so far as a small table """
+    lines = [f"{'span':<32}{'calls':>7}{'total ms':>11}{'max ms':>10}"]
+    for name, calls, total, longest in summary():
+        lines.append(f"{name:<32}{calls:>7}{total * 1000:>11.1f}{longest * 1000:>10.1f}")
+    return "\n".join(lines)
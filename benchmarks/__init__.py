@@ -0,0 +1 @@
+# Benchmarks for the reading list CLI, run them with `python -m benchmarks.<name>`
@@ -0,0 +1,107 @@
+# Local stand-ins for Google Books and GenAI with a configurable latency, so the
+# benchmarks measure our own code (plus a known, fixed network cost) and never
+# need API keys or spend quota.
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+
+def fake_volumes(query, count):
+    '''
+    Deterministic Google Books items for a query ("intitle:dune" -> "Dune 1" ...)
+    '''
+    term = query.split(':', 1)[-1]
+    items = []
+    for n in range(1, count + 1):
+        volume_id = hashlib.sha1(f"{query}/{n}".encode('utf-8')).hexdigest()[:12]
+        items.append({"id": volume_id, "volumeInfo": {
+            "title": f"{term.title()} {n}",
+            "authors": [f"Author {n}"],
+        }})
+    return items
+
+
+class FakeBooksServer:
+    '''
+    A threaded HTTP server answering /books/v1/volumes like Google Books, after
+    sleeping `latency` seconds per request. Use it as a context manager.
+    '''
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                time.sleep(server.latency)
+                params = parse_qs(urlparse(self.path).query)
+                query = params.get('q', [''])[0]
+                count = int(params.get('maxResults', ['10'])[0])
+                body = json.dumps({"items": fake_volumes(query, count)}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/books/v1/volumes"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _answer(contents, config):
+    # Batch prompts list the books as "1. Title by Author", answer them in JSON like the model
+    if config and config.get("response_mime_type") == "application/json":
+        books = re.findall(r"^(\d+)\. (.+)$", contents, re.MULTILINE)
+        return json.dumps([{"index": int(index), "summary": f"A stub summary of {book}."}
+                           for index, book in books])
+    return f"A stub summary for: {contents[-60:]}"
+
+
+def _response(text, contents):
+    tokens = len(contents.split()) + len(text.split())
+    return SimpleNamespace(text=text, usage_metadata=SimpleNamespace(total_token_count=tokens))
+
+
+class StubGenAIClient:
+    '''
+    Quacks like genai.Client for generate_content (sync and .aio), sleeping
+    `latency` seconds per call
+    '''
+
+    def __init__(self, latency=0.2):
+        self.latency = latency
+        self.calls = 0
+        stub = self
+
+        def generate_content(model, contents, config=None):
+            stub.calls += 1
+            time.sleep(stub.latency)
+            return _response(_answer(contents, config), contents)
+
+        async def generate_content_async(model, contents, config=None):
+            stub.calls += 1
+            await asyncio.sleep(stub.latency)
+            return _response(_answer(contents, config), contents)
+
+        self.models = SimpleNamespace(generate_content=generate_content)
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=generate_content_async))
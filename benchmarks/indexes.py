@@ -0,0 +1,88 @@
+# Measures add_book and status filtering on a large reading list, with the
+# indexed schema from set_up versus the original index-less table.
+#
+#   python -m benchmarks.indexes --rows 100000
+import argparse
+import os
+import tempfile
+import time
+
+from app.book_list_db import create_connection, set_up, add_book, get_books_by_status
+
+STATUSES = ("TBR", "Reading", "Read")
+
+
+# The add_book we had before the unique index: look first, then insert
+def legacy_add_book(con, title, author, desc):
+    cursor = con.cursor()
+    cursor.execute("SELECT 1 FROM reading_list WHERE title = ? AND author = ?", (title, author))
+    if cursor.fetchone() is not None:
+        return False
+    cursor.execute("INSERT INTO reading_list (title, author, summary) VALUES (?, ?, ?)",
+                   (title, author, desc))
+    con.commit()
+    return True
+
+
+def fill(con, rows):
+    '''
+    Bulk loads `rows` books with a mix of statuses
+    '''
+    con.executemany(
+        "INSERT INTO reading_list (title, author, status, summary) VALUES (?, ?, ?, ?)",
+        ((f"Title {i}", f"Author {i % 5000}", STATUSES[i % 3], "Summary") for i in range(rows)),
+    )
+    con.commit()
+
+
+def time_ms(func, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        func(i)
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def run(indexed, rows, repeat):
+    '''
+    Returns (add ms, duplicate add ms, list-by-status ms) for one schema
+    '''
+    with tempfile.TemporaryDirectory() as tmp:
+        con = create_connection(os.path.join(tmp, 'bench.db'), profile='performance')
+        if indexed:
+            set_up(con)
+            add = add_book
+        else:
+            con.execute(''' CREATE TABLE reading_list (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                author TEXT NOT NULL,
+                status TEXT DEFAULT 'TBR',
+                summary TEXT)''')
+            add = legacy_add_book
+        fill(con, rows)
+
+        add_ms = time_ms(lambda i: add(con, f"New {i}", "New Author", "Summary"), repeat)
+        dup_ms = time_ms(lambda i: add(con, f"Title {i}", f"Author {i % 5000}", "Summary"), repeat)
+        # 'Reading' is a third of the table, filtering a rare status shows the index best
+        con.execute("UPDATE reading_list SET status = 'Paused' WHERE id % 1000 = 0")
+        con.commit()
+        list_ms = time_ms(lambda i: get_books_by_status(con, 'Paused'), repeat)
+        con.close()
+    return add_ms, dup_ms, list_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the reading list indexes')
+    parser.add_argument('--rows', type=int, default=100000, help='books already in the list')
+    parser.add_argument('--repeat', type=int, default=200, help='operations timed per measurement')
+    args = parser.parse_args()
+
+    print(f"{args.rows:,} rows, average ms per operation")
+    print(f"{'schema':<10} {'add':>10} {'dup add':>10} {'by status':>10}")
+    for label, indexed in (("no index", False), ("indexed", True)):
+        add_ms, dup_ms, list_ms = run(indexed, args.rows, args.repeat)
+        print(f"{label:<10} {add_ms:>10.3f} {dup_ms:>10.3f} {list_ms:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+# Benchmarks the bookclub commands end to end, through the real CLI, against a
+# local fake Google Books server and a stub GenAI client, and prints the results
+# as JSON so runs from different releases can be compared.
+#
+#   python -m benchmarks.run --rows 1000,100000 --output results.json
+#   python -m benchmarks.run --rows 1000000 --suite crud
+#   python -m benchmarks.run --output new.json --compare results.json
+import argparse
+import json
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from click.testing import CliRunner
+
+import app
+import app.cli as cli_module
+from app import genai, google_books, rate_limit
+from app.book_list_db import add_books, create_connection, set_up
+from app.config import SQLITE_PROFILE
+from benchmarks.fakes import FakeBooksServer, StubGenAIClient
+
+SUITES = ("search", "crud", "bulk")
+STATUSES = ("TBR", "Reading", "Read")
+
+
+def summarize(samples):
+    '''
+    Milliseconds per operation for a list of timings in seconds
+    '''
+    ordered = sorted(samples)
+    return {
+        "repeat": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+    }
+
+
+class Bench:
+    '''
+    Runs CLI commands in a scratch directory with the fake backends patched in.
+    Use it as a context manager, everything patched is put back on exit.
+    '''
+
+    def __init__(self, root, books_latency, genai_latency):
+        self.root = Path(root)
+        self.db_path = self.root / "bench.db"
+        self.runner = CliRunner()
+        self.books = FakeBooksServer(books_latency)
+        self.genai = StubGenAIClient(genai_latency)
+        self._saved = []
+
+    def _patch(self, module, name, value):
+        self._saved.append((module, name, getattr(module, name)))
+        setattr(module, name, value)
+
+    def __enter__(self):
+        self.books.__enter__()
+        self._patch(cli_module, "get_db_connection",
+                    lambda: create_connection(str(self.db_path), profile=SQLITE_PROFILE))
+        self._patch(cli_module, "LAST_SEARCH", str(self.root / "last_search.json"))
+        self._patch(google_books, "BASE_URL", self.books.url)
+        self._patch(google_books, "BOOKS_CACHE_DIR", str(self.root / "books_cache"))
+        self._patch(genai, "_client", self.genai)
+        # the fakes have no quota to protect
+        self._patch(rate_limit, "BOOKS_QPS", 0)
+        self._patch(rate_limit, "GENAI_QPS", 0)
+        google_books.BOOKS_BREAKER.reset()
+        genai.GENAI_BREAKER.reset()
+        return self
+
+    def __exit__(self, *exc_info):
+        for module, name, value in reversed(self._saved):
+            setattr(module, name, value)
+        self.books.__exit__(*exc_info)
+
+    def fresh_database(self, rows=0):
+        '''
+        Replaces the scratch database with one holding `rows` books
+        '''
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{self.db_path}{suffix}").unlink(missing_ok=True)
+        con = create_connection(str(self.db_path), profile=SQLITE_PROFILE)
+        set_up(con)
+        add_books(con, ((f"Title {i}", f"Author {i % 5000}", STATUSES[i % 3], "Summary")
+                        for i in range(rows)), batch_size=50000)
+        con.close()
+
+    def invoke(self, *args):
+        result = self.runner.invoke(cli_module.cli, [str(arg) for arg in args])
+        if result.exit_code != 0:
+            raise RuntimeError(f"bookclub {' '.join(map(str, args))} failed:\n{result.output}"
+                               f"{result.exception!r}")
+        return result.output
+
+    def time(self, make_args, repeat):
+        '''
+        Times `repeat` invocations, make_args(i) gives the arguments of the i-th one
+        '''
+        samples = []
+        for i in range(repeat):
+            args = make_args(i)
+            start = time.perf_counter()
+            self.invoke(*args)
+            samples.append(time.perf_counter() - start)
+        return summarize(samples)
+
+
+def run_search(bench, repeat):
+    bench.fresh_database()
+    results = []
+    cases = (
+        # every query is new, so Books and GenAI are both called
+        ("search cold", lambda i: ("search", f"cold {i}")),
+        ("search --batch cold", lambda i: ("search", "--batch", f"batch {i}")),
+        # the same query again, answered from the response and summary caches
+        ("search warm", lambda i: ("search", "cold 0")),
+        ("search --offline", lambda i: ("search", "--offline", "cold")),
+    )
+    for name, make_args in cases:
+        results.append({"suite": "search", "name": name, "rows": 0, **bench.time(make_args, repeat)})
+    return results
+
+
+def run_crud(bench, rows, repeat):
+    bench.fresh_database(rows)
+    middle = max(1, rows // 2)
+    cli_module.save_last_search([{"title": f"New {i}", "author": "New Author", "summary": "Summary"}
+                                 for i in range(repeat)])
+    cases = (
+        ("add", lambda i: ("add", i + 1)),
+        ("list first page", lambda i: ("list", "--limit", 20)),
+        ("list page in the middle", lambda i: ("list", "--limit", 20, "--after-id", middle)),
+        ("list --status page", lambda i: ("list", "--status", "Read", "--limit", 20, "--compact")),
+        ("update-status by position", lambda i: ("update-status", middle, STATUSES[i % 3])),
+        ("update-status --id", lambda i: ("update-status", "--id", middle + i, "Read")),
+        ("find", lambda i: ("find", f"Title {i * 7}", "--limit", 5)),
+        ("delete --id", lambda i: ("delete", "--id", middle + i)),
+        ("delete by position", lambda i: ("delete", middle)),
+    )
+    return [{"suite": "crud", "name": name, "rows": rows, **bench.time(make_args, repeat)}
+            for name, make_args in cases]
+
+
+def run_bulk(bench, rows):
+    results = []
+    source = bench.root / "import.csv"
+    with open(source, "w", newline="", encoding="utf-8") as file:
+        file.write("title,author,status,summary\n")
+        for i in range(rows):
+            file.write(f"Title {i},Author {i % 5000},{STATUSES[i % 3]},Summary {i}\n")
+
+    bench.fresh_database()
+    for name, args in (("import csv", ("import", source)),
+                       ("export csv", ("export", "--output", bench.root / "export.csv")),
+                       ("export jsonl", ("export", "--format", "jsonl",
+                                         "--output", bench.root / "export.jsonl"))):
+        start = time.perf_counter()
+        bench.invoke(*args)
+        seconds = time.perf_counter() - start
+        results.append({"suite": "bulk", "name": name, "rows": rows,
+                        "seconds": round(seconds, 3), "rows_per_sec": round(rows / seconds, 1)})
+    return results
+
+
+def run(suites, rows_list, repeat, books_latency, genai_latency, log=sys.stderr):
+    '''
+    Runs the chosen suites and returns the report (a dict ready for json.dump)
+    '''
+    results = []
+    with tempfile.TemporaryDirectory() as root, Bench(root, books_latency, genai_latency) as bench:
+        def report(new):
+            for result in new:
+                value = (f"{result['p50_ms']:.2f} ms p50" if "p50_ms" in result
+                         else f"{result['rows_per_sec']:,.0f} rows/s")
+                print(f"{result['suite']:<7} {result['name']:<26} {result['rows']:>9,}  {value}", file=log)
+            results.extend(new)
+
+        if "search" in suites:
+            report(run_search(bench, repeat))
+        for rows in rows_list:
+            if "crud" in suites:
+                report(run_crud(bench, rows, repeat))
+            if "bulk" in suites:
+                report(run_bulk(bench, rows))
+
+    return {
+        "version": app.__version__,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "settings": {"repeat": repeat, "books_latency": books_latency,
+                     "genai_latency": genai_latency, "sqlite_profile": SQLITE_PROFILE},
+        "results": results,
+    }
+
+
+def compare(report, baseline, threshold):
+    '''
+    Prints how every result changed against a baseline report and returns the
+    regressions worse than `threshold` percent
+    '''
+    old = {(r["suite"], r["name"], r["rows"]): r for r in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        before = old.get((result["suite"], result["name"], result["rows"]))
+        if before is None:
+            continue
+        if "p50_ms" in result:
+            old_value, new_value = before["p50_ms"], result["p50_ms"]
+        else:
+            # for throughput, fewer rows per second is slower
+            old_value, new_value = 1 / before["rows_per_sec"], 1 / result["rows_per_sec"]
+        change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+        flag = "  REGRESSION" if change > threshold else ""
+        print(f"{result['suite']:<7} {result['name']:<26} {result['rows']:>9,}  {change:+7.1f}%{flag}",
+              file=sys.stderr)
+        if flag:
+            regressions.append(result)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark bookclub against fake Google Books and GenAI backends')
+    parser.add_argument('--suite', action='append', choices=SUITES,
+                        help='suite to run, can be given more than once (default: all)')
+    parser.add_argument('--rows', default='1000,100000',
+                        help='comma separated reading list sizes for the crud and bulk suites')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per command')
+    parser.add_argument('--books-latency', type=float, default=0.05,
+                        help='seconds the fake Google Books server takes per request')
+    parser.add_argument('--genai-latency', type=float, default=0.2,
+                        help='seconds the stub GenAI client takes per call')
+    parser.add_argument('--output', '-o', help='write the JSON report here instead of stdout')
+    parser.add_argument('--compare', help='earlier JSON report to compare against')
+    parser.add_argument('--threshold', type=float, default=20.0,
+                        help='percent slowdown counted as a regression by --compare')
+    args = parser.parse_args(argv)
+
+    rows_list = [int(rows) for rows in args.rows.split(',') if rows.strip()]
+    report = run(args.suite or SUITES, rows_list, args.repeat, args.books_latency, args.genai_latency)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if compare(report, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+# Compares insert and status-update throughput of the SQLite tuning profiles.
+# Every operation goes through add_book / update_book_status, so each one pays
+# for its own commit exactly like the CLI does.
+#
+#   python -m benchmarks.sqlite_profiles --rows 2000
+import argparse
+import os
+import tempfile
+import time
+
+from app.book_list_db import SQLITE_PROFILES, create_connection, set_up, add_book, update_book_status
+
+
+def run_profile(profile, rows):
+    '''
+    Returns (inserts per second, updates per second) for a fresh database file
+    '''
+    with tempfile.TemporaryDirectory() as tmp:
+        con = create_connection(os.path.join(tmp, 'bench.db'), profile=profile)
+        set_up(con)
+
+        start = time.perf_counter()
+        for i in range(rows):
+            add_book(con, f"Title {i}", f"Author {i}", "Summary")
+        insert_rate = rows / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for book_id in range(1, rows + 1):
+            update_book_status(con, book_id, "Reading")
+        update_rate = rows / (time.perf_counter() - start)
+
+        con.close()
+    return insert_rate, update_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare SQLite tuning profiles')
+    parser.add_argument('--rows', type=int, default=2000, help='books to insert and update')
+    args = parser.parse_args()
+
+    print(f"{'profile':<12} {'inserts/s':>12} {'updates/s':>12}")
+    for profile in SQLITE_PROFILES:
+        insert_rate, update_rate = run_profile(profile, args.rows)
+        print(f"{profile:<12} {insert_rate:>12,.0f} {update_rate:>12,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -23,7 +23,7 @@ setup(
     entry_points={
         "console_scripts": [
             # Exposes `bookclub` as the CLI entrypoint
-            "bookclub=app.cli:cli",
+            "bookclub=app.daemon:main",
         ],
     },
     python_requires=">=3.8",
@@ -0,0 +1,154 @@
+#Here we test the async API layer against the same fakes as the sync versions
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+import app.aio.genai as aio_genai
+import app.google_books as google_books
+from app import aio, book_list_db, genai
+from app.config import SQLITE_PROFILE
+from app.genai import NO_SUMMARY
+
+
+@pytest.fixture(autouse = True)
+def reset_breakers(monkeypatch):
+    genai.GENAI_BREAKER.reset()
+    google_books.BOOKS_BREAKER.reset()
+    monkeypatch.setattr(aio_genai, "sleep", AsyncMock())
+
+
+class ServerError(Exception):
+    code = 503
+
+
+def fake_cached_get(params, deadline = None):
+    kind = "title" if params["q"].startswith("intitle:") else "author"
+    return {"items": [{"id": f"{kind}-{n}", "volumeInfo": {"title": f"{kind} {n}", "authors": ["A"]}}
+                      for n in range(3)]}
+
+
+def test_get_top5_books_matches_sync(monkeypatch):
+    monkeypatch.setattr(google_books, "cached_get", fake_cached_get)
+    expected = google_books.get_top5_books("dune")
+    assert asyncio.run(aio.get_top5_books("dune")) == expected
+    assert asyncio.run(aio.get_top5_books("dune", parallel = True)) == expected
+
+
+def test_get_top5_books_does_not_block_the_loop(monkeypatch):
+    def slow_get(params, deadline = None):
+        time.sleep(0.2)
+        return fake_cached_get(params)
+    monkeypatch.setattr(google_books, "cached_get", slow_get)
+
+    async def main():
+        start = time.monotonic()
+        results = await asyncio.gather(*(aio.get_top5_books(f"q{n}") for n in range(20)))
+        return results, time.monotonic() - start
+
+    results, elapsed = asyncio.run(main())
+    assert all(len(books) == 5 for books in results)
+    #Twenty searches of two 0.2s requests each, all at once
+    assert elapsed < 2
+
+
+def make_client(monkeypatch, side_effect):
+    client = MagicMock()
+    client.aio.models.generate_content = AsyncMock(side_effect = side_effect)
+    monkeypatch.setattr(genai, "get_client", lambda: client)
+    return client.aio.models.generate_content
+
+
+def test_generate_summary_uses_the_async_client(monkeypatch):
+    response = MagicMock(text = "A desert planet.")
+    generate_content = make_client(monkeypatch, [response])
+
+    assert asyncio.run(aio.generate_summary("Dune", "Frank Herbert")) == "A desert planet."
+    generate_content.assert_awaited_once_with(
+        model = "gemini-2.5-flash",
+        contents = "Generate a 1-3 sentence summary of the book Dune by Frank Herbert")
+
+
+def test_generate_summary_retries_server_errors(monkeypatch):
+    generate_content = make_client(monkeypatch, [ServerError(), MagicMock(text = "Second try.")])
+    assert asyncio.run(aio.generate_summary("Dune", "Frank Herbert")) == "Second try."
+    assert generate_content.await_count == 2
+
+
+def test_generate_summary_retries_timeouts(monkeypatch):
+    generate_content = make_client(monkeypatch, [asyncio.TimeoutError(), MagicMock(text = "Second try.")])
+    assert asyncio.run(aio.generate_summary("Dune", "Frank Herbert")) == "Second try."
+    assert generate_content.await_count == 2
+
+
+def test_generate_summary_does_not_retry_client_errors(monkeypatch):
+    error = ServerError()
+    error.code = 400
+    generate_content = make_client(monkeypatch, [error])
+    with pytest.raises(ServerError):
+        asyncio.run(aio.generate_summary("Dune", "Frank Herbert"))
+    assert generate_content.await_count == 1
+
+
+def test_summaries_concurrently_keep_order_and_fall_back():
+    async def summarize(title, author):
+        if title == "bad":
+            raise ValueError("nope")
+        if title == "slow":
+            await asyncio.sleep(1)
+        await asyncio.sleep(0.01)
+        return f"{title} by {author}"
+
+    errors = []
+    books = [("one", "A"), ("bad", "B"), ("slow", "C"), ("two", "D")]
+    summaries = asyncio.run(aio.generate_summaries_concurrently(
+        books, summarize = summarize, timeout = 0.2,
+        on_error = lambda index, error: errors.append(index)))
+    assert summaries == ["one by A", NO_SUMMARY, NO_SUMMARY, "two by D"]
+    assert sorted(errors) == [1, 2]
+
+
+def test_hundreds_of_summaries_on_one_loop():
+    async def summarize(title, author):
+        await asyncio.sleep(0.05)
+        return title
+
+    books = [(f"book {n}", "A") for n in range(300)]
+    start = time.monotonic()
+    summaries = asyncio.run(aio.generate_summaries_concurrently(
+        books, summarize = summarize, max_workers = 300))
+    assert summaries == [title for title, _ in books]
+    assert time.monotonic() - start < 1
+
+
+def test_async_database(tmp_path):
+    async def main():
+        async with aio.AsyncDatabase(str(tmp_path / "aio.db")) as db:
+            added = await asyncio.gather(*(db.add_book(f"Book {n}", "Author", "A summary.") for n in range(50)))
+            duplicate = await db.add_book("Book 0", "Author", "Again.")
+            await db.update_book_status(1, "Reading")
+            return added, duplicate, await db.count_books(), await db.get_books_by_status("Reading")
+
+    added, duplicate, count, reading = asyncio.run(main())
+    assert all(added) and not duplicate
+    assert count == 50
+    assert [book[1] for book in reading] == ["Book 0"]
+
+
+def test_async_database_uses_the_cli_profile(tmp_path):
+    async def journal_mode():
+        async with aio.AsyncDatabase(str(tmp_path / "aio.db")) as db:
+            return await db.run(lambda con: con.execute("PRAGMA journal_mode").fetchone()[0])
+
+    con = book_list_db.create_connection(str(tmp_path / "sync.db"), SQLITE_PROFILE)
+    try:
+        assert asyncio.run(journal_mode()) == con.execute("PRAGMA journal_mode").fetchone()[0]
+    finally:
+        con.close()
+
+
+def test_async_database_only_exposes_db_functions(tmp_path):
+    db = aio.AsyncDatabase(str(tmp_path / "aio.db"))
+    with pytest.raises(AttributeError):
+        db.create_connection
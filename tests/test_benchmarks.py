@@ -0,0 +1,35 @@
+#Here we make sure the benchmark runner keeps working, with tiny sizes and no latency
+import json
+
+import app.cli as cli_module
+from app import genai, google_books
+from benchmarks import run as bench_run
+
+
+def test_runner_writes_a_json_report(tmp_path, capsys):
+    output = tmp_path / "report.json"
+    code = bench_run.main(["--rows", "50", "--repeat", "2", "--books-latency", "0",
+                           "--genai-latency", "0", "--output", str(output)])
+    assert code == 0
+
+    report = json.loads(output.read_text())
+    names = {(result["suite"], result["name"]) for result in report["results"]}
+    assert ("search", "search cold") in names
+    assert ("crud", "update-status --id") in names
+    assert ("bulk", "import csv") in names
+    assert all(result["rows"] == 50 for result in report["results"] if result["suite"] != "search")
+
+    #Everything the runner patched is put back
+    assert google_books.BASE_URL.startswith("https://www.googleapis.com")
+    assert genai._client is None or not hasattr(genai._client, "calls")
+    assert cli_module.LAST_SEARCH != str(tmp_path / "last_search.json")
+
+
+def test_compare_flags_regressions(tmp_path, capsys):
+    baseline = {"results": [{"suite": "crud", "name": "add", "rows": 10, "p50_ms": 1.0},
+                            {"suite": "bulk", "name": "import csv", "rows": 10, "rows_per_sec": 1000.0}]}
+    report = {"results": [{"suite": "crud", "name": "add", "rows": 10, "p50_ms": 1.5},
+                          {"suite": "bulk", "name": "import csv", "rows": 10, "rows_per_sec": 1100.0}]}
+    regressions = bench_run.compare(report, baseline, threshold = 20)
+    assert [result["name"] for result in regressions] == ["add"]
+    assert "REGRESSION" in capsys.readouterr().err
@@ -1,6 +1,15 @@
 #Here we can test our booklist database to make sure it is correctly storing the updated reading list for our user with all of the right info
+import os
+import tempfile
+import time
 import unittest
-from app.book_list_db import create_connection, set_up, add_book, delete_book, update_book_status, get_book_id, get_all_books, get_books_by_status
+from app.book_list_db import (create_connection, set_up, ensure_schema, SCHEMA_VERSION, add_books,
+                              get_books_missing_summary, update_book_summaries, iter_books, get_books_page, get_book_id_at, count_books, get_book_ids_at, get_book_id_ranges_at,
+                              update_books_status, delete_books, search_books,
+                              save_volumes, search_volumes, add_book, delete_book, update_book_status, get_book_id,
+                              get_all_books, get_books_by_status, get_cached_summary, cache_summaries,
+                              record_cache_stats, get_cache_stats, count_books_missing_summary,
+                              get_checkpoint, save_checkpoint, clear_checkpoint)
 
 class TestBookListDB(unittest.TestCase):
     '''
@@ -94,3 +103,396 @@ class TestBookListDB(unittest.TestCase):
         '''
         updated = update_book_status(self.con, 999, "Reading")  # Non-existent book ID
         self.assertFalse(updated)
+
+    def test_ensure_schema_only_runs_when_needed(self):
+        '''
+        Test that ensure_schema skips set_up once the schema version is current.
+        '''
+        self.assertFalse(ensure_schema(self.con))
+        fresh = create_connection(':memory:')
+        self.assertTrue(ensure_schema(fresh))
+        self.assertEqual(fresh.execute("PRAGMA user_version").fetchone()[0], SCHEMA_VERSION)
+        self.assertFalse(ensure_schema(fresh))
+        fresh.close()
+
+    def test_performance_profile_pragmas(self):
+        '''
+        Test that the performance profile switches a file database to WAL.
+        '''
+        with tempfile.TemporaryDirectory() as tmp:
+            con = create_connection(os.path.join(tmp, 'tuned.db'), profile='performance')
+            self.assertEqual(con.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            self.assertEqual(con.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+            self.assertEqual(con.execute("PRAGMA temp_store").fetchone()[0], 2)  # MEMORY
+            con.close()
+
+    def test_unknown_profile(self):
+        '''
+        Test that asking for a profile that does not exist fails loudly.
+        '''
+        with self.assertRaises(ValueError):
+            create_connection(':memory:', profile='turbo')
+
+    def test_add_duplicate_book(self):
+        '''
+        Test that adding the same title and author twice only stores it once.
+        '''
+        self.assertTrue(add_book(self.con, "Book A", "Author A", "Summary A"))
+        self.assertFalse(add_book(self.con, "Book A", "Author A", "Other summary"))
+        self.assertTrue(add_book(self.con, "Book A", "Author B", "Summary B"))
+        self.assertEqual(len(get_all_books(self.con)), 2)
+
+    def test_status_filter_uses_index(self):
+        '''
+        Test that filtering by status is an index search, not a table scan.
+        '''
+        plan = self.con.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM reading_list WHERE status = ?", ("TBR",)).fetchall()
+        self.assertIn("idx_reading_list_status", " ".join(row[-1] for row in plan))
+
+    def test_migration_merges_duplicates(self):
+        '''
+        Test that upgrading a database with duplicate books merges them into the first
+        copy, keeping the furthest status and the first real summary.
+        '''
+        old = create_connection(':memory:')
+        old.execute('''CREATE TABLE reading_list (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                       title TEXT NOT NULL, author TEXT NOT NULL, status TEXT DEFAULT 'TBR',
+                       summary TEXT)''')
+        old.executemany("INSERT INTO reading_list (title, author, status, summary) VALUES (?, ?, ?, ?)",
+                        [("Book A", "Author A", "TBR", "first"), ("Book A", "Author A", "Read", "second"),
+                         ("Book B", "Author B", "Reading", "No summary available."),
+                         ("Book B", "Author B", "TBR", None), ("Book B", "Author B", "TBR", "real"),
+                         ("Book C", "Author C", "TBR", None)])
+        merged = []
+        self.assertTrue(ensure_schema(old, on_merge=merged.append))
+        self.assertEqual(merged, [3])
+        books = get_all_books(old)
+        self.assertEqual([(book[0], book[3], book[4]) for book in books],
+                         [(1, "Read", "first"), (3, "Reading", "real"), (6, "TBR", None)])
+        old.close()
+
+    def test_add_books_in_batches(self):
+        '''
+        Test bulk adding books across several batches while skipping duplicates.
+        '''
+        add_book(self.con, "Book 0", "Author", "Existing")
+        books = ((f"Book {i}", "Author", "TBR", None) for i in range(10))
+        inserted = add_books(self.con, books, batch_size=3)
+        self.assertEqual(inserted, 9)
+        self.assertEqual(len(get_all_books(self.con)), 10)
+
+    def test_missing_summaries_and_update(self):
+        '''
+        Test finding books without a real summary and filling them in.
+        '''
+        add_book(self.con, "Book A", "Author A", "Summary A")
+        add_book(self.con, "Book B", "Author B", None)
+        add_book(self.con, "Book C", "Author C", "No summary available.")
+        missing = get_books_missing_summary(self.con)
+        self.assertEqual([row[1] for row in missing], ["Book B", "Book C"])
+        self.assertEqual(get_books_missing_summary(self.con, after_id=missing[0][0]), missing[1:])
+
+        update_book_summaries(self.con, [(missing[0][0], "New B")])
+        self.assertEqual([row[1] for row in get_books_missing_summary(self.con)], ["Book C"])
+
+    def test_iter_books_streams_in_batches(self):
+        '''
+        Test that iter_books returns every row, in id order, across fetch batches.
+        '''
+        add_books(self.con, ((f"Book {i}", "Author", "Read" if i % 2 else "TBR", None) for i in range(7)))
+        books = iter_books(self.con, batch_size=2)
+        self.assertEqual(next(books)[1], "Book 0")
+        self.assertEqual(len(list(books)), 6)
+        self.assertEqual([book[1] for book in iter_books(self.con, "Read", batch_size=2)],
+                         ["Book 1", "Book 3", "Book 5"])
+
+    def test_keyset_pages(self):
+        '''
+        Test walking the list page by page with the last id of each page.
+        '''
+        add_books(self.con, ((f"Book {i}", "Author", "TBR", f"Summary {i}") for i in range(5)))
+        first = get_books_page(self.con, limit=2)
+        self.assertEqual([book[1] for book in first], ["Book 0", "Book 1"])
+        second = get_books_page(self.con, after_id=first[-1][0], limit=2)
+        self.assertEqual([book[1] for book in second], ["Book 2", "Book 3"])
+        last = get_books_page(self.con, after_id=second[-1][0], limit=2, compact=True)
+        self.assertEqual(last, [(5, "Book 4", "Author", "TBR")])
+
+    def test_page_uses_primary_key(self):
+        '''
+        Test that later pages seek by id instead of skipping rows.
+        '''
+        plan = self.con.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM reading_list WHERE id > ? ORDER BY id LIMIT ?",
+            (1000, 20)).fetchall()
+        self.assertIn("INTEGER PRIMARY KEY (rowid>?)", " ".join(row[-1] for row in plan))
+
+    def test_delete_book_not_found(self):
+        '''
+        Test deleting a book that does not exist.
+        '''
+        self.assertFalse(delete_book(self.con, 999))
+
+    def test_get_book_id_at(self):
+        '''
+        Test mapping list positions to book IDs after a deletion leaves a gap.
+        '''
+        add_books(self.con, ((f"Book {i}", "Author", "TBR", None) for i in range(3)))
+        delete_book(self.con, 2)
+        self.assertEqual(get_book_id_at(self.con, 1), 1)
+        self.assertEqual(get_book_id_at(self.con, 2), 3)
+        self.assertIsNone(get_book_id_at(self.con, 3))
+        self.assertIsNone(get_book_id_at(self.con, 0))
+        self.assertEqual(count_books(self.con), 2)
+
+    def test_bulk_status_update(self):
+        '''
+        Test updating many books by ID, by status, and by both.
+        '''
+        add_books(self.con, ((f"Book {i}", "Author", "Read" if i < 2 else "TBR", None) for i in range(6)))
+        self.assertEqual(update_books_status(self.con, "Reading", [3, 4, 99]), 2)
+        self.assertEqual(update_books_status(self.con, "TBR", where_status="Read"), 2)
+        self.assertEqual(update_books_status(self.con, "Read", [1, 3, 5], where_status="TBR"), 2)
+        self.assertEqual([book[3] for book in get_all_books(self.con)],
+                         ["Read", "TBR", "Reading", "Reading", "Read", "TBR"])
+        with self.assertRaises(ValueError):
+            update_books_status(self.con, "Read")
+
+    def test_bulk_delete_in_chunks(self):
+        '''
+        Test deleting more IDs than fit in one statement.
+        '''
+        add_books(self.con, ((f"Book {i}", "Author", "TBR", None) for i in range(1200)))
+        self.assertEqual(delete_books(self.con, range(1, 1101)), 1100)
+        self.assertEqual(delete_books(self.con, where_status="TBR"), 100)
+        self.assertEqual(count_books(self.con), 0)
+        with self.assertRaises(ValueError):
+            delete_books(self.con)
+
+    def test_get_book_ids_at(self):
+        '''
+        Test mapping several positions at once.
+        '''
+        add_books(self.con, ((f"Book {i}", "Author", "TBR", None) for i in range(4)))
+        delete_book(self.con, 1)
+        self.assertEqual(get_book_ids_at(self.con, [1, 3, 7]), {1: 2, 3: 4})
+
+    def test_ranges(self):
+        '''
+        Test updating and deleting (first, last) ID ranges, and mapping position ranges to them.
+        '''
+        add_books(self.con, ((f"Book {i}", "Author", "TBR", None) for i in range(6)))
+        delete_book(self.con, 3)
+        self.assertEqual(get_book_id_ranges_at(self.con, [(2, 3), (5, 99), (50, 60)]), [(2, 4), (6, 6)])
+        self.assertEqual(update_books_status(self.con, "Read", id_ranges=[(2, 4), (6, 10 ** 12)]), 3)
+        self.assertEqual(delete_books(self.con, where_status="TBR", id_ranges=[(1, 5)]), 2)
+        self.assertEqual([book[1] for book in get_all_books(self.con)], ["Book 1", "Book 3", "Book 5"])
+
+
+class TestFullTextSearch(unittest.TestCase):
+    '''
+    Test cases for searching the saved books.
+    '''
+    def setUp(self):
+        self.con = create_connection(':memory:')
+        set_up(self.con)
+        add_book(self.con, "Dune", "Frank Herbert", "A desert planet and its spice.")
+        add_book(self.con, "Spice Trade", "Author B", "A history of pepper.")
+        add_book(self.con, "Emma", "Jane Austen", "Matchmaking goes wrong.")
+
+    def tearDown(self):
+        self.con.close()
+
+    def test_title_matches_rank_first(self):
+        '''
+        Test that a title hit outranks a summary hit and snippets mark the match.
+        '''
+        results = search_books(self.con, ["spice"])
+        self.assertEqual([row[1] for row in results], ["Spice Trade", "Dune"])
+        self.assertIn("[spice]", results[1][4])
+
+    def test_prefix_and_author_match(self):
+        '''
+        Test that the last word matches as a prefix and authors are searched too.
+        '''
+        self.assertEqual([row[1] for row in search_books(self.con, ["jane", "aus"])], ["Emma"])
+
+    def test_index_follows_updates_and_deletes(self):
+        '''
+        Test that the triggers keep the index in sync with the table.
+        '''
+        update_book_summaries(self.con, [(3, "A comedy of manners.")])
+        self.assertEqual(search_books(self.con, ["matchmaking"]), [])
+        self.assertEqual([row[1] for row in search_books(self.con, ["manners"])], ["Emma"])
+        delete_book(self.con, 1)
+        self.assertEqual([row[1] for row in search_books(self.con, ["spice"])], ["Spice Trade"])
+
+    def test_bulk_import_is_indexed(self):
+        '''
+        Test that big add_books batches (indexed in bulk) and small ones both end up searchable.
+        '''
+        books = [(f"Volume {i}", "Bulk Author", "TBR", f"Chapter {i} of the saga.") for i in range(1500)]
+        books.append(("Dune", "Frank Herbert", "TBR", "Duplicate, skipped."))
+        self.assertEqual(add_books(self.con, books, batch_size=2000), 1500)
+        self.assertEqual(add_books(self.con, [("Small", "Author S", "TBR", "Tiny saga.")]), 1)
+
+        self.assertEqual(len(search_books(self.con, ["saga"], limit=5000)), 1501)
+        self.assertEqual([row[1] for row in search_books(self.con, ["Volume", "1499"])], ["Volume 1499"])
+        self.assertEqual(search_books(self.con, ["duplicate"]), [])
+        # the trigger is back for the next single insert
+        add_book(self.con, "Later", "Author L", "Saga epilogue.")
+        self.assertEqual([row[1] for row in search_books(self.con, ["epilogue"])], ["Later"])
+
+    def test_punctuation_is_safe(self):
+        '''
+        Test that FTS5 syntax characters in the terms do not raise errors.
+        '''
+        # "and" is just a word here (it is in Dune's summary), not an operator
+        self.assertEqual([row[1] for row in search_books(self.con, ['"dune', "AND", "(", "-"])], ["Dune"])
+        self.assertEqual(search_books(self.con, ["  "]), [])
+
+    def test_existing_books_are_indexed_on_upgrade(self):
+        '''
+        Test that books saved before the index existed can be found after set_up.
+        '''
+        self.con.execute("DROP TABLE reading_list_fts")
+        self.con.execute("PRAGMA user_version = 2")
+        self.assertTrue(ensure_schema(self.con))
+        self.assertEqual([row[1] for row in search_books(self.con, ["herbert"])], ["Dune"])
+
+
+class TestVolumes(unittest.TestCase):
+    '''
+    Test cases for the offline volumes table.
+    '''
+    def setUp(self):
+        self.con = create_connection(':memory:')
+        set_up(self.con)
+        save_volumes(self.con, [
+            {"id": "v1", "volumeInfo": {"title": "The Hobbit", "authors": ["J.R.R. Tolkien"]}},
+            {"id": "v2", "volumeInfo": {"title": "Harry Potter and the Philosopher's Stone",
+                                        "authors": ["J.K. Rowling"]}},
+            {"id": "v3", "volumeInfo": {"title": "Tolkien: A Biography", "authors": ["Humphrey Carpenter"]}},
+            {"id": "", "volumeInfo": {"title": "No id, not stored"}},
+        ])
+
+    def tearDown(self):
+        self.con.close()
+
+    def titles(self, query):
+        return [book["title"] for book in search_volumes(self.con, query)]
+
+    def test_prefix_matches(self):
+        '''
+        Test that title prefixes come before author prefixes.
+        '''
+        self.assertEqual(self.titles("the hob"), ["The Hobbit"])
+        self.assertEqual(self.titles("TOLKIEN"), ["Tolkien: A Biography", "The Hobbit"])
+        self.assertEqual(search_volumes(self.con, "j.k.")[0],
+                         {"volume_id": "v2", "title": "Harry Potter and the Philosopher's Stone",
+                          "authors": ["J.K. Rowling"]})
+
+    def test_substring_and_fuzzy_matches(self):
+        '''
+        Test matching inside titles and with typos.
+        '''
+        self.assertEqual(self.titles("potter"), ["Harry Potter and the Philosopher's Stone"])
+        self.assertEqual(self.titles("hobit")[0], "The Hobbit")
+        self.assertEqual(self.titles("zzzzqqq"), [])
+
+    def test_prefix_search_uses_index(self):
+        '''
+        Test that prefix lookups are index range scans.
+        '''
+        plan = self.con.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM volumes WHERE title_key >= ? AND title_key < ?",
+            ("a", "b")).fetchall()
+        self.assertIn("idx_volumes_title_key", " ".join(row[-1] for row in plan))
+
+
+class TestSummaryCache(unittest.TestCase):
+    '''
+    Test cases for the summary cache table.
+    '''
+    def setUp(self):
+        self.con = create_connection(':memory:')
+        set_up(self.con)
+
+    def tearDown(self):
+        self.con.close()
+
+    def test_cache_round_trip_is_normalized(self):
+        '''
+        Test that a cached summary is found again regardless of case and spacing.
+        '''
+        cache_summaries(self.con, [("The Hobbit", "J.R.R. Tolkien", "Summary")], "model-a")
+        self.assertEqual(get_cached_summary(self.con, "the  hobbit", "j.r.r. tolkien", "model-a"), "Summary")
+        self.assertIsNone(get_cached_summary(self.con, "The Hobbit", "J.R.R. Tolkien", "model-b"))
+
+    def test_expired_entries_are_ignored(self):
+        '''
+        Test that entries older than the TTL are treated as misses.
+        '''
+        cache_summaries(self.con, [("Book A", "Author A", "Old")], "m")
+        self.con.execute("UPDATE summary_cache SET created_at = ?", (time.time() - 100,))
+        self.assertIsNone(get_cached_summary(self.con, "Book A", "Author A", "m", ttl=10))
+        self.assertEqual(get_cached_summary(self.con, "Book A", "Author A", "m", ttl=1000), "Old")
+
+    def test_lru_eviction_keeps_recently_used(self):
+        '''
+        Test that only the most recently used entries survive above the size limit.
+        '''
+        cache_summaries(self.con, [("Book A", "A", "a"), ("Book B", "B", "b")], "m")
+        self.con.execute("UPDATE summary_cache SET last_used = 1 WHERE title_key = 'book a'")
+        cache_summaries(self.con, [("Book C", "C", "c")], "m", max_entries=2)
+        self.assertIsNone(get_cached_summary(self.con, "Book A", "A", "m"))
+        self.assertEqual(get_cached_summary(self.con, "Book C", "C", "m"), "c")
+
+    def test_saved_book_summary_is_reused(self):
+        '''
+        Test that a summary stored in the reading list counts as a cache hit.
+        '''
+        add_book(self.con, "Book A", "Author A", "Saved summary")
+        self.assertEqual(get_cached_summary(self.con, "Book A", "Author A", "m"), "Saved summary")
+
+    def test_cache_stats(self):
+        '''
+        Test that hit and miss counters add up.
+        '''
+        record_cache_stats(self.con, 3, 2)
+        record_cache_stats(self.con, 1, 0)
+        self.assertEqual(get_cache_stats(self.con), (4, 2, 0))
+
+
+class TestCheckpoints(unittest.TestCase):
+    '''
+    Test cases for resumable job checkpoints and the backfill queries.
+    '''
+    def setUp(self):
+        self.con = create_connection(':memory:')
+        set_up(self.con)
+
+    def tearDown(self):
+        self.con.close()
+
+    def test_checkpoint_round_trip(self):
+        '''
+        Test saving, replacing and clearing a checkpoint.
+        '''
+        self.assertIsNone(get_checkpoint(self.con, "backfill"))
+        save_checkpoint(self.con, "backfill", 10, done=8, failed=2)
+        save_checkpoint(self.con, "backfill", 20, done=17, failed=3)
+        self.assertEqual(get_checkpoint(self.con, "backfill"), (20, 17, 3))
+        clear_checkpoint(self.con, "backfill")
+        self.assertIsNone(get_checkpoint(self.con, "backfill"))
+
+    def test_count_books_missing_summary(self):
+        '''
+        Test that empty and placeholder summaries are counted after the given ID.
+        '''
+        add_book(self.con, "Book A", "Author A", "")
+        add_book(self.con, "Book B", "Author B", "No summary available.")
+        add_book(self.con, "Book C", "Author C", "Has one")
+        self.assertEqual(count_books_missing_summary(self.con), 2)
+        self.assertEqual(count_books_missing_summary(self.con, after_id=1), 1)
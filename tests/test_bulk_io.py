@@ -0,0 +1,75 @@
+#Here we test reading whole reading lists out of import files
+import json
+
+import pytest
+
+from app.bulk_io import detect_format, normalize_status, read_books
+
+
+def test_read_csv(tmp_path):
+    """ Plain CSV files can use any capitalisation for their headers """
+    path = tmp_path / "books.csv"
+    path.write_text("Title,Author,Status,Summary\nBook A,Author A,reading,Nice\n,Nobody,TBR,\nBook B,,,\n")
+    assert detect_format(path) == "csv"
+    assert list(read_books(path)) == [
+        ("Book A", "Author A", "Reading", "Nice"),
+        ("Book B", "Unknown", "TBR", None),
+    ]
+
+
+def test_read_jsonl(tmp_path):
+    """ JSONL records may list several authors """
+    path = tmp_path / "books.jsonl"
+    path.write_text(json.dumps({"title": "Book A", "authors": ["X", "Y"], "status": "Read"}) + "\n\n"
+                    + json.dumps({"title": "Book B", "author": "Z"}) + "\n")
+    assert detect_format(path) == "jsonl"
+    assert list(read_books(path)) == [("Book A", "X, Y", "Read", None), ("Book B", "Z", "TBR", None)]
+
+
+@pytest.mark.parametrize("line, message", [
+    ('["a"]', "line 2: expected an object, got list"),
+    ('{"title": 5}', "line 2: 'title' must be a string, got int"),
+    ('{"title": "Book B", "authors": ["X", 1]}', "line 2: 'authors' must be a string or a list of strings"),
+    ('{"title": ', "line 2: "),
+])
+def test_read_jsonl_rejects_malformed_records(tmp_path, line, message):
+    """ Bad JSONL lines raise ValueError with their line number """
+    path = tmp_path / "books.jsonl"
+    path.write_text(json.dumps({"title": "Book A"}) + "\n" + line + "\n")
+    books = read_books(path)
+    assert next(books) == ("Book A", "Unknown", "TBR", None)
+    with pytest.raises(ValueError) as error:
+        next(books)
+    assert str(error.value).startswith(message)
+
+
+def test_read_goodreads_export(tmp_path):
+    """ Goodreads shelves map onto our statuses """
+    path = tmp_path / "goodreads_library_export.csv"
+    path.write_text("Book Id,Title,Author,Exclusive Shelf\n"
+                    "1,Dune,Frank Herbert,read\n"
+                    "2,Emma,Jane Austen,currently-reading\n"
+                    "3,Ulysses,James Joyce,to-read\n")
+    assert detect_format(path) == "goodreads"
+    assert list(read_books(path)) == [
+        ("Dune", "Frank Herbert", "Read", None),
+        ("Emma", "Jane Austen", "Reading", None),
+        ("Ulysses", "James Joyce", "TBR", None),
+    ]
+
+
+def test_read_books_is_lazy(tmp_path):
+    """ Rows are produced one at a time instead of loading the whole file """
+    path = tmp_path / "books.jsonl"
+    path.write_text(json.dumps({"title": "Book A"}) + "\nnot json\n")
+    books = read_books(path)
+    assert next(books) == ("Book A", "Unknown", "TBR", None)
+    with pytest.raises(ValueError):
+        next(books)
+
+
+def test_normalize_status():
+    assert normalize_status("READ") == "Read"
+    assert normalize_status("to-read") == "TBR"
+    assert normalize_status("abandoned") == "TBR"
+    assert normalize_status(None) == "TBR"
@@ -1,11 +1,13 @@
 import json
 import sqlite3
+import time
 import pytest
 from click.testing import CliRunner
 
 import app.cli as cli_module
+from app import rate_limit
 from app.cli import cli
-from app.book_list_db import set_up
+from app.book_list_db import add_book, save_volumes, set_up
 
 @pytest.fixture(autouse = True)
 def isolate(tmp_path, monkeypatch):
@@ -28,7 +30,7 @@ def isolate(tmp_path, monkeypatch):
 def test_search_and_cache(monkeypatch, tmp_path):
     """ Test the search command and ensure results are cached. """
     #Stub the APIs
-    monkeypatch.setattr(cli_module, "get_top5_books", lambda q: [
+    monkeypatch.setattr(cli_module, "get_top5_books", lambda q, **kwargs: [
         {"title": "Python Programming", "authors": ["Demi"]},])
     monkeypatch.setattr(cli_module, "generate_summary", lambda t, a: "AI Summary")
 
@@ -42,6 +44,98 @@ def test_search_and_cache(monkeypatch, tmp_path):
     data = json.loads((tmp_path / "last_search.json").read_text())
     assert data == [{"title": "Python Programming", "author": "Demi", "summary": "AI Summary"}]
 
+def test_search_summary_failure_falls_back(monkeypatch, tmp_path):
+    """ A failing summary should not stop the other results from showing. """
+    monkeypatch.setattr(cli_module, "get_top5_books", lambda q, **kwargs: [
+        {"title": "Good Book", "authors": ["A"]}, {"title": "Bad Book", "authors": ["B"]}])
+    def fake_summary(title, author):
+        if title == "Bad Book":
+            raise RuntimeError("model down")
+        return "Fine Summary"
+    monkeypatch.setattr(cli_module, "generate_summary", fake_summary)
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["search", "book"])
+    assert result.exit_code == 0
+    assert "Error generating summary for Bad Book: model down" in result.output
+
+    data = json.loads((tmp_path / "last_search.json").read_text())
+    assert [entry["summary"] for entry in data] == ["Fine Summary", "No summary available."]
+
+def test_repeat_search_uses_summary_cache(monkeypatch):
+    """ A repeated search should not call the model again. """
+    monkeypatch.setattr(cli_module, "get_top5_books", lambda q, **kwargs: [
+        {"title": "Python Programming", "authors": ["Demi"]},])
+    calls = []
+    def fake_summary(title, author):
+        calls.append(title)
+        return "AI Summary"
+    monkeypatch.setattr(cli_module, "generate_summary", fake_summary)
+
+    runner = CliRunner()
+    runner.invoke(cli, ["search", "Python"])
+    result = runner.invoke(cli, ["search", "Python"])
+    assert result.exit_code == 0
+    assert "AI Summary" in result.output
+    assert calls == ["Python Programming"]
+
+    result_stats = runner.invoke(cli, ["cache-stats"])
+    assert "1 hits, 1 misses" in result_stats.output
+
+def test_search_saves_results_before_summaries(monkeypatch, tmp_path):
+    """ Results are shown and saved before the summaries come back. """
+    monkeypatch.setattr(cli_module, "get_top5_books", lambda q, **kwargs: [
+        {"title": "Slow Book", "authors": ["Demi"]},])
+    seen_while_pending = []
+    def slow_summary(title, author):
+        seen_while_pending.append(json.loads((tmp_path / "last_search.json").read_text()))
+        return "Late Summary"
+    monkeypatch.setattr(cli_module, "generate_summary", slow_summary)
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["search", "slow"])
+    assert result.exit_code == 0
+    assert result.output.index("Slow Book by Demi") < result.output.index("Late Summary")
+    assert seen_while_pending == [[{"title": "Slow Book", "author": "Demi",
+                                    "summary": "No summary available."}]]
+    data = json.loads((tmp_path / "last_search.json").read_text())
+    assert data[0]["summary"] == "Late Summary"
+
+def test_search_batch_mode(monkeypatch, tmp_path):
+    """ --batch should ask for every summary with one batched call. """
+    monkeypatch.setattr(cli_module, "get_top5_books", lambda q, **kwargs: [
+        {"title": "Book A", "authors": ["A"]}, {"title": "Book B", "authors": ["B"]}])
+    batches = []
+    def fake_batch(pairs, summarize=None, on_error=None, deadline=None):
+        batches.append(pairs)
+        return [f"Batch {title}" for title, _author in pairs]
+    monkeypatch.setattr(cli_module, "generate_summaries", fake_batch)
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["search", "--batch", "book"])
+    assert result.exit_code == 0
+    assert batches == [[("Book A", "A"), ("Book B", "B")]]
+    data = json.loads((tmp_path / "last_search.json").read_text())
+    assert [entry["summary"] for entry in data] == ["Batch Book A", "Batch Book B"]
+
+def test_one_connection_per_invocation(monkeypatch):
+    """ Each command should open (and close) exactly one database connection. """
+    opened = []
+    original = cli_module.get_db_connection
+    def counting_db():
+        conn = original()
+        opened.append(conn)
+        return conn
+    monkeypatch.setattr(cli_module, "get_db_connection", counting_db)
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["list"])
+    assert result.exit_code == 0
+    assert len(opened) == 1
+    #The connection is closed once the command is done
+    with pytest.raises(sqlite3.ProgrammingError):
+        opened[0].execute("SELECT 1")
+
 def test_list_status():
     #Insert entries with different statuses
     conn = cli_module.get_db_connection()
@@ -98,4 +192,360 @@ def test_delete_book():
 
     #Check if the book was actually deleted
     result_list = runner.invoke(cli, ["list"])
-    assert f"Book D by Author D [TBR]" not in result_list.output
\ No newline at end of file
+    assert f"Book D by Author D [TBR]" not in result_list.output
+
+def test_import_with_enrich(monkeypatch, tmp_path):
+    """ Bulk import reports its rate and can fill in missing summaries. """
+    path = tmp_path / "books.csv"
+    path.write_text("title,author,status,summary\nBook E,Author E,Read,Has one\nBook F,Author F,TBR,\n"
+                    "Book E,Author E,Read,Duplicate\n")
+    monkeypatch.setattr(cli_module, "generate_summary", lambda t, a: f"Summary of {t}")
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["import", str(path), "--batch-size", "2", "--enrich"])
+    assert result.exit_code == 0
+    assert "Imported 2 new books from 3 rows (1 already in your reading list)" in result.output
+    assert "rows/sec" in result.output
+    assert "Generated summaries for 1 imported books." in result.output
+
+    result_list = runner.invoke(cli, ["list"])
+    assert "Summary: Has one" in result_list.output
+    assert "Summary: Summary of Book F" in result_list.output
+
+def test_import_malformed_jsonl(tmp_path):
+    """ A malformed JSONL line is reported with its line number instead of a traceback. """
+    path = tmp_path / "books.jsonl"
+    path.write_text('{"title": "Book E", "author": "Author E"}\n{"title": 5}\n')
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["import", str(path)])
+    assert result.exception is None or isinstance(result.exception, SystemExit)
+    assert "line 2: 'title' must be a string, got int" in result.output
+
+def test_export_round_trip(tmp_path):
+    """ Exported files can be read back by import. """
+    conn = cli_module.get_db_connection()
+    conn.executemany("INSERT INTO reading_list (title, author, status, summary) VALUES (?, ?, ?, ?)",
+                     [("Book G", "Author G", "Read", "Summary G"), ("Book H", "Author H", "TBR", None)])
+    conn.commit(); conn.close()
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["export", "--format", "jsonl", "--status", "read"])
+    assert result.exit_code == 0
+    assert [json.loads(line) for line in result.output.splitlines()] == [
+        {"id": 1, "title": "Book G", "author": "Author G", "status": "Read", "summary": "Summary G"}]
+
+    out = tmp_path / "books.csv"
+    result = runner.invoke(cli, ["export", "--output", str(out)])
+    assert "Exported 2 books" in result.output
+    assert out.read_text().splitlines()[0] == "id,title,author,status,summary"
+    result = runner.invoke(cli, ["import", str(out)])
+    assert "Imported 0 new books from 2 rows" in result.output
+
+def test_list_pages_and_compact():
+    """ --limit/--after-id page through the list by ID and --compact hides summaries. """
+    conn = cli_module.get_db_connection()
+    conn.executemany("INSERT INTO reading_list (title, author, status, summary) VALUES (?, ?, ?, ?)",
+                     [(f"Book {i}", "Author", "TBR", f"Summary {i}") for i in range(1, 4)])
+    conn.commit(); conn.close()
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["list", "--limit", "2", "--compact"])
+    assert "ID 1: Book 1 by Author [TBR]" in result.output
+    assert "ID 3" not in result.output
+    assert "Summary" not in result.output
+    assert "Next page: bookclub list --limit 2 --after-id 2 --compact" in result.output
+
+    result = runner.invoke(cli, ["list", "--limit", "2", "--after-id", "2"])
+    assert "ID 3: Book 3 by Author [TBR]" in result.output
+    assert "Summary: Summary 3" in result.output
+    assert "Next page" not in result.output
+
+def test_update_and_delete_by_id():
+    """ --id addresses a book by its ID, positions are still the default. """
+    conn = cli_module.get_db_connection()
+    conn.executemany("INSERT INTO reading_list (id, title, author, status, summary) VALUES (?, ?, ?, ?, ?)",
+                     [(5, "Book I", "Author I", "TBR", "S"), (9, "Book J", "Author J", "TBR", "S")])
+    conn.commit(); conn.close()
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["update-status", "--id", "9", "Read"])
+    assert "Updated book ID 9 status to Read." in result.output
+    result = runner.invoke(cli, ["list", "--status", "Read"])
+    assert "Book J" in result.output and "Book I" not in result.output
+
+    result = runner.invoke(cli, ["update-status", "--id", "7", "Read"])
+    assert "Book with ID 7 not found." in result.output
+    result = runner.invoke(cli, ["delete", "3"])
+    assert "Invalid index. Please choose a number between 1 and 2." in result.output
+
+    #Position 2 is the book with ID 9
+    result = runner.invoke(cli, ["delete", "2"])
+    assert "Deleted book with ID 2 from your reading list." in result.output
+    result = runner.invoke(cli, ["delete", "--id", "5"])
+    assert "Deleted book with ID 5 from your reading list." in result.output
+    assert "Your reading list is empty!" in runner.invoke(cli, ["list"]).output
+
+def test_bulk_update_and_delete():
+    """ Several indexes, ranges and --where-status run as one bulk statement. """
+    conn = cli_module.get_db_connection()
+    conn.executemany("INSERT INTO reading_list (title, author, status, summary) VALUES (?, ?, ?, ?)",
+                     [(f"Book {i}", "Author", "TBR", "S") for i in range(1, 7)])
+    conn.commit(); conn.close()
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["update-status", "1", "3-4", "9", "Read"])
+    assert "Skipping positions not in your reading list: 9" in result.output
+    assert "Updated 3 books to Read." in result.output
+
+    result = runner.invoke(cli, ["update-status", "--where-status", "TBR", "Reading"])
+    assert "Updated 3 books to Reading." in result.output
+
+    result = runner.invoke(cli, ["delete", "--where-status", "Read"])
+    assert "Deleted 3 books from your reading list." in result.output
+    result = runner.invoke(cli, ["delete", "--id", "2", "5-6"])
+    assert "Deleted 3 books from your reading list." in result.output
+    assert "Your reading list is empty!" in runner.invoke(cli, ["list"]).output
+
+    result = runner.invoke(cli, ["delete", "x-2"])
+    assert result.exit_code != 0
+    assert "is not a number or a range" in result.output
+
+def test_huge_ranges_are_not_expanded():
+    """ Ranges go to sqlite as BETWEEN clauses, so their size doesn't matter. """
+    conn = cli_module.get_db_connection()
+    conn.executemany("INSERT INTO reading_list (id, title, author, status) VALUES (?, ?, ?, ?)",
+                     [(i, f"Book {i}", "Author", "TBR") for i in (2, 4, 7, 8)])
+    conn.commit(); conn.close()
+
+    assert cli_module.parse_targets(["5", "1-3", "4", "10-12"]) == [(1, 5), (10, 12)]
+    runner = CliRunner()
+    started = time.perf_counter()
+    result = runner.invoke(cli, ["update-status", "2-1000000000", "Read"])
+    assert "Skipping positions not in your reading list: 5-1000000000" in result.output
+    assert "Updated 3 books to Read." in result.output
+    result = runner.invoke(cli, ["delete", "--id", "1-5000000000", "8"])
+    assert "Deleted 4 books from your reading list." in result.output
+    assert time.perf_counter() - started < 2
+
+    result = runner.invoke(cli, ["delete", "--id", "1-99999999999999999999"])
+    assert result.exit_code != 0
+    assert "is larger than any book ID or position can be" in result.output
+
+def test_find_saved_books():
+    """ find searches the local reading list without any network call. """
+    conn = cli_module.get_db_connection()
+    conn.executemany("INSERT INTO reading_list (title, author, status, summary) VALUES (?, ?, ?, ?)",
+                     [("Dune", "Frank Herbert", "TBR", "Spice and sand."), ("Emma", "Jane Austen", "Read", "Match")])
+    conn.commit(); conn.close()
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["find", "spice"])
+    assert "ID 1: Dune by Frank Herbert [TBR]" in result.output
+    assert "[Spice]" in result.output
+    assert "Emma" not in result.output
+    assert "No books in your reading list match 'tolstoy'." in runner.invoke(cli, ["find", "tolstoy"]).output
+
+def test_search_falls_back_to_seen_volumes(monkeypatch):
+    """ Volumes from earlier searches answer --offline and failed searches. """
+    def online(q, **kwargs):
+        kwargs["on_items"]([{"id": "v1", "volumeInfo": {"title": "Offline Book", "authors": ["Demi"]}}])
+        return [{"volume_id": "v1", "title": "Offline Book", "authors": ["Demi"]}]
+    monkeypatch.setattr(cli_module, "get_top5_books", online)
+    monkeypatch.setattr(cli_module, "generate_summary", lambda t, a: "AI Summary")
+    runner = CliRunner()
+    runner.invoke(cli, ["search", "offline"])
+
+    def down(q, **kwargs):
+        raise TimeoutError("read timed out")
+    def no_model(title, author):
+        raise AssertionError("the model should not be called offline")
+    monkeypatch.setattr(cli_module, "get_top5_books", down)
+    monkeypatch.setattr(cli_module, "generate_summary", no_model)
+
+    result = runner.invoke(cli, ["search", "offl"])
+    assert "Error fetching books: read timed out" in result.output
+    assert "Offline Book by Demi" in result.output
+    assert "Summary: AI Summary" in result.output
+
+    result = runner.invoke(cli, ["search", "--offline", "demi"])
+    assert "Error fetching books" not in result.output
+    assert "Offline Book by Demi" in result.output
+
+
+def test_offline_search_counts_uncached_results_as_misses(monkeypatch):
+    """ Offline results without a cached summary are cache misses, not hits. """
+    conn = cli_module.get_db_connection()
+    save_volumes(conn, [{"id": "v1", "volumeInfo": {"title": "Dune", "authors": ["Frank Herbert"]}}])
+    conn.close()
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["search", "--offline", "dune"])
+    assert "Dune by Frank Herbert" in result.output
+    assert "Generating" not in result.output
+    stats = runner.invoke(cli, ["cache-stats"]).output
+    assert "0 hits, 1 misses (0.0% hit rate)" in stats
+
+
+def test_quota_shows_api_usage(monkeypatch):
+    """ Calls made during a search show up in the quota report. """
+    def fake_top5(q, **kwargs):
+        rate_limit.record_usage("books")
+        return [{"title": "Dune", "authors": ["Frank Herbert"]}]
+    monkeypatch.setattr(cli_module, "get_top5_books", fake_top5)
+    monkeypatch.setattr(cli_module, "generate_summary", lambda t, a: "A desert planet.")
+
+    runner = CliRunner()
+    assert runner.invoke(cli, ["quota"]).output.strip() == "No API calls in the last 7 days."
+    runner.invoke(cli, ["search", "dune"])
+    result = runner.invoke(cli, ["quota"])
+    assert result.exit_code == 0
+    lines = [line.split() for line in result.output.splitlines()[1:]]
+    assert lines[0][1:] == ["books", "1", "0"]
+
+def test_timings_flag_reports_spans(tmp_path):
+    """ --timings prints startup and database spans, --log-json writes them as JSON lines. """
+    log = tmp_path / "spans.jsonl"
+    runner = CliRunner()
+    result = runner.invoke(cli, ["--timings", "--log-json", str(log), "list"])
+    assert result.exit_code == 0
+    assert "startup" in result.output
+    assert "db.iter_books" in result.output
+
+    spans = [json.loads(line)["span"] for line in log.read_text().splitlines()]
+    assert spans[0] == "startup"
+    assert any(name.startswith("db.") for name in spans)
+
+    #Timings are switched off again once the command is done
+    from app import timings
+    assert not timings.is_enabled()
+
+def test_profile_flag_writes_stats(tmp_path):
+    """ --profile dumps cProfile stats that pstats can read. """
+    import pstats
+    path = tmp_path / "list.prof"
+    result = CliRunner().invoke(cli, ["--profile", str(path), "list"])
+    assert result.exit_code == 0
+    assert "Profile written to" in result.output
+    assert pstats.Stats(str(path)).total_calls > 0
+
+def test_stats_reports_api_metrics(monkeypatch, tmp_path):
+    """ Calls and cache hits from a search show up in 'bookclub stats'. """
+    from app import metrics
+    metrics.reset()
+
+    def fake_top5(q, **kwargs):
+        metrics.observe("books", 0.08)
+        return [{"title": "Dune", "authors": ["Frank Herbert"]}]
+    def fake_summary(title, author):
+        metrics.observe("genai", 0.9, tokens = 42, model = "gemini-test")
+        return "A desert planet."
+    monkeypatch.setattr(cli_module, "get_top5_books", fake_top5)
+    monkeypatch.setattr(cli_module, "generate_summary", fake_summary)
+
+    runner = CliRunner()
+    assert "No API calls recorded" in runner.invoke(cli, ["stats"]).output
+    runner.invoke(cli, ["search", "dune"])
+    runner.invoke(cli, ["search", "dune"])
+
+    prom = tmp_path / "bookclub.prom"
+    result = runner.invoke(cli, ["stats", "--prometheus", str(prom)])
+    assert result.exit_code == 0
+    lines = {line.split()[0]: line.split() for line in result.output.splitlines()[2:] if line}
+    assert lines["books"][1] == "2"
+    assert lines["genai"][1:3] == ["gemini-test", "1"]
+    assert lines["genai"][-1] == "42"
+    assert "Summary cache: 1 hits, 1 misses (50.0% hit rate)" in result.output
+    assert 'bookclub_api_tokens{api="genai",model="gemini-test"} 42' in prom.read_text()
+
+def _add_books_without_summaries(count):
+    conn = cli_module.get_db_connection()
+    for n in range(count):
+        add_book(conn, f"Book {n}", f"Author {n}", "No summary available." if n % 2 else "")
+    conn.close()
+
+def test_backfill_fills_missing_summaries(monkeypatch):
+    """ backfill summarizes every book without a summary and reports its progress. """
+    _add_books_without_summaries(5)
+    monkeypatch.setattr(cli_module, "generate_summary", lambda t, a: f"Summary of {t}")
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["backfill", "--batch-size", "2"])
+    assert result.exit_code == 0
+    assert "Backfilling summaries for 5 books." in result.output
+    assert "2/5 books (0 failed)" in result.output
+    assert "Backfilled 5 summaries (0 failed)" in result.output
+    assert "Summary: Summary of Book 4" in runner.invoke(cli, ["list"]).output
+
+    assert "Every book already has a summary." in runner.invoke(cli, ["backfill"]).output
+
+def test_backfill_resumes_after_limit_and_stall(monkeypatch):
+    """ An interrupted backfill picks up after the last book it finished. """
+    _add_books_without_summaries(6)
+    calls = []
+    def summarize(title, author):
+        calls.append(title)
+        return f"Summary of {title}"
+    monkeypatch.setattr(cli_module, "generate_summary", summarize)
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["backfill", "--batch-size", "2", "--limit", "2"])
+    assert result.exit_code == 0
+    assert "4 books left" in result.output
+
+    #GenAI goes down: the run stops without moving the checkpoint
+    def failing(title, author):
+        raise RuntimeError("GenAI is down")
+    monkeypatch.setattr(cli_module, "generate_summary", failing)
+    result = runner.invoke(cli, ["backfill", "--batch-size", "2"])
+    assert result.exit_code == 1
+    assert "resume after book ID 2" in result.output
+
+    monkeypatch.setattr(cli_module, "generate_summary", summarize)
+    result = runner.invoke(cli, ["backfill", "--batch-size", "2"])
+    assert result.exit_code == 0
+    assert "Resuming after book ID 2: 2 done, 0 failed so far, 4 books left." in result.output
+    assert sorted(calls) == [f"Book {n}" for n in range(6)]
+
+def test_backfill_batch_mode(monkeypatch):
+    """ --batch asks for each chunk in one prompt and counts books it couldn't summarize. """
+    _add_books_without_summaries(3)
+    monkeypatch.setattr(cli_module, "generate_summaries",
+                        lambda books, summarize = None, on_error = None, deadline = None:
+                        [f"Summary of {t}" if t != "Book 1" else cli_module.NO_SUMMARY for t, a in books])
+
+    result = CliRunner().invoke(cli, ["backfill", "--batch"])
+    assert result.exit_code == 0
+    assert "Backfilled 2 summaries (1 failed)" in result.output
+
+def test_search_mixes_cached_and_new_summaries_with_the_limiter(monkeypatch):
+    """ A search with one cached and one new book goes through the real generate_summary without locking. """
+    import time
+    from unittest.mock import MagicMock
+    import app.genai as genai_module
+    from app.genai import generate_summary
+
+    conn = cli_module.get_db_connection()
+    add_book(conn, "Old Book", "Old Author", "Saved summary")
+    conn.close()
+
+    client = MagicMock()
+    client.models.generate_content.return_value = MagicMock(text = "A fresh summary.")
+    monkeypatch.setattr(genai_module, "get_client", lambda: client)
+    monkeypatch.setattr(cli_module, "generate_summary", generate_summary)
+    monkeypatch.setattr(cli_module, "get_top5_books", lambda q, **kwargs: [
+        {"title": "Old Book", "authors": ["Old Author"]},
+        {"title": "New Book", "authors": ["New Author"]}])
+
+    runner = CliRunner()
+    start = time.monotonic()
+    result = runner.invoke(cli, ["search", "book"])
+    assert result.exit_code == 0
+    assert time.monotonic() - start < 5
+    assert "database is locked" not in result.output
+    assert "Summary: Saved summary" in result.output
+    assert "Summary: A fresh summary." in result.output
+
+    #The call went through the shared limiter and was counted
+    lines = [line.split() for line in runner.invoke(cli, ["quota"]).output.splitlines()[1:]]
+    assert ["genai", "1"] == lines[0][1:3]
@@ -0,0 +1,183 @@
+#Here we test `bookclub serve` and forwarding commands to it, against a real daemon process
+import io
+import json
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from app import daemon
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+pytestmark = pytest.mark.skipif(not hasattr(__import__("socket"), "AF_UNIX"),
+                                reason = "needs Unix sockets")
+
+
+@pytest.fixture
+def running_daemon(tmp_path):
+    """ A daemon serving tmp_path, with its own reading list database """
+    #Keep the socket path short, Unix sockets have a ~100 character limit
+    path = str(tmp_path / "d.sock")
+    env = dict(os.environ, PYTHONPATH = str(REPO_ROOT), BOOKS_QPS = "0", GENAI_QPS = "0")
+    process = subprocess.Popen([sys.executable, "-m", "app.cli", "serve", "--socket", path],
+                               cwd = tmp_path, env = env, stdout = subprocess.PIPE,
+                               stderr = subprocess.PIPE, text = True)
+    deadline = time.monotonic() + 15
+    while not os.path.exists(path):
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.kill()
+            pytest.fail(f"daemon did not start: {process.communicate()}")
+        time.sleep(0.05)
+    yield path, process
+    if process.poll() is None:
+        process.send_signal(signal.SIGINT)
+        process.wait(10)
+
+
+def run(path, cwd, *argv):
+    out, err = io.StringIO(), io.StringIO()
+    code = daemon.forward(argv, path, cwd = cwd, stdout = out, stderr = err)
+    return code, out.getvalue(), err.getvalue()
+
+
+def test_commands_run_in_the_daemon(running_daemon, tmp_path):
+    path, _ = running_daemon
+    conn = sqlite3.connect(tmp_path / "reading_list.db")
+    conn.executemany("INSERT INTO reading_list (title, author, status) VALUES (?, ?, ?)",
+                     [("Dune", "Frank Herbert", "TBR"), ("Emma", "Jane Austen", "Read")])
+    conn.commit(); conn.close()
+
+    code, out, _ = run(path, tmp_path, "list")
+    assert code == 0
+    assert "Dune" in out and "Emma" in out
+    #The daemon wrote to the database in its own working directory
+    assert (tmp_path / "reading_list.db").exists()
+
+
+def test_errors_and_exit_codes_come_back(running_daemon, tmp_path):
+    path, _ = running_daemon
+    code, _, err = run(path, tmp_path, "no-such-command")
+    assert code == 2
+    assert "No such command" in err
+
+
+def test_other_directories_run_locally(running_daemon, tmp_path):
+    path, _ = running_daemon
+    assert run(path, tmp_path / "elsewhere", "list") == (None, "", "")
+    assert run(path, tmp_path, "serve") == (None, "", "")
+    #Long jobs would hold the daemon up, so they run locally too
+    assert run(path, tmp_path, "import", "books.csv") == (None, "", "")
+    assert run(path, tmp_path, "--timings", "serve") == (None, "", "")
+    assert run(path, tmp_path, "--profile", "serve.prof", "serve") == (None, "", "")
+
+
+def test_command_name_skips_global_options():
+    assert daemon.command_name(["list"]) == "list"
+    assert daemon.command_name(["--timings", "serve"]) == "serve"
+    assert daemon.command_name(["--profile", "list", "serve", "--socket", "x"]) == "serve"
+    assert daemon.command_name(["--log-json=-", "--timings", "search", "Dune"]) == "search"
+    assert daemon.command_name(["--", "serve"]) == "serve"
+    assert daemon.command_name(["--help"]) is None
+
+
+def test_serve_after_global_options_is_not_forwarded(monkeypatch):
+    monkeypatch.setattr(daemon, "forward", lambda *args, **kwargs: pytest.fail("serve was forwarded"))
+    with pytest.raises(SystemExit) as exit_info:
+        daemon.main(["--timings", "serve", "--help"])
+    assert exit_info.value.code == 0
+
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl"])
+def test_export_to_stdout_in_the_daemon(tmp_path, monkeypatch, fmt):
+    """ export writes to the client's stdout when run by the daemon """
+    monkeypatch.chdir(tmp_path)
+    from app.cli import Database, cli
+    db = Database()
+    db.conn.execute("INSERT INTO reading_list (title, author, status) VALUES ('Dune', 'Frank Herbert', 'TBR')")
+    server, client = socket.socketpair()
+    try:
+        with server:
+            code = daemon.run_command(cli, ["export", "--format", fmt], db,
+                                      daemon._StreamWriter(server, "stdout"),
+                                      daemon._StreamWriter(server, "stderr"))
+        frames = [json.loads(line) for line in client.makefile("r", encoding = "utf-8")]
+    finally:
+        client.close()
+        db.close()
+    assert code == 0
+    assert all(frame["stream"] == "stdout" for frame in frames)
+    assert "Dune" in "".join(frame["data"] for frame in frames)
+
+
+def test_busy_daemon_sends_clients_back(tmp_path, monkeypatch):
+    """ While one command runs, other clients are told to run locally right away """
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / "busy.sock")
+    release = threading.Event()
+
+    class SlowCli:
+        def main(self, args, prog_name, obj):
+            print("working")
+            release.wait(10)
+
+    threading.Thread(target = daemon.serve, args = (SlowCli(), None, path), daemon = True).start()
+    while not os.path.exists(path):
+        time.sleep(0.01)
+    slow = threading.Thread(target = run, args = (path, tmp_path, "list"))
+    slow.start()
+    time.sleep(0.2)
+
+    started = time.monotonic()
+    assert run(path, tmp_path, "list", "--limit", "1") == (None, "", "")
+    assert time.monotonic() - started < 1
+    release.set()
+    slow.join(10)
+    assert run(path, tmp_path, "list") == (0, "working\n", "")
+
+
+def test_only_our_user_can_connect(running_daemon, tmp_path, monkeypatch):
+    path, _ = running_daemon
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+    #Run a second daemon in-process that sees every client as someone else
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(daemon, "_peer_uid", lambda conn: os.getuid() + 1)
+    other = str(tmp_path / "other.sock")
+    threading.Thread(target = daemon.serve, args = (None, None, other), daemon = True).start()
+    while not os.path.exists(other):
+        time.sleep(0.01)
+    assert run(other, tmp_path, "list") == (None, "", "")
+
+
+def test_stopping_removes_the_socket(running_daemon):
+    path, process = running_daemon
+    process.send_signal(signal.SIGINT)
+    out, _ = process.communicate(timeout = 10)
+    assert "Stopped the bookclub daemon." in out
+    assert not os.path.exists(path)
+
+
+def test_no_daemon_falls_back_to_local(tmp_path, monkeypatch, capsys):
+    missing = str(tmp_path / "missing.sock")
+    assert daemon.forward(["list"], missing) is None
+
+    #A socket file nobody listens on is ignored too
+    import socket
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(tmp_path / "stale.sock"))
+    stale.close()
+    assert daemon.forward(["list"], str(tmp_path / "stale.sock")) is None
+
+    monkeypatch.setenv("BOOKCLUB_SOCKET", missing)
+    with pytest.raises(SystemExit) as exit_info:
+        daemon.main(["--help"])
+    assert exit_info.value.code == 0
+    assert "Command line interface" in capsys.readouterr().out
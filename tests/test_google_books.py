@@ -1,20 +1,50 @@
+import os
+
 import requests
 import pytest
 
+import app.google_books as google_books
 from app.google_books import get_top5_books
 
+@pytest.fixture(autouse=True)
+def isolate_cache(tmp_path, monkeypatch):
+    """ Keep the on-disk response cache inside the test's temporary directory """
+    monkeypatch.setattr(google_books, "BOOKS_CACHE_DIR", str(tmp_path / "cache"))
+    #Every test starts with a closed circuit and retries that don't wait
+    google_books.BOOKS_BREAKER.reset()
+    monkeypatch.setattr("app.resilience.sleep", lambda seconds: None)
+
+
 # First we make a DummyResponse class to simulate "requests" responses for testing
 class DummyResponse:
-    def __init__(self, json_data, status_code=200):
+    def __init__(self, json_data, status_code=200, headers=None):
         self.json_data = json_data
         self.status_code = status_code
+        self.headers = headers or {}
 
     def json(self):
         return self.json_data
 
     def raise_for_status(self):
         if self.status_code >= 400:
-            raise requests.HTTPError(f"HTTP Error: {self.status_code} Error")
+            raise requests.HTTPError(f"HTTP Error: {self.status_code} Error", response=self)
+
+
+# And a DummySession that hands every GET to a plain function
+class DummySession:
+    def __init__(self, handler):
+        self.handler = handler
+        self.calls = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.calls.append({"params": dict(params), "headers": dict(headers or {})})
+        return self.handler(url, params)
+
+
+def use_session(monkeypatch, handler):
+    session = DummySession(handler)
+    monkeypatch.setattr(google_books, "get_session", lambda: session)
+    return session
 
 
 def test_returns_five_books_when_available(monkeypatch):
@@ -31,7 +61,7 @@ def test_returns_five_books_when_available(monkeypatch):
         assert params['maxResults'] == 5
         return DummyResponse(dummy_payload, status_code=200)
 
-    monkeypatch.setattr("app.google_books.requests.get", dummy_get)
+    use_session(monkeypatch, dummy_get)
 
     results = get_top5_books("test query")
     assert isinstance(results, list)
@@ -55,7 +85,7 @@ def test_returns_all_books_when_less_than_five(monkeypatch):
         assert params['q'] == 'intitle:short list query'
         return DummyResponse(dummy_payload, status_code=200)
 
-    monkeypatch.setattr("app.google_books.requests.get", dummy_get)
+    use_session(monkeypatch, dummy_get)
 
     results = get_top5_books("short list query")
     assert isinstance(results, list)
@@ -73,7 +103,7 @@ def test_defaults_for_missing_fields(monkeypatch):
         assert params['q'] == 'intitle:missing fields query'
         return DummyResponse(dummy_payload, status_code=200)
 
-    monkeypatch.setattr("app.google_books.requests.get", dummy_get)
+    use_session(monkeypatch, dummy_get)
 
     results = get_top5_books("missing fields query")
     assert isinstance(results, list)
@@ -90,8 +120,154 @@ def test_returns_empty_list_on_bad_response(monkeypatch):
         assert params['q'] == 'intitle:bad response query'
         return DummyResponse({}, status_code=500)
 
-    monkeypatch.setattr("app.google_books.requests.get", dummy_get)
+    use_session(monkeypatch, dummy_get)
 
     results = get_top5_books("bad response query")
     assert isinstance(results, list)
     assert results == []
+
+
+def test_repeat_query_served_from_cache(monkeypatch):
+    """ The same query should only hit the network once while the cache is fresh """
+    payload = {"items": [{"id": "id_1", "volumeInfo": {"title": "Cached", "authors": ["A"]}}]}
+    session = use_session(monkeypatch, lambda url, params: DummyResponse(payload))
+
+    first = get_top5_books("cached query")
+    second = get_top5_books("cached query")
+    assert first == second
+    # one intitle call and one inauthor call, nothing for the repeat search
+    assert len(session.calls) == 2
+
+
+def test_cache_key_ignores_api_key(monkeypatch):
+    """ Changing the API key should not invalidate cached responses """
+    params = {"q": "intitle:x", "key": "one", "maxResults": 5}
+    other = dict(params, key="two")
+    assert google_books._cache_path(params) == google_books._cache_path(other)
+
+
+def test_stale_entry_revalidated_with_etag(monkeypatch):
+    """ A stale entry is revalidated with If-None-Match and reused on 304 """
+    payload = {"items": [{"id": "id_1", "volumeInfo": {"title": "Tagged", "authors": ["A"]}}]}
+    responses = [DummyResponse(payload, headers={"ETag": '"v1"'}), DummyResponse({}, status_code=304)]
+    session = use_session(monkeypatch, lambda url, params: responses.pop(0))
+    params = {"q": "intitle:tagged", "key": "k", "maxResults": 5}
+
+    assert google_books.cached_get(params) == payload
+    monkeypatch.setattr(google_books, "BOOKS_CACHE_TTL", 0.000001)
+    assert google_books.cached_get(params) == payload
+    assert session.calls[1]["headers"] == {"If-None-Match": '"v1"'}
+
+
+def test_no_store_responses_are_not_cached(monkeypatch):
+    """ Responses marked no-store must be fetched every time """
+    payload = {"items": []}
+    session = use_session(monkeypatch, lambda url, params: DummyResponse(
+        payload, headers={"Cache-Control": "private, no-store"}))
+    params = {"q": "intitle:private", "key": "k", "maxResults": 5}
+
+    google_books.cached_get(params)
+    google_books.cached_get(params)
+    assert len(session.calls) == 2
+
+
+def test_max_age_shorter_than_ttl_wins(monkeypatch):
+    """ A Cache-Control max-age below BOOKS_CACHE_TTL decides when we fetch again """
+    payload = {"items": []}
+    session = use_session(monkeypatch, lambda url, params: DummyResponse(
+        payload, headers={"Cache-Control": "private, max-age=60"}))
+    params = {"q": "intitle:short", "key": "k", "maxResults": 5}
+
+    google_books.cached_get(params)
+    google_books.cached_get(params)
+    assert len(session.calls) == 1
+
+    clock = google_books.time.time() + 61
+    monkeypatch.setattr(google_books.time, "time", lambda: clock)
+    google_books.cached_get(params)
+    assert len(session.calls) == 2
+
+
+def test_no_cache_responses_are_always_revalidated(monkeypatch):
+    """ no-cache entries are kept for their ETag but never used without asking """
+    payload = {"items": [{"id": "id_1", "volumeInfo": {"title": "Checked", "authors": ["A"]}}]}
+    responses = [DummyResponse(payload, headers={"Cache-Control": "no-cache", "ETag": '"v1"'}),
+                 DummyResponse({}, status_code=304)]
+    session = use_session(monkeypatch, lambda url, params: responses.pop(0))
+    params = {"q": "intitle:checked", "key": "k", "maxResults": 5}
+
+    assert google_books.cached_get(params) == payload
+    assert google_books.cached_get(params) == payload
+    assert session.calls[1]["headers"] == {"If-None-Match": '"v1"'}
+
+
+def test_prune_cache_deletes_old_files(tmp_path, monkeypatch):
+    """ Files not written for BOOKS_CACHE_MAX_STALE are deleted, recent ones stay """
+    monkeypatch.setattr(google_books, "BOOKS_CACHE_MAX_STALE", 3600)
+    cache = tmp_path / "cache"
+    cache.mkdir()
+    old, recent = cache / "old.json", cache / "recent.json"
+    old.write_text("{}")
+    recent.write_text("{}")
+    long_ago = google_books.time.time() - 2 * 3600
+    os.utime(old, (long_ago, long_ago))
+
+    assert google_books.prune_cache(force=True) == 1
+    assert not old.exists() and recent.exists()
+
+
+
+def test_parallel_mode_matches_sequential(monkeypatch):
+    """ Parallel title/author queries must merge to the same results as the sequential path """
+    title_items = [{"id": f"t_{i}", "volumeInfo": {"title": f"title_{i}", "authors": ["A"]}}
+                   for i in range(1, 3)]
+    # The author query repeats one of the title hits to exercise the dedup
+    author_items = [{"id": "t_1", "volumeInfo": {"title": "title_1", "authors": ["A"]}}] + [
+        {"id": f"a_{i}", "volumeInfo": {"title": f"by_author_{i}", "authors": ["A"]}}
+        for i in range(1, 6)]
+
+    def dummy_get(url, params):
+        if params['q'].startswith('intitle:'):
+            return DummyResponse({"items": title_items})
+        return DummyResponse({"items": author_items[:params['maxResults']]})
+
+    use_session(monkeypatch, dummy_get)
+    monkeypatch.setattr(google_books, "BOOKS_CACHE_TTL", 0)
+    sequential = get_top5_books("sparse query", parallel=False)
+    session = use_session(monkeypatch, dummy_get)
+    parallel = get_top5_books("sparse query", parallel=True)
+
+    assert parallel == sequential
+    assert [book["volume_id"] for book in parallel][:2] == ["t_1", "t_2"]
+    assert sorted(call["params"]["maxResults"] for call in session.calls) == [5, 5]
+
+
+def test_strict_mode_raises_when_every_request_fails(monkeypatch):
+    """ strict=True surfaces the error instead of pretending there were no results """
+    use_session(monkeypatch, lambda url, params: DummyResponse({}, status_code=404))
+    with pytest.raises(requests.HTTPError):
+        get_top5_books("down query", strict=True)
+    assert get_top5_books("down query") == []
+
+
+def test_on_items_sees_every_response(monkeypatch):
+    """ on_items gets the raw items of both the title and the author query """
+    def dummy_get(url, params):
+        prefix = params['q'].split(':')[0]
+        return DummyResponse({"items": [{"id": prefix, "volumeInfo": {"title": prefix}}]})
+
+    use_session(monkeypatch, dummy_get)
+    seen = []
+    get_top5_books("anything", on_items=seen.extend)
+    assert [item["id"] for item in seen] == ["intitle", "inauthor"]
+
+
+def test_server_errors_are_retried(monkeypatch):
+    """ A 503 followed by a good answer should still give results """
+    payload = {"items": [{"id": "id_1", "volumeInfo": {"title": "Retried", "authors": ["A"]}}]}
+    responses = [DummyResponse({}, status_code=503), DummyResponse(payload)]
+    session = use_session(monkeypatch, lambda url, params: responses.pop(0) if responses else DummyResponse({}))
+
+    results = get_top5_books("retry query")
+    assert [book["title"] for book in results] == ["Retried"]
+    assert session.calls[0]["params"] == session.calls[1]["params"]
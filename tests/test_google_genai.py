@@ -1,12 +1,20 @@
 #Here we can test to the GenAI API to make sure it is generating the book summaries correctly
+import os
+import subprocess
+import sys
+import time
 import unittest
 from unittest.mock import patch, MagicMock
-from app.genai import generate_summary
+import httpx
+from app.genai import (GENAI_BREAKER, generate_summary, generate_summaries, generate_summaries_concurrently,
+                       iter_summaries, NO_SUMMARY)
+from app.resilience import CircuitOpenError, Deadline, DeadlineExceeded
 
 class TestGenAISummary(unittest.TestCase):
 
-    @patch('app.genai.client.models.generate_content')
-    def test_generate_summary(self, mock_generate_content):
+    @patch('app.genai.get_client')
+    def test_generate_summary(self, mock_get_client):
+        mock_generate_content = mock_get_client.return_value.models.generate_content
         # Setup fake response
         mock_response = MagicMock()
         mock_response.text = "This is a mock summary."
@@ -21,8 +29,9 @@ class TestGenAISummary(unittest.TestCase):
 
         self.assertEqual(summary, "This is a mock summary.")
  
-    @patch('app.genai.client.models.generate_content')
-    def test_long_title_and_author(self, mock_generate_content):
+    @patch('app.genai.get_client')
+    def test_long_title_and_author(self, mock_get_client):
+        mock_generate_content = mock_get_client.return_value.models.generate_content
         mock_response = MagicMock()
         mock_response.text = "This is a summary for a long book title."
         mock_generate_content.return_value = mock_response
@@ -32,11 +41,198 @@ class TestGenAISummary(unittest.TestCase):
         summary = generate_summary(long_title, long_author)
         self.assertIn("summary", summary.lower())
 
-    @patch('app.genai.client.models.generate_content')
-    def test_empty_api_response(self, mock_generate_content):
+    @patch('app.genai.get_client')
+    def test_empty_api_response(self, mock_get_client):
+        mock_generate_content = mock_get_client.return_value.models.generate_content
         mock_response = MagicMock()
         mock_response.text = ""
         mock_generate_content.return_value = mock_response
 
         summary = generate_summary("Book Title", "Author Name")
         self.assertEqual(summary, "")  # Or however you choose to handle it
+
+    @patch('app.resilience.sleep')
+    @patch('app.genai.get_client')
+    def test_unreachable_model_opens_the_breaker(self, mock_get_client, _sleep):
+        mock_get_client.return_value.models.generate_content.side_effect = httpx.ConnectTimeout("timed out")
+        GENAI_BREAKER.reset()
+        self.addCleanup(GENAI_BREAKER.reset)
+
+        with self.assertRaises(httpx.ConnectTimeout):
+            generate_summary("Book Title", "Author Name")
+        self.assertTrue(GENAI_BREAKER.is_open)
+        with self.assertRaises(CircuitOpenError):
+            generate_summary("Book Title", "Author Name")
+
+
+class TestConcurrentSummaries(unittest.TestCase):
+
+    def test_keeps_order_of_books(self):
+        # Later books finish first, but results must follow the input order
+        delays = {"A": 0.06, "B": 0.03, "C": 0.0}
+
+        def fake_summary(title, author):
+            time.sleep(delays[title])
+            return f"{title} by {author}"
+
+        books = [("A", "x"), ("B", "y"), ("C", "z")]
+        summaries = generate_summaries_concurrently(books, summarize=fake_summary)
+        self.assertEqual(summaries, ["A by x", "B by y", "C by z"])
+
+    def test_runs_calls_in_parallel(self):
+        def slow_summary(title, author):
+            time.sleep(0.1)
+            return title
+
+        start = time.monotonic()
+        generate_summaries_concurrently([(str(i), "a") for i in range(5)],
+                                        summarize=slow_summary, max_workers=5)
+        self.assertLess(time.monotonic() - start, 0.4)
+
+    def test_failure_falls_back_for_that_book_only(self):
+        def flaky_summary(title, author):
+            if title == "bad":
+                raise RuntimeError("boom")
+            return "ok"
+
+        errors = []
+        summaries = generate_summaries_concurrently(
+            [("good", "a"), ("bad", "b")], summarize=flaky_summary,
+            on_error=lambda index, error: errors.append(index))
+        self.assertEqual(summaries, ["ok", NO_SUMMARY])
+        self.assertEqual(errors, [1])
+
+    def test_timeout_does_not_block_other_books(self):
+        def hung_summary(title, author):
+            if title == "hung":
+                time.sleep(1)
+            return "fast"
+
+        start = time.monotonic()
+        summaries = generate_summaries_concurrently(
+            [("hung", "a"), ("quick", "b")], summarize=hung_summary, timeout=0.1)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(summaries, [NO_SUMMARY, "fast"])
+
+    def test_timed_out_call_does_not_hold_up_exit(self):
+        # a fresh interpreter, so we can see when it is allowed to exit
+        script = (
+            "import time\n"
+            "from app.genai import iter_summaries\n"
+            "hung = lambda title, author: time.sleep(5)\n"
+            "print(list(iter_summaries([('hung', 'a')], summarize=hung, timeout=0.3)))\n"
+        )
+        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        start = time.monotonic()
+        result = subprocess.run([sys.executable, "-c", script], cwd=repo_root,
+                                capture_output=True, text=True, timeout=30)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("No summary available.", result.stdout)
+        self.assertLess(time.monotonic() - start, 4)
+
+    def test_iter_summaries_yields_as_completed(self):
+        delays = {"slow": 0.1, "fast": 0.0}
+
+        def fake_summary(title, author):
+            time.sleep(delays[title])
+            return title
+
+        results = list(iter_summaries([("slow", "a"), ("fast", "b")], summarize=fake_summary))
+        self.assertEqual(results, [(1, "fast", None), (0, "slow", None)])
+
+
+class TestBatchedSummaries(unittest.TestCase):
+
+    @patch('app.genai.get_client')
+    def test_one_call_for_all_books(self, mock_get_client):
+        mock_generate_content = mock_get_client.return_value.models.generate_content
+        mock_response = MagicMock()
+        mock_response.text = '[{"index": 2, "summary": "Second."}, {"index": 1, "summary": "First."}]'
+        mock_generate_content.return_value = mock_response
+
+        summaries = generate_summaries([("Book A", "Author A"), ("Book B", "Author B")])
+
+        self.assertEqual(summaries, ["First.", "Second."])
+        mock_generate_content.assert_called_once()
+        prompt = mock_generate_content.call_args.kwargs["contents"]
+        self.assertIn("1. Book A by Author A", prompt)
+        self.assertIn("2. Book B by Author B", prompt)
+
+    @patch('app.genai.get_client')
+    def test_code_fenced_json_is_accepted(self, mock_get_client):
+        mock_generate_content = mock_get_client.return_value.models.generate_content
+        mock_response = MagicMock()
+        mock_response.text = '```json\n[{"index": 1, "summary": "Fenced."}]\n```'
+        mock_generate_content.return_value = mock_response
+
+        self.assertEqual(generate_summaries([("Book A", "Author A")]), ["Fenced."])
+
+    @patch('app.genai.get_client')
+    def test_bad_entries_fall_back_per_book(self, mock_get_client):
+        mock_generate_content = mock_get_client.return_value.models.generate_content
+        mock_response = MagicMock()
+        mock_response.text = '[{"index": 1, "summary": "Good."}, {"index": 2, "summary": ""}]'
+        mock_generate_content.return_value = mock_response
+        fallback_calls = []
+
+        def fallback(title, author):
+            fallback_calls.append(title)
+            return f"Single {title}"
+
+        summaries = generate_summaries([("Book A", "A"), ("Book B", "B"), ("Book C", "C")],
+                                       summarize=fallback)
+        self.assertEqual(summaries, ["Good.", "Single Book B", "Single Book C"])
+        self.assertEqual(sorted(fallback_calls), ["Book B", "Book C"])
+
+    @patch('app.genai.get_client')
+    def test_unparseable_answer_falls_back_for_every_book(self, mock_get_client):
+        mock_generate_content = mock_get_client.return_value.models.generate_content
+        mock_response = MagicMock()
+        mock_response.text = "Sorry, I can't do JSON today."
+        mock_generate_content.return_value = mock_response
+
+        summaries = generate_summaries([("Book A", "A")], summarize=lambda t, a: "Single")
+        self.assertEqual(summaries, ["Single"])
+
+    @patch('app.genai.get_client')
+    def test_no_batch_call_or_fallback_after_the_deadline(self, mock_get_client):
+        mock_generate_content = mock_get_client.return_value.models.generate_content
+        deadline = Deadline(0.01)
+        time.sleep(0.02)
+        errors = []
+
+        summaries = generate_summaries([("Book A", "A"), ("Book B", "B")],
+                                       summarize=lambda t, a: self.fail("fell back after the deadline"),
+                                       on_error=lambda index, error: errors.append((index, type(error))),
+                                       deadline=deadline)
+        self.assertEqual(summaries, [NO_SUMMARY, NO_SUMMARY])
+        self.assertEqual(errors, [(0, DeadlineExceeded), (1, DeadlineExceeded)])
+        mock_generate_content.assert_not_called()
+
+    @patch('app.genai.get_client')
+    def test_slow_batch_answer_uses_up_the_deadline(self, mock_get_client):
+        def slow_answer(**kwargs):
+            time.sleep(0.1)
+            return MagicMock(text="not json")
+        mock_get_client.return_value.models.generate_content.side_effect = slow_answer
+
+        fallback_calls = []
+        summaries = generate_summaries([("Book A", "A")],
+                                       summarize=lambda t, a: fallback_calls.append(t) or "Single",
+                                       deadline=Deadline(0.05))
+        self.assertEqual(summaries, [NO_SUMMARY])
+        self.assertEqual(fallback_calls, [])
+
+
+class TestLazyClient(unittest.TestCase):
+
+    def test_client_built_once_on_first_use(self):
+        import app.genai as genai_module
+        fake_sdk = MagicMock()
+        with patch.dict('sys.modules', {'google': fake_sdk, 'google.genai': fake_sdk.genai}), \
+                patch.object(genai_module, '_client', None):
+            first = genai_module.get_client()
+            second = genai_module.get_client()
+        self.assertIs(first, second)
+        fake_sdk.genai.Client.assert_called_once()
+        self.assertEqual(fake_sdk.genai.Client.call_args.kwargs['api_key'], genai_module.api_key)
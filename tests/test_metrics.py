@@ -0,0 +1,85 @@
+#Here we test the per-hour API metrics behind `bookclub stats`
+import sqlite3
+
+import pytest
+
+from app import metrics
+from app.book_list_db import get_metrics, save_metrics, set_up
+
+
+@pytest.fixture
+def con():
+    metrics.reset()
+    connection = sqlite3.connect(":memory:")
+    set_up(connection)
+    yield connection
+    connection.close()
+    metrics.reset()
+
+
+def test_observations_are_added_up_per_hour(con):
+    for ms in (20, 40, 80, 300, 900):
+        metrics.observe("books", ms / 1000)
+    metrics.observe("books", 2.0, ok = False)
+    metrics.observe("genai", 1.2, tokens = 150, model = "gemini")
+    metrics.count("summary_cache.hit", 3)
+    metrics.count("summary_cache.miss")
+    assert metrics.pending()
+    metrics.flush(con)
+    assert not metrics.pending()
+
+    stats = metrics.summarize(con, hours = 1)
+    books = stats[("books", "")]
+    assert books["calls"] == 6 and books["errors"] == 1
+    assert books["max_ms"] == pytest.approx(2000)
+    assert 50 <= books["p50_ms"] <= 250
+    assert 900 <= books["p95_ms"] <= 2000
+    assert stats[("genai", "gemini")]["tokens"] == 150
+    assert metrics.hit_rate(stats, "summary_cache") == (3, 1)
+
+
+def test_flushes_merge_into_the_same_hour(con):
+    metrics.observe("books", 0.01)
+    metrics.flush(con)
+    metrics.observe("books", 0.02)
+    metrics.flush(con)
+
+    rows = get_metrics(con)
+    assert len(rows) == 1
+    assert rows[0][3] == 2
+    assert sum(rows[0][8]) == 2
+
+
+def test_old_hours_are_dropped(con):
+    hour = metrics.current_hour()
+    histogram = [1] + [0] * len(metrics.LATENCY_BUCKETS_MS)
+    save_metrics(con, [(hour - 10, "books", "", 1, 0, 3.0, 3.0, 0, histogram),
+                       (hour - 2, "books", "", 1, 0, 3.0, 3.0, 0, histogram),
+                       (hour, "books", "", 1, 0, 3.0, 3.0, 0, histogram)], retention_hours = 5)
+    assert [row[0] for row in get_metrics(con)] == [hour - 2, hour]
+    #Only the window asked for is summed up
+    assert metrics.summarize(con, hours = 1)[("books", "")]["calls"] == 1
+
+
+def test_percentile_interpolates_inside_a_bucket():
+    histogram = [0] * (len(metrics.LATENCY_BUCKETS_MS) + 1)
+    histogram[4] = 10   # everything between 50 and 100 ms
+    assert metrics.percentile(histogram, 100, 0.5) == pytest.approx(75)
+    assert metrics.percentile(histogram, 90, 0.95) == pytest.approx(90)
+    assert metrics.percentile([0] * len(histogram), 0, 0.5) == 0.0
+
+
+def test_prometheus_text(con, tmp_path):
+    metrics.observe("genai", 0.5, tokens = 10, model = "gemini")
+    metrics.count("books_cache.hit")
+    metrics.flush(con)
+
+    text = metrics.prometheus_text(metrics.summarize(con, 24), 24)
+    assert "# TYPE bookclub_api_latency_seconds summary" in text
+    assert 'bookclub_api_latency_seconds_count{api="genai",model="gemini"} 1' in text
+    assert 'bookclub_api_tokens{api="genai",model="gemini"} 10' in text
+    assert 'bookclub_cache_hit_ratio{cache="books_cache"} 1.0000' in text
+
+    path = tmp_path / "bookclub.prom"
+    metrics.write_prometheus(path, text)
+    assert path.read_text() == text
@@ -0,0 +1,95 @@
+#Here we test the shared token bucket and the daily API usage counts
+import multiprocessing
+import sqlite3
+import time
+
+import pytest
+
+from app import rate_limit
+from app.book_list_db import get_api_usage, set_up
+from app.resilience import DeadlineExceeded
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """ A set up database the limiter points at, with sleeping recorded instead of done """
+    path = str(tmp_path / "limits.db")
+    con = sqlite3.connect(path)
+    set_up(con)
+    con.close()
+    slept = []
+    monkeypatch.setattr(rate_limit, "sleep", slept.append)
+    monkeypatch.setattr(rate_limit, "_limits", {})
+    rate_limit.configure(path, {"books": 2})
+    yield path, slept
+    rate_limit.configure(None)
+
+
+def test_unconfigured_limiter_does_nothing(monkeypatch):
+    rate_limit.configure(None, {"books": 1})
+    monkeypatch.setattr(rate_limit, "sleep", lambda s: pytest.fail("should not wait"))
+    for _ in range(5):
+        assert rate_limit.acquire("books") == 0.0
+    rate_limit.record_usage("books")
+
+
+def test_burst_then_wait(db_path):
+    path, slept = db_path
+    #2 per second allows a burst of 2, the third call has to wait about half a second
+    assert rate_limit.acquire("books") == 0.0
+    assert rate_limit.acquire("books") == 0.0
+    waited = rate_limit.acquire("books")
+    assert 0.4 < waited <= 0.5
+    assert slept and 0.4 < slept[0] <= 0.5
+
+
+def test_unlimited_api_never_waits(db_path):
+    _, slept = db_path
+    for _ in range(10):
+        rate_limit.acquire("genai")
+    assert slept == []
+
+
+def test_max_wait_raises(db_path):
+    rate_limit.acquire("books", tokens=2)
+    with pytest.raises(DeadlineExceeded):
+        rate_limit.acquire("books", max_wait=0.1)
+
+
+def test_usage_is_counted_per_day(db_path):
+    path, _ = db_path
+    rate_limit.record_usage("books")
+    rate_limit.record_usage("books")
+    rate_limit.record_usage("genai", tokens=120)
+    rate_limit.record_usage("genai", tokens=30)
+
+    con = sqlite3.connect(path)
+    rows = get_api_usage(con)
+    con.close()
+    assert [(api, calls, tokens) for _, api, calls, tokens in rows] == [
+        ("books", 2, 0), ("genai", 2, 150)]
+
+
+def _take(path, count, queue):
+    rate_limit.configure(path, {"books": 5})
+    for _ in range(count):
+        rate_limit.acquire("books")
+    queue.put(time.time())
+
+
+def test_bucket_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / "shared.db")
+    con = sqlite3.connect(path)
+    set_up(con)
+    con.close()
+
+    #Two processes taking 10 tokens between them at 5/s (burst 5) need at least a second
+    queue = multiprocessing.Queue()
+    start = time.time()
+    workers = [multiprocessing.Process(target = _take, args = (path, 5, queue)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(10)
+    finished = max(queue.get(timeout = 1) for _ in workers)
+    assert finished - start >= 0.9
@@ -0,0 +1,185 @@
+#Here we test timeouts, retries and the circuit breaker, end to end against a local fake HTTP server
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+import app.google_books as google_books
+from app.google_books import get_top5_books
+from app.resilience import (CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceeded,
+                            call_with_retries, is_retryable)
+
+
+class FakeBooksServer:
+    """ A local stand-in for the Google Books volumes endpoint that answers from a script """
+
+    def __init__(self):
+        self.script = []   # (status, delay) per request, the last one repeats
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, delay = server.script[min(server.requests, len(server.script) - 1)]
+                server.requests += 1
+                time.sleep(delay)
+                body = json.dumps({"items": [
+                    {"id": "v1", "volumeInfo": {"title": "From the fake server", "authors": ["A"]}}]})
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                self.wfile.write(body.encode() if status == 200 else b"{}")
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/books/v1/volumes"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    fake = FakeBooksServer()
+    monkeypatch.setattr(google_books, "BASE_URL", fake.url)
+    monkeypatch.setattr(google_books, "BOOKS_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(google_books, "BOOKS_BREAKER", CircuitBreaker("Google Books", 3, 60))
+    monkeypatch.setattr("app.resilience.sleep", lambda seconds: None)
+    yield fake
+    fake.close()
+
+
+def test_retries_server_errors_until_success(server):
+    server.script = [(503, 0), (429, 0), (200, 0)]
+    results = get_top5_books("flaky", parallel=False)
+    assert [book["title"] for book in results] == ["From the fake server"]
+    # two failures and a success for the title query, then one call for the author query
+    assert server.requests == 4
+
+
+def test_timeout_stops_a_hung_request(server, monkeypatch):
+    server.script = [(200, 0.5)]
+    monkeypatch.setattr(google_books, "BOOKS_TIMEOUT", 0.1)
+    monkeypatch.setattr(google_books, "BOOKS_RETRIES", 0)
+    start = time.monotonic()
+    with pytest.raises(Exception):
+        get_top5_books("hung", strict=True)
+    assert time.monotonic() - start < 0.4
+
+
+def test_breaker_skips_backend_after_failures(server):
+    server.script = [(500, 0)]
+    with pytest.raises(CircuitOpenError):
+        get_top5_books("down", strict=True)
+    # three failed attempts opened the circuit, the author query never reached the server
+    assert server.requests == 3
+    assert get_top5_books("down again") == []
+    assert server.requests == 3
+
+
+def test_search_deadline_bounds_all_requests(server, monkeypatch):
+    server.script = [(200, 0.3)]
+    monkeypatch.setattr(google_books, "BOOKS_RETRIES", 0)
+    start = time.monotonic()
+    get_top5_books("slow", deadline=Deadline(0.1))
+    assert time.monotonic() - start < 0.5
+
+
+def test_call_with_retries_gives_up_on_client_errors():
+    class NotFound(Exception):
+        code = 404
+
+    calls = []
+
+    def fail():
+        calls.append(1)
+        raise NotFound()
+
+    breaker = CircuitBreaker("test", failure_threshold=1, cooldown=60)
+    with pytest.raises(NotFound):
+        call_with_retries(fail, retries=3, breaker=breaker)
+    assert len(calls) == 1
+    # a 404 means the backend is up, so the circuit stays closed
+    assert not breaker.is_open
+
+
+def test_breaker_lets_one_trial_through_after_cooldown():
+    breaker = CircuitBreaker("test", failure_threshold=2, cooldown=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()  # only one trial at a time
+    breaker.record_success()
+    assert breaker.allow() and not breaker.is_open
+
+
+def test_deadline():
+    assert Deadline(None).timeout(5) == 5
+    assert Deadline(10).timeout(5) == 5
+    assert Deadline(0.5).timeout(5) <= 0.5
+    expired = Deadline(0.001)
+    time.sleep(0.01)
+    assert expired.expired()
+    with pytest.raises(DeadlineExceeded):
+        expired.timeout(5)
+
+
+def test_is_retryable():
+    class Response:
+        def __init__(self, status_code):
+            self.status_code = status_code
+
+    class HTTPError(OSError):
+        def __init__(self, status_code):
+            self.response = Response(status_code)
+
+    assert is_retryable(HTTPError(503)) and is_retryable(HTTPError(429))
+    assert not is_retryable(HTTPError(400))
+    assert is_retryable(ConnectionError()) and is_retryable(TimeoutError())
+    assert not is_retryable(ValueError()) and not is_retryable(DeadlineExceeded())
+
+
+@pytest.mark.parametrize("error", [httpx.ConnectTimeout("slow"), httpx.ReadTimeout("slow"),
+                                   httpx.ConnectError("refused"), httpx.RemoteProtocolError("cut off"),
+                                   asyncio.TimeoutError()])
+def test_transport_errors_are_retried_and_open_the_breaker(error):
+    """ GenAI SDK (httpx) and asyncio timeouts count as the backend being down """
+    assert is_retryable(error)
+    calls = []
+
+    def fail():
+        calls.append(1)
+        raise error
+
+    breaker = CircuitBreaker("test", failure_threshold=3, cooldown=60)
+    with pytest.raises(type(error)):
+        call_with_retries(fail, retries=2, breaker=breaker)
+    assert len(calls) == 3
+    assert breaker.is_open
+
+
+def test_other_errors_do_not_close_the_breaker():
+    """ Only a 4xx answer shows the backend is up, a bug in our code says nothing """
+    breaker = CircuitBreaker("test", failure_threshold=2, cooldown=60)
+    breaker.record_failure()
+
+    def broken():
+        raise ValueError("bad prompt")
+
+    with pytest.raises(ValueError):
+        call_with_retries(broken, breaker=breaker)
+    breaker.record_failure()
+    assert breaker.is_open
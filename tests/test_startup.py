@@ -0,0 +1,49 @@
+#Here we check that offline commands start fast and never import the network SDKs
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+#Cumulative import time (in ms) allowed for app.cli, override with STARTUP_IMPORT_BUDGET_MS
+IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "200"))
+HEAVY_MODULES = ("google.genai", "requests", "urllib3")
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+SCRIPT = """
+import json, sys
+from app.cli import cli
+try:
+    cli(["list"], prog_name="bookclub")
+except SystemExit:
+    pass
+print(json.dumps([name for name in %r if name in sys.modules]))
+""" % (HEAVY_MODULES,)
+
+
+def run_list(tmp_path):
+    """ Run 'bookclub list' in a fresh interpreter with -X importtime """
+    env = dict(os.environ, PYTHONPATH=str(REPO_ROOT))
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SCRIPT],
+        cwd=tmp_path, env=env, capture_output=True, text=True, check=True,
+    )
+
+
+def cumulative_ms(importtime_output, module):
+    """ Pull the cumulative import time of a module out of -X importtime output """
+    for line in importtime_output.splitlines():
+        if line.startswith("import time:") and line.split("|")[-1].strip() == module:
+            return int(line.split("|")[1]) / 1000
+    raise AssertionError(f"{module} not found in import time output")
+
+
+def test_list_does_not_import_network_sdks(tmp_path):
+    result = run_list(tmp_path)
+    assert "Your reading list is empty!" in result.stdout
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+
+
+def test_cli_import_time_budget(tmp_path):
+    result = run_list(tmp_path)
+    assert cumulative_ms(result.stderr, "app.cli") < IMPORT_BUDGET_MS
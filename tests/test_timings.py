@@ -0,0 +1,62 @@
+#Here we test the timing spans behind --timings and --log-json
+import io
+import json
+
+import pytest
+
+from app import timings
+
+
+@pytest.fixture(autouse = True)
+def reset():
+    yield
+    timings.disable()
+
+
+def test_disabled_spans_record_nothing():
+    @timings.timed("work")
+    def work():
+        return 42
+
+    assert work() == 42
+    with timings.span("block"):
+        pass
+    timings.enable()
+    assert timings.summary() == []
+
+
+def test_spans_are_aggregated():
+    timings.enable()
+
+    @timings.timed("work")
+    def work(n):
+        return n * 2
+
+    assert [work(n) for n in range(3)] == [0, 2, 4]
+    with timings.span("block"):
+        pass
+    rows = {name: (calls, total, longest) for name, calls, total, longest in timings.summary()}
+    assert rows["work"][0] == 3 and rows["block"][0] == 1
+    assert rows["work"][2] <= rows["work"][1]
+    assert "work" in timings.format_summary()
+
+
+def test_json_log_and_errors():
+    log = io.StringIO()
+    timings.enable(log)
+    with pytest.raises(ValueError):
+        with timings.span("books.http", q = "intitle:dune"):
+            raise ValueError("boom")
+
+    entry = json.loads(log.getvalue())
+    assert entry["span"] == "books.http"
+    assert entry["q"] == "intitle:dune"
+    assert entry["error"] == "ValueError"
+    assert entry["ms"] >= 0
+
+
+def test_enable_starts_from_scratch():
+    timings.enable()
+    timings.record("old", 1.0)
+    timings.enable()
+    assert timings.summary() == []